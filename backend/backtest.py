@@ -0,0 +1,237 @@
+import os
+import time
+from typing import Optional, Dict, Any, Callable
+
+import numpy as np
+
+from bar_store import BAR_STORE_BACKFILL_PERIOD
+from formulas import FormulaConfig
+from gmma import ema_matrix, classify_ribbons
+from metrics_engine import BarPanel, CHANGE_WINDOWS, true_range, relative_strength
+
+# Default lookback; only bars already in the bar store are replayed, so it defaults to the backfill window
+BACKTEST_PERIOD = os.environ.get('BACKTEST_PERIOD', BAR_STORE_BACKFILL_PERIOD)
+
+TRADING_DAYS = 252
+
+# Points kept in the returned equity curve
+EQUITY_CURVE_POINTS = 500
+
+# Inclusive bounds for the integer trading-rule parameters, shared with the request models
+BACKTEST_LIMITS = {"hold_days": (1, 252), "top_n": (1, 100), "min_sata": (0, 10)}
+
+
+def shift_change(close: np.ndarray, bars_back: int) -> np.ndarray:
+    """Percent change over `bars_back` bars for every day, NaN until enough history"""
+    change = np.full(close.shape, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        change[bars_back:] = (close[bars_back:] - close[:-bars_back]) / close[:-bars_back] * 100
+    return change
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Column-wise rolling mean that is NaN until `window` valid values are available"""
+    valid = ~np.isnan(values)
+    sums = np.cumsum(np.where(valid, values, 0.0), axis=0)
+    counts = np.cumsum(valid, axis=0)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts[window:] = counts[window:] - counts[:-window]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts == window, sums / window, np.nan)
+
+
+def market_inputs(panel: BarPanel, benchmark: str = "SPY") -> Dict[str, np.ndarray]:
+    """The formula-independent rule inputs as (days x tickers) history matrices"""
+    close = panel.close
+    # CHANGE_WINDOWS holds row offsets from the end, i.e. offset - 1 bars back
+    change_1w = shift_change(close, CHANGE_WINDOWS["change_1w"][0] - 1)
+    change_1m = shift_change(close, CHANGE_WINDOWS["change_1m"][0] - 1)
+
+    emas = ema_matrix(close)
+    gmma = classify_ribbons(emas, close)
+
+    position = panel.position(benchmark)
+    benchmark_change = change_1m[:, position:position + 1] if position is not None else np.zeros((close.shape[0], 1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rs_1m = relative_strength(change_1m, benchmark_change)
+
+    return {
+        "close": close,
+        "true_range": true_range(panel),
+        "volume": np.nan_to_num(panel.volume),
+        "change_1w": change_1w,
+        "change_1m": change_1m,
+        "rwb": gmma == "RWB",
+        "rs_1m": rs_1m,
+        "benchmark_column": position
+    }
+
+
+def score_inputs(inputs: Dict[str, np.ndarray], formula: Optional[FormulaConfig] = None) -> Dict[str, np.ndarray]:
+    """Add ATR% and SATA history from a formula config, the default config when none is given"""
+    formula = formula or FormulaConfig()
+    close = inputs["close"]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        atr_percent = rolling_mean(inputs["true_range"], formula.atr_period) / close * 100
+    sata = formula.sata(inputs["change_1m"], inputs["volume"], atr_percent, inputs["rs_1m"])
+    return {
+        **inputs,
+        "atr_percent": atr_percent,
+        "sata": np.where(np.isnan(inputs["change_1m"]), 0, sata)
+    }
+
+
+def rule_inputs(panel: BarPanel, benchmark: str = "SPY", formula: Optional[FormulaConfig] = None) -> Dict[str, np.ndarray]:
+    """Every input of the refresh's rules as (days x tickers) history matrices.
+
+    Each row is what the refresh pipeline would have computed at that day's
+    close, using the same windows and classifiers.
+    """
+    return score_inputs(market_inputs(panel, benchmark), formula)
+
+
+def color_rule_signals(inputs: Dict[str, np.ndarray], min_sata: int = 7) -> np.ndarray:
+    """Spreadsheet Color_Rule 'Green': RS_1M > 0 AND SATA >= 7 AND GMMA = RWB"""
+    with np.errstate(invalid='ignore'):
+        return (inputs["rs_1m"] > 0) & (inputs["sata"] >= min_sata) & inputs["rwb"]
+
+
+def swing_leader_signals(inputs: Dict[str, np.ndarray], min_sata: int = 0, top_n: Optional[int] = 5) -> np.ndarray:
+    """/etfs/swing-leaders: the top N tickers each day by SATA + RS_1M x 10"""
+    score = inputs["sata"] + inputs["rs_1m"] * 10
+    score = np.where(np.isnan(inputs["change_1m"]) | np.isnan(score), -np.inf, score)
+    top_n = min(top_n or 5, score.shape[1])
+    signals = np.zeros(score.shape, dtype=bool)
+    if top_n == 0:
+        return signals
+    # One partial sort per day across the whole matrix
+    leaders = np.argpartition(-score, top_n - 1, axis=1)[:, :top_n]
+    np.put_along_axis(signals, leaders, True, axis=1)
+    return signals & np.isfinite(score) & (inputs["sata"] >= min_sata)
+
+
+STRATEGIES: Dict[str, Callable[..., np.ndarray]] = {
+    "color_rule": color_rule_signals,
+    "swing_leaders": swing_leader_signals
+}
+
+
+def max_drawdown(equity: np.ndarray) -> float:
+    peaks = np.maximum.accumulate(equity)
+    return float(((equity - peaks) / peaks).min()) if equity.size else 0.0
+
+
+def performance(daily_returns: np.ndarray) -> Dict[str, float]:
+    equity = np.cumprod(1 + daily_returns)
+    years = len(daily_returns) / TRADING_DAYS
+    total = float(equity[-1] - 1) if equity.size else 0.0
+    volatility = float(daily_returns.std() * np.sqrt(TRADING_DAYS)) if daily_returns.size else 0.0
+    return {
+        "total_return": round(total * 100, 2),
+        "cagr": round(((1 + total) ** (1 / years) - 1) * 100, 2) if years > 0 and total > -1 else None,
+        "volatility": round(volatility * 100, 2),
+        "sharpe": round(float(daily_returns.mean() * TRADING_DAYS / volatility), 2) if volatility else None,
+        "max_drawdown": round(max_drawdown(equity) * 100, 2)
+    }
+
+
+def check_parameters(hold_days: int, top_n: Optional[int], min_sata: Optional[int]):
+    """Raise ValueError unless every rule parameter is an integer within BACKTEST_LIMITS"""
+    for name, value in (("hold_days", hold_days), ("top_n", top_n), ("min_sata", min_sata)):
+        if value is None and name != "hold_days":
+            continue
+        low, high = BACKTEST_LIMITS[name]
+        if isinstance(value, bool) or not isinstance(value, (int, np.integer)) or not low <= value <= high:
+            raise ValueError(f"{name} must be an integer between {low} and {high}, got {value!r}")
+
+
+def simulate(
+    inputs: Dict[str, np.ndarray],
+    strategy: str = "color_rule",
+    hold_days: int = 5,
+    top_n: Optional[int] = 5,
+    min_sata: Optional[int] = None
+) -> Dict[str, Any]:
+    """Trade a rule over prepared inputs with array operations only.
+
+    Signals at a rebalance day's close are held, equal weighted, for
+    `hold_days` bars starting the next day, so no day trades on information
+    from its own close. Inputs should come from a date-aligned panel
+    (BarPanel.from_aligned_bars) so each row is the same session for every ticker.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy!r}, expected one of {', '.join(STRATEGIES)}")
+    check_parameters(hold_days, top_n, min_sata)
+    close = inputs["close"]
+    days, tickers = close.shape
+    benchmark_column = inputs["benchmark_column"]
+    tradable = np.ones(tickers, dtype=bool)
+    if benchmark_column is not None:
+        tradable[benchmark_column] = False
+    # Only the leader ranking takes a top N; each rule keeps its own SATA floor unless one is given
+    top_n = top_n if strategy == "swing_leaders" else None
+    options = {"top_n": top_n} if strategy == "swing_leaders" else {}
+    if min_sata is not None:
+        options["min_sata"] = min_sata
+    signals = STRATEGIES[strategy](inputs, **options) & tradable
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        next_returns = np.full(close.shape, np.nan)
+        next_returns[:-1] = close[1:] / close[:-1] - 1
+
+    # Positions are the signals of the most recent rebalance day
+    rebalance = (np.arange(days) // hold_days) * hold_days
+    positions = signals[rebalance] & ~np.isnan(next_returns)
+    held = positions.sum(axis=1)
+    with np.errstate(invalid='ignore'):
+        portfolio = np.where(held > 0, np.where(positions, next_returns, 0.0).sum(axis=1) / np.maximum(held, 1), 0.0)
+    portfolio = portfolio[:-1]
+
+    # Trades are rebalance-day entries, judged on their return over the holding period
+    entry_days = np.arange(0, days - 1, hold_days)
+    exit_days = np.minimum(entry_days + hold_days, days - 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        trade_returns = close[exit_days] / close[entry_days] - 1
+    entries = signals[entry_days] & ~np.isnan(trade_returns)
+    trades = trade_returns[entries]
+
+    result = {
+        "strategy": strategy,
+        "parameters": {"hold_days": hold_days, "top_n": top_n, "min_sata": min_sata},
+        "tickers": int(tradable.sum()),
+        "days": int(days),
+        "trades": int(trades.size),
+        "hit_rate": round(float((trades > 0).mean()) * 100, 2) if trades.size else None,
+        "average_trade_return": round(float(trades.mean()) * 100, 3) if trades.size else None,
+        "exposure": round(float((held[:-1] > 0).mean()) * 100, 2) if days > 1 else 0.0,
+        "average_positions": round(float(held[:-1].mean()), 2) if days > 1 else 0.0,
+        **performance(portfolio)
+    }
+    if benchmark_column is not None:
+        result["benchmark"] = performance(np.nan_to_num(next_returns[:-1, benchmark_column]))
+
+    equity = np.cumprod(1 + portfolio)
+    step = max(1, len(equity) // EQUITY_CURVE_POINTS)
+    result["equity_curve"] = [round(float(value), 4) for value in equity[::step]]
+    return result
+
+
+def run_backtest(
+    panel: BarPanel,
+    strategy: str = "color_rule",
+    hold_days: int = 5,
+    top_n: Optional[int] = 5,
+    min_sata: Optional[int] = None,
+    benchmark: str = "SPY",
+    formula: Optional[FormulaConfig] = None
+) -> Dict[str, Any]:
+    """Replay a rule over the panel's whole history"""
+    started = time.perf_counter()
+    result = simulate(rule_inputs(panel, benchmark, formula), strategy, hold_days, top_n, min_sata)
+    result["parameters"]["benchmark"] = benchmark
+    # The stored bars may span less than the requested period, so report what was replayed
+    dates = panel.dates if panel.dates is not None and len(panel.dates) else None
+    result["start_date"] = str(dates[0]) if dates is not None else None
+    result["end_date"] = str(dates[-1]) if dates is not None else None
+    result["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
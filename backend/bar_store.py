@@ -0,0 +1,396 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+from collections import defaultdict
+from typing import List, Optional, Dict, Any, Tuple
+
+import pandas as pd
+import numpy as np
+
+from market_data import download_history_batches, run_blocking, load_history, SingleFlight
+from metrics_engine import BarPanel
+from gmma import GMMA_SPANS
+from indicator_state import IndicatorState
+
+# Local OHLCV store settings
+BAR_STORE_DIR = Path(os.environ.get('BAR_STORE_DIR', Path(__file__).parent / 'data' / 'bars'))
+BAR_STORE_BACKFILL_PERIOD = os.environ.get('BAR_STORE_BACKFILL_PERIOD', '5y')
+BAR_STORE_MAX_AGE = int(os.environ.get('BAR_STORE_MAX_AGE', '900'))
+
+# Relative close difference on re-fetched complete bars that means history was re-adjusted
+BAR_ADJUSTMENT_TOLERANCE = float(os.environ.get('BAR_ADJUSTMENT_TOLERANCE', '0.0001'))
+
+BAR_DTYPE = np.dtype([
+    ('ts', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+])
+
+BAR_TZ = 'America/New_York'
+
+PERIOD_PATTERN = re.compile(r'^(\d+)(d|wk|mo|y)$')
+
+
+def period_days(period: str) -> float:
+    """Approximate calendar span of a yfinance period string"""
+    period = period.lower()
+    if period == 'max':
+        return float('inf')
+    if period == 'ytd':
+        return 366
+    match = PERIOD_PATTERN.match(period)
+    if not match:
+        raise ValueError(f"Unsupported period: {period}")
+    count, unit = int(match.group(1)), match.group(2)
+    return count * {'d': 1, 'wk': 7, 'mo': 31, 'y': 366}[unit]
+
+
+def frame_to_bars(hist: pd.DataFrame) -> np.ndarray:
+    """Convert a yfinance OHLCV frame to a structured bar array"""
+    hist = hist.dropna(subset=['Close'])
+    bars = np.empty(len(hist), dtype=BAR_DTYPE)
+    index = pd.DatetimeIndex(hist.index)
+    if index.tz is None:
+        index = index.tz_localize(BAR_TZ)
+    bars['ts'] = index.tz_convert('UTC').as_unit('s').asi8
+    bars['open'] = hist['Open'].to_numpy(dtype=float)
+    bars['high'] = hist['High'].to_numpy(dtype=float)
+    bars['low'] = hist['Low'].to_numpy(dtype=float)
+    bars['close'] = hist['Close'].to_numpy(dtype=float)
+    bars['volume'] = hist['Volume'].fillna(0).to_numpy(dtype=float)
+    return bars
+
+
+def is_readjusted(existing: np.ndarray, new_bars: np.ndarray, tolerance: float = BAR_ADJUSTMENT_TOLERANCE) -> bool:
+    """Whether re-fetched bars disagree with stored complete bars on the same dates.
+
+    Bars are split- and dividend-adjusted as of the fetch, so after a corporate
+    action every older close changes. The stored tail is skipped because it
+    may have been a partial intraday bar.
+    """
+    complete = existing[:-1]
+    _, stored, fetched = np.intersect1d(complete['ts'], new_bars['ts'], return_indices=True)
+    if stored.size == 0:
+        return False
+    old, new = complete['close'][stored], new_bars['close'][fetched]
+    return bool((np.abs(new - old) > tolerance * np.abs(old)).any())
+
+
+def bars_to_frame(bars: np.ndarray) -> pd.DataFrame:
+    """Convert a structured bar array back to a yfinance-style OHLCV frame"""
+    index = pd.to_datetime(bars['ts'], unit='s', utc=True).tz_convert(BAR_TZ)
+    return pd.DataFrame({
+        'Open': bars['open'],
+        'High': bars['high'],
+        'Low': bars['low'],
+        'Close': bars['close'],
+        'Volume': bars['volume'],
+    }, index=index)
+
+
+class BarStore:
+    """Per-ticker OHLCV bars stored as memory-mappable NumPy files"""
+
+    def __init__(self, root: Path = BAR_STORE_DIR):
+        self.root = Path(root)
+
+    def path(self, ticker: str, interval: str = "1d") -> Path:
+        safe = re.sub(r'[^A-Za-z0-9._-]', '_', ticker.upper())
+        return self.root / interval / f"{safe}.npy"
+
+    def read(self, ticker: str, interval: str = "1d") -> Optional[np.ndarray]:
+        path = self.path(ticker, interval)
+        if not path.exists():
+            return None
+        try:
+            return np.load(path, mmap_mode='r')
+        except (OSError, ValueError) as e:
+            logging.error(f"Corrupt bar file {path}: {e}")
+            return None
+
+    def state_path(self, ticker: str, interval: str = "1d") -> Path:
+        return self.path(ticker, interval).with_suffix(".state.json")
+
+    def load_state(self, ticker: str, interval: str = "1d") -> Optional[IndicatorState]:
+        path = self.state_path(ticker, interval)
+        if not path.exists():
+            return None
+        try:
+            with open(path) as f:
+                return IndicatorState.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Discarding indicator state {path}: {e}")
+            return None
+
+    def load_states(self, tickers: List[str], interval: str = "1d") -> Dict[str, IndicatorState]:
+        states = {}
+        for ticker in tickers:
+            state = self.load_state(ticker, interval)
+            if state is not None:
+                states[ticker] = state
+        return states
+
+    def load_state_atr(self, panel: BarPanel, interval: str = "1d", states: Optional[Dict[str, IndicatorState]] = None) -> np.ndarray:
+        """14-bar ATR per panel column from indicator state; NaN where the state lags the panel"""
+        if states is None:
+            states = self.load_states(panel.tickers, interval)
+        atr = np.full(len(panel), np.nan)
+        for j, ticker in enumerate(panel.tickers):
+            state = states.get(ticker)
+            if state is not None and state.last_ts == panel.last_ts[j] and state.atr is not None:
+                atr[j] = state.atr
+        return atr
+
+    def load_state_emas(self, panel: BarPanel, interval: str = "1d", states: Optional[Dict[str, IndicatorState]] = None) -> np.ndarray:
+        """Latest GMMA EMAs (spans x tickers) from indicator state; NaN where the state lags the panel.
+
+        These are the EMAs the state's swing is tracked on, so the refresh's
+        GMMA pattern and swing agree.
+        """
+        if states is None:
+            states = self.load_states(panel.tickers, interval)
+        emas = np.full((len(GMMA_SPANS), len(panel)), np.nan)
+        for j, ticker in enumerate(panel.tickers):
+            state = states.get(ticker)
+            if state is not None and state.last_ts == panel.last_ts[j]:
+                emas[:, j] = [np.nan if state.emas[span] is None else state.emas[span] for span in GMMA_SPANS]
+        return emas
+
+    def write_state(self, ticker: str, state: IndicatorState, interval: str = "1d"):
+        path = self.state_path(ticker, interval)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(state.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    def write(self, ticker: str, bars: np.ndarray, interval: str = "1d"):
+        path = self.path(ticker, interval)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(bars, dtype=BAR_DTYPE))
+        os.replace(tmp_path, path)
+
+    def append(self, ticker: str, hist: pd.DataFrame, interval: str = "1d", replace: bool = False) -> Optional[int]:
+        """Merge new bars into the stored series; returns the number of bars written past the old tail.
+
+        Returns None without writing when the re-fetched overlap no longer
+        matches the stored bars (see is_readjusted); the ticker then needs a
+        fresh backfill, written with `replace=True`.
+        """
+        new_bars = frame_to_bars(hist)
+        if new_bars.size == 0:
+            return 0
+
+        existing = None if replace else self.read(ticker, interval)
+        if existing is None or existing.size == 0:
+            merged = new_bars
+            added = new_bars.size
+        elif is_readjusted(existing, new_bars):
+            return None
+        else:
+            # Overlapping complete bars only served the adjustment check
+            new_bars = new_bars[new_bars['ts'] >= existing['ts'][-1]]
+            if new_bars.size == 0:
+                return 0
+            # The last stored bar may have been partial, so newer data replaces it
+            keep = existing[existing['ts'] < new_bars['ts'][0]]
+            merged = np.concatenate([keep, new_bars])
+            added = int(np.count_nonzero(new_bars['ts'] > existing['ts'][-1]))
+
+        self.write(ticker, merged, interval)
+
+        # Indicator state only needs the new bars unless older history was rewritten
+        state = None if replace else self.load_state(ticker, interval)
+        if state is None or not state.can_advance(new_bars):
+            state = IndicatorState.from_bars(merged)
+        else:
+            state.advance(new_bars)
+        self.write_state(ticker, state, interval)
+        return added
+
+    def last_timestamp(self, ticker: str, interval: str = "1d") -> Optional[int]:
+        bars = self.read(ticker, interval)
+        if bars is None or bars.size == 0:
+            return None
+        return int(bars['ts'][-1])
+
+    def tail_keys(self, tickers: List[str], interval: str = "1d") -> Dict[str, Optional[Tuple[int, float, float, float]]]:
+        """(ts, high, low, close) of each ticker's last bar; a partial bar updated in place changes its key"""
+        keys = {}
+        for ticker in tickers:
+            bars = self.read(ticker, interval)
+            if bars is None or bars.size == 0:
+                keys[ticker] = None
+                continue
+            last = bars[-1]
+            keys[ticker] = (int(last['ts']), float(last['high']), float(last['low']), float(last['close']))
+        return keys
+
+    def overlap_timestamps(self, tickers: List[str], interval: str = "1d") -> Dict[str, Optional[int]]:
+        """Where a delta fetch starts: the last complete bar before the tail, or the tail itself"""
+        starts = {}
+        for ticker in tickers:
+            bars = self.read(ticker, interval)
+            starts[ticker] = None if bars is None or bars.size == 0 else int(bars['ts'][max(bars.size - 2, 0)])
+        return starts
+
+    def age_seconds(self, ticker: str, interval: str = "1d") -> Optional[float]:
+        path = self.path(ticker, interval)
+        if not path.exists():
+            return None
+        return time.time() - path.stat().st_mtime
+
+    def covers(self, period: str) -> bool:
+        """Whether a requested period fits inside the store's backfill window"""
+        try:
+            return period_days(period) <= period_days(BAR_STORE_BACKFILL_PERIOD)
+        except ValueError:
+            return False
+
+    def load_frame(self, ticker: str, period: str = "6mo", interval: str = "1d") -> Optional[pd.DataFrame]:
+        """Read stored bars for the trailing period as a yfinance-style frame"""
+        bars = self.load_bars(ticker, period, interval)
+        if bars is None:
+            return None
+        return bars_to_frame(bars)
+
+    def load_bars(self, ticker: str, period: str = "6mo", interval: str = "1d") -> Optional[np.ndarray]:
+        """Read stored bars for the trailing period as a structured array"""
+        bars = self.read(ticker, interval)
+        if bars is None or bars.size == 0:
+            return None
+
+        period = period.lower()
+        match = PERIOD_PATTERN.match(period)
+        if match and match.group(2) == 'd':
+            # Day periods count trading sessions, matching Yahoo's range semantics
+            bars = bars[-int(match.group(1)):]
+        elif period != 'max':
+            last = pd.Timestamp(int(bars['ts'][-1]), unit='s', tz='UTC').tz_convert(BAR_TZ).normalize()
+            if period == 'ytd':
+                cutoff = last.replace(month=1, day=1)
+            else:
+                count, unit = int(match.group(1)), match.group(2)
+                offset = {
+                    'wk': pd.DateOffset(weeks=count),
+                    'mo': pd.DateOffset(months=count),
+                    'y': pd.DateOffset(years=count)
+                }[unit]
+                cutoff = last - offset
+            bars = bars[bars['ts'] >= int(cutoff.timestamp())]
+
+        if bars.size == 0:
+            return None
+        return np.array(bars)
+
+    def load_frames(self, tickers: List[str], period: str = "6mo", interval: str = "1d") -> Dict[str, pd.DataFrame]:
+        frames = {}
+        for ticker in tickers:
+            frame = self.load_frame(ticker, period, interval)
+            if frame is not None:
+                frames[ticker] = frame
+        return frames
+
+    def load_panel(self, tickers: List[str], period: str = "6mo", interval: str = "1d") -> BarPanel:
+        """Read many tickers straight into (bars x tickers) matrices without building DataFrames"""
+        return BarPanel.from_bars({ticker: self.load_bars(ticker, period, interval) for ticker in tickers})
+
+    def load_aligned_panel(self, tickers: List[str], period: str = "6mo", interval: str = "1d") -> BarPanel:
+        """Like load_panel, but rows are shared session dates, for history replays across tickers"""
+        return BarPanel.from_aligned_bars({ticker: self.load_bars(ticker, period, interval) for ticker in tickers}, BAR_TZ)
+
+
+bar_store = BarStore()
+history_flight = SingleFlight("history")
+
+
+async def sync_bars(tickers: List[str], interval: str = "1d", store: BarStore = bar_store) -> Dict[str, Any]:
+    """Backfill missing tickers and fetch only bars newer than each stored tail.
+
+    Delta fetches start one complete bar before the tail; a ticker whose
+    re-fetched bar no longer matches the stored one had a split or dividend
+    and is backfilled again from scratch.
+    """
+    started = time.perf_counter()
+    backfill = []
+    deltas = defaultdict(list)
+
+    starts = await run_blocking(store.overlap_timestamps, tickers, interval)
+    for ticker, start_ts in starts.items():
+        if start_ts is None:
+            backfill.append(ticker)
+        else:
+            # Re-request the last stored session too so a partial intraday bar gets completed
+            start = pd.Timestamp(start_ts, unit='s', tz='UTC').tz_convert(BAR_TZ).strftime('%Y-%m-%d')
+            deltas[start].append(ticker)
+
+    batches = []
+    failed = []
+    readjusted = []
+    bars_added = 0
+
+    async def run(group: List[str], replace: bool = False, **kwargs):
+        nonlocal bars_added
+        history, report = await download_history_batches(group, interval=interval, **kwargs)
+        for ticker, hist in history.items():
+            added = await run_blocking(store.append, ticker, hist, interval, replace)
+            if added is None:
+                readjusted.append(ticker)
+            else:
+                bars_added += added
+        batches.extend(report["batches"])
+        failed.extend(report["failed"])
+
+    if backfill:
+        await run(backfill, period=BAR_STORE_BACKFILL_PERIOD)
+    for start, group in deltas.items():
+        await run(group, start=start)
+    if readjusted:
+        logging.info(f"Re-adjusted history for {', '.join(readjusted)}, backfilling again")
+        await run(readjusted, replace=True, period=BAR_STORE_BACKFILL_PERIOD)
+
+    return {
+        "requested": len(tickers),
+        "backfilled": len(backfill),
+        "readjusted": readjusted,
+        "delta_groups": len(deltas),
+        "bars_added": bars_added,
+        "failed": failed,
+        "batches": batches,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+async def get_bars(
+    ticker: str,
+    period: str = "6mo",
+    interval: str = "1d",
+    max_age: int = BAR_STORE_MAX_AGE,
+    store: BarStore = bar_store
+) -> Optional[pd.DataFrame]:
+    """Serve bars from the local store, syncing first when missing or older than max_age seconds"""
+    ticker = ticker.upper()
+    return await history_flight.do(
+        (ticker, period, interval),
+        lambda: _load_bars(ticker, period, interval, max_age, store)
+    )
+
+
+async def _load_bars(ticker: str, period: str, interval: str, max_age: int, store: BarStore) -> Optional[pd.DataFrame]:
+    if not store.covers(period):
+        # Longer than the backfill window, so go straight to upstream
+        hist = await run_blocking(load_history, ticker, period, interval)
+        return None if hist.empty else hist
+
+    age = store.age_seconds(ticker, interval)
+    if age is None or age > max_age:
+        await sync_bars([ticker], interval, store)
+    return await run_blocking(store.load_frame, ticker, period, interval)
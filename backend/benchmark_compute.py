@@ -0,0 +1,63 @@
+"""Compare single, thread and process compute modes on a synthetic universe.
+
+Usage: python benchmark_compute.py --tickers 5000 --bars 126 --repeat 3
+"""
+import time
+import asyncio
+import argparse
+
+import numpy as np
+
+from compute_pool import PanelComputer, COMPUTE_MODES, COMPUTE_PROCESSES, COMPUTE_CHUNK_SIZE
+from metrics_engine import BarPanel
+
+
+def synthetic_panel(tickers: int, bars: int, seed: int = 7) -> BarPanel:
+    """Random-walk OHLCV panel with SPY as the first column"""
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0005, 0.02, size=(bars, tickers))
+    close = 100 * np.exp(np.cumsum(returns, axis=0))
+    spread = np.abs(rng.normal(0, 0.01, size=(bars, tickers))) * close
+    volume = rng.integers(100000, 5000000, size=(bars, tickers)).astype(float)
+    names = ["SPY"] + [f"T{i:05d}" for i in range(1, tickers)]
+    lengths = np.full(tickers, bars, dtype=np.int64)
+    return BarPanel(names, close, close + spread, close - spread, volume, lengths)
+
+
+async def run(args):
+    panel = synthetic_panel(args.tickers, args.bars)
+    baseline = None
+    for mode in COMPUTE_MODES:
+        computer = PanelComputer(mode, args.processes, args.chunk_size)
+        # Warm-up run so process start-up is not counted
+        await computer.compute(panel)
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            metrics = await computer.compute(panel)
+            timings.append((time.perf_counter() - started) * 1000)
+        computer.shutdown()
+
+        if baseline is None:
+            baseline = metrics
+        matches = all(
+            np.array_equal(baseline[name], values, equal_nan=values.dtype.kind == 'f')
+            for name, values in metrics.items()
+        )
+        print(f"{mode:>8}: best {min(timings):8.1f}ms  mean {sum(timings) / len(timings):8.1f}ms  matches single: {matches}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=5000)
+    parser.add_argument("--bars", type=int, default=126)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--processes", type=int, default=COMPUTE_PROCESSES)
+    parser.add_argument("--chunk-size", type=int, default=COMPUTE_CHUNK_SIZE)
+    args = parser.parse_args()
+    print(f"{args.tickers} tickers x {args.bars} bars, chunk size {args.chunk_size}, {args.processes} processes")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import os
+import threading
+from collections import deque, Counter
+from datetime import datetime
+from typing import List, Optional, Dict, Any, Tuple
+
+import numpy as np
+
+from market_data import NY_TZ
+
+# Bars in a 52-week high/low window, including the current bar
+BREADTH_WINDOW = int(os.environ.get('BREADTH_WINDOW', '252'))
+BREADTH_SMA_PERIODS = tuple(int(p) for p in os.environ.get('BREADTH_SMA_PERIODS', '50,200').split(','))
+
+# Daily breadth rows kept in memory, and bars replayed for a ticker seen for the first time
+BREADTH_HISTORY_DAYS = int(os.environ.get('BREADTH_HISTORY_DAYS', '252'))
+BREADTH_BOOTSTRAP_BARS = BREADTH_WINDOW + BREADTH_HISTORY_DAYS
+
+
+class RollingExtreme:
+    """Max (or min) of the last `size` pushed values using a monotonic deque; O(1) amortized per push"""
+
+    def __init__(self, size: int, highest: bool = True):
+        self.size = size
+        self.sign = 1.0 if highest else -1.0
+        self.items: deque = deque()
+        self.count = 0
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.size
+
+    @property
+    def value(self) -> Optional[float]:
+        return self.items[0][1] * self.sign if self.items else None
+
+    def push(self, value: float):
+        key = value * self.sign
+        # Older entries that can never be the extreme again are dropped
+        while self.items and self.items[-1][1] <= key:
+            self.items.pop()
+        self.items.append((self.count, key))
+        self.count += 1
+        while self.items[0][0] <= self.count - 1 - self.size:
+            self.items.popleft()
+
+
+class RollingSum:
+    """Sum of the last `size` pushed values"""
+
+    def __init__(self, size: int):
+        self.window: deque = deque(maxlen=size)
+        self.total = 0.0
+
+    @property
+    def full(self) -> bool:
+        return len(self.window) == self.window.maxlen
+
+    def push(self, value: float):
+        if self.full:
+            self.total -= self.window[0]
+        self.window.append(value)
+        self.total += value
+
+
+class TickerBreadth:
+    """Breadth flags for one ticker's latest bar.
+
+    The latest bar stays provisional and is only pushed into the rolling
+    windows when a newer bar arrives, so a partial intraday bar can be
+    replaced without rolling anything back. Windows therefore hold the bars
+    *before* the latest one.
+    """
+
+    def __init__(self, window: int = BREADTH_WINDOW, sma_periods=BREADTH_SMA_PERIODS):
+        self.highs = RollingExtreme(window - 1, highest=True)
+        self.lows = RollingExtreme(window - 1, highest=False)
+        self.closes = {period: RollingSum(period - 1) for period in sma_periods}
+        self.prev_close: Optional[float] = None
+        self.bar: Optional[Tuple[int, float, float, float]] = None
+        self.flags: Optional[Dict[str, bool]] = None
+
+    @property
+    def last_ts(self) -> Optional[int]:
+        return self.bar[0] if self.bar else None
+
+    def _commit(self):
+        _, high, low, close = self.bar
+        self.highs.push(high)
+        self.lows.push(low)
+        for window in self.closes.values():
+            window.push(close)
+        self.prev_close = close
+
+    def _flags(self, high: float, low: float, close: float) -> Dict[str, bool]:
+        flags = {"tickers": True}
+        if self.highs.full:
+            flags["nhnl_eligible"] = True
+            flags["new_highs"] = high > self.highs.value
+            flags["new_lows"] = low < self.lows.value
+        if self.prev_close is not None:
+            flags["advancing"] = close > self.prev_close
+            flags["declining"] = close < self.prev_close
+        for period, window in self.closes.items():
+            if window.full:
+                flags[f"sma{period}_eligible"] = True
+                flags[f"above_sma{period}"] = close > (window.total + close) / period
+        return flags
+
+    def update(self, ts: int, high: float, low: float, close: float) -> Optional[Tuple[Optional[Dict], Dict]]:
+        """Apply a bar; returns (flags it replaces, new flags), or None for an out-of-date bar"""
+        if self.bar is not None and ts < self.bar[0]:
+            return None
+        previous = None
+        if self.bar is not None and ts == self.bar[0]:
+            previous = self.flags
+        elif self.bar is not None:
+            self._commit()
+        self.bar = (ts, high, low, close)
+        self.flags = self._flags(high, low, close)
+        return previous, self.flags
+
+
+class BreadthEngine:
+    """Universe-wide NH/NL, advance/decline and percent-above-SMA counts per session.
+
+    Each bar touches one ticker's rolling windows and one session's
+    counters, so keeping thousands of symbols current costs O(1) amortized
+    work per new bar.
+    """
+
+    def __init__(self, window: int = BREADTH_WINDOW, sma_periods=BREADTH_SMA_PERIODS, history_days: int = BREADTH_HISTORY_DAYS):
+        self.window = window
+        self.sma_periods = sma_periods
+        self.history_days = history_days
+        self.tickers: Dict[str, TickerBreadth] = {}
+        self.daily: Dict[int, Counter] = {}
+        self._lock = threading.Lock()
+
+    def _apply(self, ts: int, previous: Optional[Dict[str, bool]], flags: Dict[str, bool]):
+        counts = self.daily.setdefault(ts, Counter())
+        if previous:
+            counts.subtract({name: 1 for name, value in previous.items() if value})
+        counts.update({name: 1 for name, value in flags.items() if value})
+
+    def update(self, ticker: str, ts: int, high: float, low: float, close: float):
+        state = self.tickers.get(ticker)
+        if state is None:
+            state = self.tickers[ticker] = TickerBreadth(self.window, self.sma_periods)
+        change = state.update(ts, high, low, close)
+        if change is not None:
+            self._apply(ts, *change)
+
+    def sync(self, store, tickers: List[str], interval: str = "1d") -> Dict[str, int]:
+        """Feed bars the engine has not seen yet from the bar store"""
+        applied = 0
+        with self._lock:
+            for ticker in tickers:
+                bars = store.read(ticker, interval)
+                if bars is None or bars.size == 0:
+                    continue
+                state = self.tickers.get(ticker)
+                if state is None or state.last_ts is None:
+                    bars = bars[-BREADTH_BOOTSTRAP_BARS:]
+                else:
+                    # The provisional bar is re-applied in case it was completed since
+                    bars = bars[np.searchsorted(bars['ts'], state.last_ts):]
+                for bar in bars:
+                    self.update(ticker, int(bar['ts']), float(bar['high']), float(bar['low']), float(bar['close']))
+                applied += len(bars)
+
+            for ticker in set(self.tickers) - set(tickers):
+                self._drop(ticker)
+            self._trim()
+        return {"tickers": len(self.tickers), "bars_applied": applied}
+
+    def _drop(self, ticker: str):
+        """Forget a ticker that left the universe, removing it from its latest session"""
+        state = self.tickers.pop(ticker)
+        if state.flags and state.last_ts in self.daily:
+            self._apply(state.last_ts, state.flags, {})
+
+    def _trim(self):
+        for ts in sorted(self.daily)[:-self.history_days]:
+            del self.daily[ts]
+
+    def _row(self, ts: int, counts: Counter) -> Dict[str, Any]:
+        row = {
+            "date": datetime.fromtimestamp(ts, NY_TZ).strftime('%Y-%m-%d'),
+            "tickers": counts["tickers"],
+            "new_highs": counts["new_highs"],
+            "new_lows": counts["new_lows"],
+            "nh_nl": counts["new_highs"] - counts["new_lows"],
+            "nhnl_eligible": counts["nhnl_eligible"],
+            "advancing": counts["advancing"],
+            "declining": counts["declining"]
+        }
+        for period in self.sma_periods:
+            eligible = counts[f"sma{period}_eligible"]
+            row[f"pct_above_sma{period}"] = round(counts[f"above_sma{period}"] / eligible * 100, 2) if eligible else None
+        return row
+
+    def series(self, days: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Daily breadth rows with a cumulative advance/decline line, oldest first"""
+        with self._lock:
+            rows = [self._row(ts, self.daily[ts]) for ts in sorted(self.daily)]
+        ad_line = 0
+        for row in rows:
+            ad_line += row["advancing"] - row["declining"]
+            row["ad_line"] = ad_line
+        return rows[-days:] if days else rows
+
+    def snapshot(self) -> Optional[Dict[str, Any]]:
+        """Latest session's breadth row"""
+        rows = self.series()
+        return rows[-1] if rows else None
+
+
+breadth_engine = BreadthEngine()
@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import hashlib
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+# Documents per unordered bulk_write round trip
+BULK_WRITE_BATCH_SIZE = int(os.environ.get('BULK_WRITE_BATCH_SIZE', '500'))
+
+# Server error code for a unique index violation
+DUPLICATE_KEY_ERROR = 11000
+
+
+def content_hash(doc: Dict[str, Any], ignore_fields: Iterable[str] = ()) -> str:
+    """Stable digest of a document's values, leaving out volatile fields"""
+    ignored = set(ignore_fields)
+    payload = {field: value for field, value in doc.items() if field not in ignored}
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class BulkUpserter:
+    """Upsert documents by key in unordered batches, skipping ones whose content is unchanged.
+
+    Each written document carries a `content_hash`. Replacements are filtered on
+    `content_hash != digest`, so the stored document is the only source of truth:
+    an unchanged document fails its upsert on the unique key index and is counted
+    as skipped, and its `touch_fields` are still advanced.
+    """
+
+    def __init__(
+        self,
+        collection,
+        key: str,
+        ignore_fields: Iterable[str] = (),
+        touch_fields: Iterable[str] = (),
+        batch_size: int = BULK_WRITE_BATCH_SIZE
+    ):
+        self.collection = collection
+        self.key = key
+        self.ignore_fields = tuple(ignore_fields)
+        self.touch_fields = tuple(touch_fields)
+        self.batch_size = batch_size
+
+    async def ensure_indexes(self):
+        # Unchanged documents are detected by the upsert colliding with this index
+        await self.collection.create_index(self.key, unique=True)
+
+    async def _replace(self, operations: List[ReplaceOne]) -> Tuple[Dict[str, int], List[int]]:
+        """Run one unordered batch; returns write counts and the indexes of unchanged documents"""
+        try:
+            result = await self.collection.bulk_write(operations, ordered=False)
+            return {
+                "upserted": result.upserted_count,
+                "modified": result.modified_count,
+                "matched": result.matched_count
+            }, []
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != DUPLICATE_KEY_ERROR for error in errors):
+                raise
+            return {
+                "upserted": e.details.get("nUpserted", 0),
+                "modified": e.details.get("nModified", 0),
+                "matched": e.details.get("nMatched", 0)
+            }, [error["index"] for error in errors]
+
+    async def upsert(self, docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        report = {"documents": len(docs), "written": 0, "skipped": 0, "batches": [], "duration_ms": 0.0}
+
+        for start in range(0, len(docs), self.batch_size):
+            batch = docs[start:start + self.batch_size]
+            batch_started = time.perf_counter()
+
+            operations = []
+            for doc in batch:
+                digest = content_hash(doc, self.ignore_fields)
+                operations.append(ReplaceOne(
+                    {self.key: doc[self.key], "content_hash": {"$ne": digest}},
+                    {**doc, "content_hash": digest},
+                    upsert=True
+                ))
+
+            counts, unchanged = await self._replace(operations)
+            touches = [
+                UpdateOne({self.key: batch[i][self.key]}, {"$set": touched})
+                for i in unchanged
+                for touched in [{field: batch[i][field] for field in self.touch_fields if field in batch[i]}]
+                if touched
+            ]
+            if touches:
+                await self.collection.bulk_write(touches, ordered=False)
+
+            batch_report = {"batch": start // self.batch_size, "documents": len(batch), "skipped": len(unchanged), **counts}
+            batch_report["duration_ms"] = round((time.perf_counter() - batch_started) * 1000, 1)
+
+            report["written"] += len(batch) - len(unchanged)
+            report["skipped"] += batch_report["skipped"]
+            report["batches"].append(batch_report)
+
+        report["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return report
@@ -0,0 +1,210 @@
+import os
+import asyncio
+import logging
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import List, Optional, Dict, Any, Tuple
+
+import numpy as np
+
+from market_data import market_data_executor
+from gmma import GMMA_SPANS
+from metrics_engine import BarPanel, compute_universe_metrics
+
+# Where universe metrics are computed: 'single' (one call), 'thread' or 'process' (chunked)
+COMPUTE_MODE = os.environ.get('COMPUTE_MODE', 'single').lower()
+COMPUTE_PROCESSES = int(os.environ.get('COMPUTE_PROCESSES', str(os.cpu_count() or 1)))
+COMPUTE_CHUNK_SIZE = int(os.environ.get('COMPUTE_CHUNK_SIZE', '500'))
+
+COMPUTE_MODES = ("single", "thread", "process")
+
+# Matrices packed into one shared block, in this order
+PANEL_FIELDS = ("close", "high", "low", "volume")
+
+
+class LazyProcessPool:
+    """A spawn-context process pool created on first use and released on shutdown"""
+
+    def __init__(self, processes: int = COMPUTE_PROCESSES):
+        self.processes = processes
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn keeps workers free of the parent's event loop and thread state
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def share_panel(panel: BarPanel) -> Tuple[shared_memory.SharedMemory, Dict[str, Any]]:
+    """Copy the panel's OHLCV matrices into one shared memory block workers can attach to"""
+    shape = (len(PANEL_FIELDS),) + panel.close.shape
+    size = max(int(np.prod(shape)) * np.dtype(np.float64).itemsize, 1)
+    block = shared_memory.SharedMemory(create=True, size=size)
+    matrices = np.ndarray(shape, dtype=np.float64, buffer=block.buf)
+    for i, field in enumerate(PANEL_FIELDS):
+        matrices[i] = getattr(panel, field)
+    del matrices
+    return block, {"name": block.name, "shape": shape}
+
+
+def compute_chunk(
+    spec: Dict[str, Any],
+    columns: List[int],
+    tickers: List[str],
+    lengths: np.ndarray,
+    benchmark: str,
+    atr: Optional[np.ndarray],
+    emas: Optional[np.ndarray] = None
+) -> Dict[str, np.ndarray]:
+    """Worker entry point: metrics for a column subset of a shared panel.
+
+    Only column indexes, tickers and lengths cross the process boundary; the
+    bars are read from shared memory and only metric arrays are sent back.
+    """
+    block = shared_memory.SharedMemory(name=spec["name"])
+    try:
+        matrices = np.ndarray(spec["shape"], dtype=np.float64, buffer=block.buf)
+        # Fancy indexing copies the chunk, so no view outlives the block
+        chunk = matrices[:, :, columns]
+        del matrices
+    finally:
+        block.close()
+
+    panel = BarPanel(tickers, chunk[0], chunk[1], chunk[2], chunk[3], lengths)
+    return compute_universe_metrics(panel, benchmark, atr, emas)
+
+
+def merge_chunks(panel: BarPanel, chunks: List[Tuple[List[int], Dict[str, np.ndarray]]]) -> Dict[str, np.ndarray]:
+    """Reassemble per-chunk metric arrays in panel column order"""
+    merged: Dict[str, np.ndarray] = {}
+    for columns, metrics in chunks:
+        count = len(columns)
+        for name, values in metrics.items():
+            if name not in merged:
+                merged[name] = np.empty(len(panel), dtype=values.dtype)
+            elif merged[name].dtype != values.dtype:
+                # String categories may come back with different widths per chunk
+                merged[name] = merged[name].astype(np.result_type(merged[name], values))
+            # The benchmark column rides along at the end of chunks that lack it
+            merged[name][columns] = values[:count]
+    return merged
+
+
+class PanelComputer:
+    """Run compute_universe_metrics inline, on the thread pool or on a process pool"""
+
+    def __init__(self, mode: str = COMPUTE_MODE, processes: int = COMPUTE_PROCESSES, chunk_size: int = COMPUTE_CHUNK_SIZE):
+        if mode not in COMPUTE_MODES:
+            raise ValueError(f"Unknown compute mode {mode!r}, expected one of {', '.join(COMPUTE_MODES)}")
+        self.mode = mode
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self.pool = LazyProcessPool(processes)
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+    def _chunks(self, panel: BarPanel, benchmark: str) -> List[Tuple[List[int], List[str]]]:
+        """Column chunks, each with the benchmark column appended when it is not already inside"""
+        benchmark_column = panel.position(benchmark)
+        chunks = []
+        for start in range(0, len(panel), self.chunk_size):
+            columns = list(range(start, min(start + self.chunk_size, len(panel))))
+            members = list(columns)
+            if benchmark_column is not None and benchmark_column not in columns:
+                members.append(benchmark_column)
+            chunks.append((columns, members))
+        return chunks
+
+    async def compute(
+        self,
+        panel: BarPanel,
+        benchmark: str = "SPY",
+        atr: Optional[np.ndarray] = None,
+        emas: Optional[np.ndarray] = None
+    ) -> Dict[str, np.ndarray]:
+        """Compute universe metrics without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        if self.mode == "single" or len(panel) <= self.chunk_size:
+            return await loop.run_in_executor(
+                market_data_executor,
+                functools.partial(compute_universe_metrics, panel, benchmark, atr, emas)
+            )
+
+        chunks = self._chunks(panel, benchmark)
+        atr_values = np.full(len(panel), np.nan) if atr is None else np.asarray(atr, dtype=float)
+        ema_values = np.full((len(GMMA_SPANS), len(panel)), np.nan) if emas is None else np.asarray(emas, dtype=float)
+
+        if self.mode == "thread":
+            jobs = [
+                loop.run_in_executor(
+                    market_data_executor,
+                    functools.partial(
+                        compute_universe_metrics,
+                        BarPanel(
+                            [panel.tickers[i] for i in members],
+                            panel.close[:, members], panel.high[:, members],
+                            panel.low[:, members], panel.volume[:, members],
+                            panel.lengths[members]
+                        ),
+                        benchmark,
+                        atr_values[members],
+                        ema_values[:, members]
+                    )
+                )
+                for _, members in chunks
+            ]
+            results = await asyncio.gather(*jobs)
+            return merge_chunks(panel, [(columns, metrics) for (columns, _), metrics in zip(chunks, results)])
+
+        block, spec = share_panel(panel)
+        try:
+            jobs = [
+                loop.run_in_executor(
+                    self.pool.executor,
+                    functools.partial(
+                        compute_chunk,
+                        spec,
+                        members,
+                        [panel.tickers[i] for i in members],
+                        panel.lengths[members],
+                        benchmark,
+                        atr_values[members],
+                        ema_values[:, members]
+                    )
+                )
+                for _, members in chunks
+            ]
+            results = await asyncio.gather(*jobs)
+        except Exception as e:
+            logging.error(f"Process pool compute failed, falling back to a single pass: {e}")
+            return await loop.run_in_executor(
+                market_data_executor,
+                functools.partial(compute_universe_metrics, panel, benchmark, atr, emas)
+            )
+        finally:
+            block.close()
+            block.unlink()
+        return merge_chunks(panel, [(columns, metrics) for (columns, _), metrics in zip(chunks, results)])
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "processes": self.processes if self.mode == "process" else None,
+            "chunk_size": self.chunk_size
+        }
+
+
+panel_computer = PanelComputer()
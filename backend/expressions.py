@@ -0,0 +1,320 @@
+import os
+import re
+import ast
+import hashlib
+import operator
+import functools
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Callable, Set, Tuple
+
+import numpy as np
+
+EXPRESSION_CACHE_SIZE = int(os.environ.get('EXPRESSION_CACHE_SIZE', '512'))
+EXPRESSION_MAX_LENGTH = 500
+EXPRESSION_MAX_NODES = 200
+EXPRESSION_MAX_COLUMNS = int(os.environ.get('EXPRESSION_MAX_COLUMNS', '20'))
+
+# Short spreadsheet names for ETF row fields; the full field names work too
+FIELD_ALIASES = {
+    "price": "current_price",
+    "sata": "sata_score",
+    "atr": "atr_percent",
+    "gmma": "gmma_pattern",
+    "sma20": "sma20_trend",
+    "rs_1m": "relative_strength_1m",
+    "rs_3m": "relative_strength_3m",
+    "rs_6m": "relative_strength_6m"
+}
+
+# Names a custom column may not take, so it can never shadow a function or constant
+RESERVED_NAMES = {"and", "or", "not", "in", "if", "else", "true", "false", "nan"}
+
+COLUMN_DEFINITION = re.compile(r"^\s*([A-Za-z_]\w*)\s*=(?!=)(.+)$", re.S)
+
+BINARY_OPERATORS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.true_divide,
+    ast.FloorDiv: np.floor_divide,
+    ast.Mod: np.mod,
+    ast.Pow: np.power
+}
+
+COMPARISON_OPERATORS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge
+}
+
+
+def _coalesce(value, default):
+    value = np.asarray(value)
+    if value.dtype.kind == 'f':
+        return np.where(np.isnan(value), default, value)
+    return np.where(value == None, default, value)  # noqa: E711 - elementwise on object arrays
+
+
+FUNCTIONS: Dict[str, Callable[..., np.ndarray]] = {
+    "abs": np.abs,
+    "min": lambda *values: functools.reduce(np.minimum, values),
+    "max": lambda *values: functools.reduce(np.maximum, values),
+    "round": lambda value, digits=0: np.round(value, int(digits)),
+    "sqrt": np.sqrt,
+    "log": np.log,
+    "where": np.where,
+    "coalesce": _coalesce
+}
+
+# (minimum, maximum) positional arguments per function; None means no maximum
+FUNCTION_ARITY = {
+    "abs": (1, 1),
+    "min": (1, None),
+    "max": (1, None),
+    "round": (1, 2),
+    "sqrt": (1, 1),
+    "log": (1, 1),
+    "where": (3, 3),
+    "coalesce": (2, 2)
+}
+
+CONSTANTS = {"true": True, "false": False, "nan": np.nan}
+
+
+class ExpressionError(ValueError):
+    """An expression that does not parse, uses something outside the sandbox, or fails to evaluate"""
+
+
+def resolve_field(name: str) -> str:
+    return FIELD_ALIASES.get(name, name)
+
+
+def parse_column_definition(definition: str) -> Tuple[str, str]:
+    """'name = expression' -> (name, expression)"""
+    match = COLUMN_DEFINITION.match(definition)
+    if not match:
+        raise ExpressionError(f"Custom column must look like 'name = expression': {definition!r}")
+    name, expression = match.group(1), match.group(2).strip()
+    if name.lower() in RESERVED_NAMES or name in FUNCTIONS or name in FIELD_ALIASES:
+        raise ExpressionError(f"'{name}' is reserved and cannot name a column")
+    return name, expression
+
+
+def to_cell(value: Any) -> Any:
+    """JSON-safe cell value: NumPy scalars unwrapped, NaN and inf as None"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+class ColumnTable:
+    """ETF rows as lazily built column arrays: float for numbers (None -> NaN), object otherwise"""
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.rows = rows
+        self.columns: Dict[str, np.ndarray] = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, name: str, values: np.ndarray):
+        self.columns[name] = values
+
+    def column(self, name: str) -> np.ndarray:
+        if name not in self.columns:
+            values = [row.get(name) for row in self.rows]
+            present = [value for value in values if value is not None]
+            if present and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+                self.columns[name] = np.array([np.nan if value is None else value for value in values], dtype=float)
+            elif present and all(isinstance(value, bool) for value in present):
+                self.columns[name] = np.array([bool(value) for value in values])
+            else:
+                self.columns[name] = np.array(values, dtype=object)
+        return self.columns[name]
+
+    def has(self, name: str) -> bool:
+        return name in self.columns or any(name in row for row in self.rows)
+
+
+class CompiledExpression:
+    """An expression compiled to a tree of NumPy closures; evaluation never touches eval()"""
+
+    def __init__(self, source: str, digest: str, evaluate: Callable[[ColumnTable], Any], fields: Set[str]):
+        self.source = source
+        self.digest = digest
+        self._evaluate = evaluate
+        self.fields = fields
+
+    def evaluate(self, table: ColumnTable) -> np.ndarray:
+        missing = [field for field in self.fields if not table.has(field)]
+        if missing and len(table):
+            raise ExpressionError(f"Unknown field(s): {', '.join(sorted(missing))}")
+        try:
+            with np.errstate(all='ignore'):
+                result = self._evaluate(table)
+        except ExpressionError:
+            raise
+        except Exception as e:
+            raise ExpressionError(f"Cannot evaluate {self.source!r}: {e}")
+        result = np.asarray(result)
+        if result.ndim == 0:
+            result = np.full(len(table), result.item(), dtype=result.dtype if result.dtype != object else object)
+        if result.shape != (len(table),):
+            raise ExpressionError(f"{self.source!r} must give one value per row, got shape {result.shape} for {len(table)} rows")
+        return result
+
+    def mask(self, table: ColumnTable) -> np.ndarray:
+        """Evaluate as a row filter; NaN and None count as False"""
+        result = self.evaluate(table)
+        if result.dtype == bool:
+            return result
+        if result.dtype.kind in 'fiu':
+            return np.nan_to_num(result.astype(float), nan=0.0) != 0
+        return np.array([bool(value) for value in result])
+
+
+class ExpressionCompiler:
+    """Whitelisting compiler from a Python-like expression syntax to NumPy closures.
+
+    Only arithmetic, comparisons, and/or/not, `x if c else y`, `in` against a
+    literal list, field names, literals and the FUNCTIONS table are accepted.
+    Compiled expressions are cached by a digest of their source.
+    """
+
+    def __init__(self, cache_size: int = EXPRESSION_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, CompiledExpression]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def compile(self, source: str) -> CompiledExpression:
+        source = source.strip()
+        digest = hashlib.sha1(source.encode()).hexdigest()
+        with self._lock:
+            compiled = self._cache.get(digest)
+            if compiled is not None:
+                self._cache.move_to_end(digest)
+                self.hits += 1
+                return compiled
+        compiled = self._compile(source, digest)
+        with self._lock:
+            self.misses += 1
+            self._cache[digest] = compiled
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return compiled
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+    def _compile(self, source: str, digest: str) -> CompiledExpression:
+        if not source:
+            raise ExpressionError("Expression is empty")
+        if len(source) > EXPRESSION_MAX_LENGTH:
+            raise ExpressionError(f"Expression is longer than {EXPRESSION_MAX_LENGTH} characters")
+        try:
+            tree = ast.parse(source, mode="eval")
+        except SyntaxError as e:
+            raise ExpressionError(f"Invalid expression {source!r}: {e.msg}")
+        if sum(1 for _ in ast.walk(tree)) > EXPRESSION_MAX_NODES:
+            raise ExpressionError(f"Expression has more than {EXPRESSION_MAX_NODES} parts")
+        fields: Set[str] = set()
+        return CompiledExpression(source, digest, self._node(tree.body, fields), fields)
+
+    def _node(self, node: ast.AST, fields: Set[str]) -> Callable[[ColumnTable], Any]:
+        if isinstance(node, ast.Constant):
+            value = node.value
+            if isinstance(value, bool) or isinstance(value, str):
+                return lambda table: value
+            if isinstance(value, (int, float)):
+                # NumPy scalars overflow to inf instead of building huge Python ints
+                number = np.float64(value)
+                return lambda table: number
+            raise ExpressionError(f"Unsupported literal {value!r}")
+
+        if isinstance(node, ast.Name):
+            if node.id.lower() in CONSTANTS:
+                constant = CONSTANTS[node.id.lower()]
+                return lambda table: constant
+            field = resolve_field(node.id)
+            fields.add(field)
+            return lambda table: table.column(field)
+
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+            function = BINARY_OPERATORS[type(node.op)]
+            left, right = self._node(node.left, fields), self._node(node.right, fields)
+            return lambda table: function(left(table), right(table))
+
+        if isinstance(node, ast.UnaryOp):
+            operand = self._node(node.operand, fields)
+            if isinstance(node.op, ast.Not):
+                return lambda table: np.logical_not(operand(table))
+            if isinstance(node.op, ast.USub):
+                return lambda table: np.negative(operand(table))
+            if isinstance(node.op, ast.UAdd):
+                return operand
+
+        if isinstance(node, ast.BoolOp):
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            parts = [self._node(value, fields) for value in node.values]
+            return lambda table: functools.reduce(combine, (part(table) for part in parts))
+
+        if isinstance(node, ast.Compare):
+            return self._compare(node, fields)
+
+        if isinstance(node, ast.IfExp):
+            test, body, orelse = (self._node(part, fields) for part in (node.test, node.body, node.orelse))
+            return lambda table: np.where(test(table), body(table), orelse(table))
+
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+                name = node.func.id if isinstance(node.func, ast.Name) else ast.dump(node.func)
+                raise ExpressionError(f"Unknown function {name!r}. Available: {', '.join(FUNCTIONS)}")
+            low, high = FUNCTION_ARITY[node.func.id]
+            if len(node.args) < low or (high is not None and len(node.args) > high):
+                expected = str(low) if low == high else f"at least {low}" if high is None else f"{low} to {high}"
+                raise ExpressionError(f"{node.func.id}() takes {expected} argument(s), got {len(node.args)}")
+            function = FUNCTIONS[node.func.id]
+            arguments = [self._node(argument, fields) for argument in node.args]
+            return lambda table: function(*(argument(table) for argument in arguments))
+
+        raise ExpressionError(f"'{ast.unparse(node)}' is not allowed in an expression")
+
+    def _compare(self, node: ast.Compare, fields: Set[str]) -> Callable[[ColumnTable], Any]:
+        steps = []
+        for op, comparator in zip(node.ops, node.comparators):
+            if isinstance(op, (ast.In, ast.NotIn)):
+                if not isinstance(comparator, (ast.List, ast.Tuple, ast.Set)):
+                    raise ExpressionError("'in' needs a literal list, e.g. sector in ('Technology', 'Energy')")
+                if not all(isinstance(element, ast.Constant) for element in comparator.elts):
+                    raise ExpressionError("'in' lists may only hold literals")
+                members = [element.value for element in comparator.elts]
+                negate = isinstance(op, ast.NotIn)
+                steps.append((lambda left, right, m=members, n=negate: np.isin(left, m, invert=n), None))
+            elif type(op) in COMPARISON_OPERATORS:
+                steps.append((COMPARISON_OPERATORS[type(op)], self._node(comparator, fields)))
+            else:
+                raise ExpressionError(f"Unsupported comparison in '{ast.unparse(node)}'")
+        first = self._node(node.left, fields)
+
+        def compare(table):
+            # Chained comparisons (1 < x <= 5) are and-ed pairwise, like Python
+            left = first(table)
+            result = None
+            for function, right in steps:
+                right_value = right(table) if right is not None else None
+                step = np.asarray(function(left, right_value))
+                result = step if result is None else np.logical_and(result, step)
+                left = right_value
+            return result
+        return compare
+
+
+expression_compiler = ExpressionCompiler()
@@ -0,0 +1,272 @@
+import copy
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Tuple, Optional, Callable, Awaitable
+
+import numpy as np
+
+from bulk_writer import content_hash
+from metrics_engine import BarPanel, ATR_PERIOD, true_range
+
+DEFAULT_FORMULA_CONFIG = {
+    "relative_strength": {
+        "strong_threshold": 0.10,
+        "moderate_threshold": 0.02,
+        "formula": "(ETF_Return - SPY_Return) / |SPY_Return|"
+    },
+    "sata_weights": {
+        "performance": 0.40,
+        "relative_strength": 0.30,
+        "volume": 0.20,
+        "volatility": 0.10,
+        "formula": "Weighted_Score = (Performance × 0.40) + (RS × 0.30) + (Volume × 0.20) + (Volatility × 0.10)"
+    },
+    "atr_calculation": {
+        "period_days": 14,
+        "high_volatility_threshold": 3.0
+    },
+    "gmma_patterns": {
+        "bullish_requirement": "EMA3 > EMA5 > ... > EMA50 > EMA60 (RWB)",
+        "bearish_requirement": "EMA3 < EMA5 < ... < EMA50 < EMA60 (BWR)",
+        "compression_requirement": "Ribbon width < 1% of price"
+    }
+}
+
+SATA_COMPONENTS = ("performance", "relative_strength", "volume", "volatility")
+
+# Bookkeeping fields stored next to the config that do not change its version
+CONFIG_META_FIELDS = ("version", "updated_at")
+
+# True-range bars kept per ticker, enough to re-apply any allowed ATR period
+FORMULA_TR_BARS = 100
+
+
+def merge_config(config: Dict[str, Any], defaults: Dict[str, Any] = DEFAULT_FORMULA_CONFIG) -> Dict[str, Any]:
+    """Stored config laid over the defaults, one section deep"""
+    merged = copy.deepcopy(defaults)
+    for section, values in (config or {}).items():
+        if isinstance(values, dict) and isinstance(merged.get(section), dict):
+            merged[section].update(values)
+        else:
+            merged[section] = values
+    return merged
+
+
+def config_version(config: Dict[str, Any]) -> str:
+    """Short content digest identifying a merged formula config"""
+    return content_hash(merge_config(config), CONFIG_META_FIELDS)[:12]
+
+
+def numeric_fields(config: Dict[str, Any] = DEFAULT_FORMULA_CONFIG) -> List[str]:
+    """Dotted paths of every tunable number in a config, e.g. 'sata_weights.volume'"""
+    return [
+        f"{section}.{name}"
+        for section, values in config.items() if isinstance(values, dict)
+        for name, value in values.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    ]
+
+
+def set_field(config: Dict[str, Any], path: str, value: Any) -> Dict[str, Any]:
+    """Copy of `config` with one dotted-path field replaced"""
+    section, name = path.split(".", 1)
+    updated = copy.deepcopy(config)
+    updated.setdefault(section, {})[name] = value
+    return updated
+
+
+class FormulaConfig:
+    """The `/formulas/config` document compiled into vectorized scoring functions.
+
+    SATA is the documented weighted score: performance, relative strength,
+    volume and volatility are each scored 0-10 and averaged with the
+    configured weights, then rounded and clamped to 1-10. This is the only
+    SATA definition; it replaced the earlier 5 +/- points score, which ignored
+    relative strength, so the same inputs can score differently than before.
+    """
+
+    def __init__(self, config: Dict[str, Any] = None):
+        self.config = merge_config(config or {})
+        weights = self.config["sata_weights"]
+        rs = self.config["relative_strength"]
+        atr = self.config["atr_calculation"]
+        try:
+            self.weights = np.array([float(weights[name]) for name in SATA_COMPONENTS])
+            self.strong_threshold = float(rs["strong_threshold"])
+            self.moderate_threshold = float(rs["moderate_threshold"])
+            self.atr_period = int(atr["period_days"])
+            self.high_volatility_threshold = float(atr["high_volatility_threshold"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid formula configuration: {e}")
+
+        if (self.weights < 0).any() or self.weights.sum() <= 0:
+            raise ValueError("SATA weights must be non-negative and not all zero")
+        if not 0 <= self.moderate_threshold <= self.strong_threshold:
+            raise ValueError("relative_strength thresholds must satisfy 0 <= moderate <= strong")
+        if not 1 <= self.atr_period <= FORMULA_TR_BARS:
+            raise ValueError(f"atr_calculation.period_days must be between 1 and {FORMULA_TR_BARS}")
+        self.version = config_version(self.config)
+
+    def components(self, change_1m, volume, atr_percent, rs_1m) -> Tuple[np.ndarray, ...]:
+        """0-10 score per SATA component; NaN inputs score a neutral 5"""
+        with np.errstate(invalid='ignore'):
+            performance = np.select(
+                [change_1m > 10, change_1m > 5, change_1m < -10, change_1m < -5], [10.0, 7.5, 0.0, 2.5], 5.0
+            )
+            strong, moderate = self.strong_threshold, self.moderate_threshold
+            relative_strength = np.select(
+                [rs_1m >= strong, rs_1m >= moderate, rs_1m <= -strong, rs_1m <= -moderate], [10.0, 7.5, 0.0, 2.5], 5.0
+            )
+            volume_score = np.where(np.asarray(volume) > 1000000, 10.0, 5.0)
+            volatility = np.select([(atr_percent > 2) & (atr_percent < 5), atr_percent > 8], [10.0, 0.0], 5.0)
+        return performance, relative_strength, volume_score, volatility
+
+    def sata(self, change_1m, volume, atr_percent, rs_1m) -> np.ndarray:
+        """Weighted SATA score 1-10 for arrays of any (matching) shape"""
+        components = self.components(change_1m, volume, atr_percent, rs_1m)
+        weighted = sum(weight * score for weight, score in zip(self.weights, components)) / self.weights.sum()
+        return np.clip(np.rint(weighted), 1, 10).astype(np.int64)
+
+
+def true_range_tail(panel: BarPanel, bars: int = FORMULA_TR_BARS) -> np.ndarray:
+    """Last `bars` rows of the panel's true range, NaN-padded on top when the panel is shorter"""
+    ranges = true_range(panel)[-bars:]
+    if ranges.shape[0] < bars:
+        ranges = np.vstack([np.full((bars - ranges.shape[0], ranges.shape[1]), np.nan), ranges])
+    return ranges
+
+
+class MetricTable:
+    """Per-ticker inputs of the formula-driven columns, kept from the last refresh.
+
+    Holds the fixed 14-bar ATR% the refresh computed plus a true-range tail,
+    so a new formula config re-scores ATR% and SATA for the whole universe
+    in one vectorized pass without reading bars or calling upstream.
+    """
+
+    COLUMNS = ("current_price", "change_1m", "volume", "relative_strength_1m", "atr_percent")
+
+    def __init__(
+        self,
+        tickers: List[str],
+        columns: Dict[str, np.ndarray],
+        tr_tail: np.ndarray,
+        computed_at: Optional[datetime] = None
+    ):
+        self.tickers = list(tickers)
+        self.columns = {name: np.asarray(columns[name], dtype=float) for name in self.COLUMNS}
+        self.tr_tail = tr_tail
+        # The refresh the inputs came from, as stamped on the ETF rows it wrote
+        self.computed_at = computed_at
+        self._positions = {ticker: i for i, ticker in enumerate(self.tickers)}
+
+    @classmethod
+    def from_metrics(cls, panel: BarPanel, metrics: Dict[str, np.ndarray], computed_at: Optional[datetime] = None) -> "MetricTable":
+        return cls(panel.tickers, metrics, true_range_tail(panel), computed_at)
+
+    @classmethod
+    def from_documents(cls, docs: List[Dict[str, Any]], panel: BarPanel) -> "MetricTable":
+        """Cold-start table from stored ETF rows and bar-store bars.
+
+        Stored ATR% may come from another period, so it is recomputed from
+        the true-range tail rather than reused.
+        """
+        rows = {doc["ticker"]: doc for doc in docs}
+        positions = [i for i, ticker in enumerate(panel.tickers) if ticker in rows]
+        tickers = [panel.tickers[i] for i in positions]
+        columns = {
+            name: np.array([rows[ticker].get(name, np.nan) for ticker in tickers], dtype=float)
+            for name in cls.COLUMNS if name != "atr_percent"
+        }
+        columns["atr_percent"] = np.full(len(tickers), np.nan)
+        stamps = {doc.get("computed_at") for doc in docs}
+        computed_at = stamps.pop() if len(stamps) == 1 else None
+        return cls(tickers, columns, true_range_tail(panel)[:, positions], computed_at)
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def covers(self, docs: List[Dict[str, Any]]) -> bool:
+        """Whether the stored rows all come from this table's refresh and every ticker is in it"""
+        return self.computed_at is not None and all(
+            doc.get("computed_at") == self.computed_at and doc["ticker"] in self._positions
+            for doc in docs
+        )
+
+    def position(self, ticker: str) -> Optional[int]:
+        return self._positions.get(ticker)
+
+    def atr_percent(self, period: int) -> np.ndarray:
+        """ATR% over `period` bars; the refresh's own values are reused for the default period"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            recomputed = self.tr_tail[-period:].mean(axis=0) / self.columns["current_price"] * 100
+        if period == ATR_PERIOD:
+            return np.where(np.isnan(self.columns["atr_percent"]), recomputed, self.columns["atr_percent"])
+        return recomputed
+
+    def score(self, formula: FormulaConfig) -> Dict[str, np.ndarray]:
+        """Formula-driven columns for every ticker in the table"""
+        atr_percent = self.atr_percent(formula.atr_period)
+        columns = self.columns
+        return {
+            "atr_percent": atr_percent,
+            "sata_score": formula.sata(columns["change_1m"], columns["volume"], atr_percent, columns["relative_strength_1m"])
+        }
+
+
+class FormulaService:
+    """The stored formula config, compiled once per version, plus the last refresh's metric table"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.current: Optional[FormulaConfig] = None
+        self.table: Optional[MetricTable] = None
+        # Version field of the stored document `current` was compiled from
+        self._stored_version: Optional[str] = None
+
+    async def stored(self) -> Dict[str, Any]:
+        """Stored config document, unwrapped from a 'config' key if needed"""
+        doc = await self.collection.find_one({}, {"_id": 0}) or {}
+        return doc.get("config", doc)
+
+    async def get(self) -> FormulaConfig:
+        """Compiled config, recompiled when the stored version changes (e.g. saved by another worker)"""
+        doc = await self.collection.find_one({}, {"_id": 0, "version": 1, "config.version": 1}) or {}
+        version = doc.get("version") or doc.get("config", {}).get("version")
+        if self.current is None or version != self._stored_version:
+            stored = await self.stored()
+            try:
+                self.current = FormulaConfig(stored)
+            except ValueError as e:
+                logging.error(f"Stored formula config is invalid, using defaults: {e}")
+                self.current = FormulaConfig()
+            self._stored_version = version
+        return self.current
+
+    async def table_for(
+        self,
+        docs: List[Dict[str, Any]],
+        load_panel: Callable[[List[str]], Awaitable[BarPanel]]
+    ) -> MetricTable:
+        """The cached metric table when it matches the stored rows, else one rebuilt from them.
+
+        The cache is per process, so a table built by an older refresh (or
+        missing tickers added since) would re-score stale inputs.
+        """
+        if self.table is None or not self.table.covers(docs):
+            panel = await load_panel([doc["ticker"] for doc in docs])
+            self.table = MetricTable.from_documents(docs, panel)
+        return self.table
+
+    async def save(self, config: Dict[str, Any]) -> FormulaConfig:
+        """Validate, version and store a config; raises ValueError before writing anything invalid"""
+        config = {key: value for key, value in config.get("config", config).items() if key not in CONFIG_META_FIELDS}
+        formula = FormulaConfig(config)
+        await self.collection.replace_one(
+            {},
+            {**formula.config, "version": formula.version, "updated_at": datetime.utcnow()},
+            upsert=True
+        )
+        self.current = formula
+        self._stored_version = formula.version
+        return formula
@@ -0,0 +1,98 @@
+import os
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+# Guppy multiple moving average ribbons
+GMMA_SHORT_SPANS = (3, 5, 8, 10, 12, 15)
+GMMA_LONG_SPANS = (30, 35, 40, 45, 50, 60)
+GMMA_SPANS = GMMA_SHORT_SPANS + GMMA_LONG_SPANS
+
+# Ribbons whose full width is within this % of price count as compressed
+GMMA_COMPRESSION_PCT = float(os.environ.get('GMMA_COMPRESSION_PCT', '1.0'))
+
+# Extra history loaded ahead of a chart window so the long EMAs are warmed up
+GMMA_WARMUP_PERIOD = os.environ.get('GMMA_WARMUP_PERIOD', '1y')
+
+
+def ema_matrix(values: np.ndarray, spans=GMMA_SPANS) -> np.ndarray:
+    """EMAs of a (bars x tickers) matrix for several spans at once, shaped (spans x bars x tickers).
+
+    Matches pandas ewm(span, adjust=False): each ticker is seeded with its
+    first non-NaN value and NaN bars carry the previous EMA forward.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        values = values[:, None]
+    alphas = (2.0 / (np.asarray(spans, dtype=float) + 1.0))[:, None]
+    out = np.full((len(spans),) + values.shape, np.nan)
+    current = np.full((len(spans), values.shape[1]), np.nan)
+
+    # One vector step per bar covers every span and ticker
+    for i, row in enumerate(values):
+        updated = np.where(np.isnan(current), row, current + alphas * (row - current))
+        current = np.where(np.isnan(row), current, updated)
+        out[:, i] = current
+    return out
+
+
+def classify_ribbons(emas: np.ndarray, close: np.ndarray, compression_pct: float = GMMA_COMPRESSION_PCT) -> np.ndarray:
+    """RWB, BWR, Compression or Mixed from the 12 EMAs at one bar, shaped (spans x tickers).
+
+    RWB means every EMA sits above the next slower one, so the whole fan is
+    stacked bullishly; BWR is the mirror image. A fan narrower than
+    `compression_pct` of price is a compression, anything else is Mixed.
+    """
+    steps = np.diff(emas, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rwb = np.all(steps < 0, axis=0)
+        bwr = np.all(steps > 0, axis=0)
+        width = (np.nanmax(emas, axis=0) - np.nanmin(emas, axis=0)) / close * 100
+        compressed = width < compression_pct
+    valid = ~np.isnan(emas).any(axis=0)
+    patterns = np.select([rwb, bwr, compressed], ["RWB", "BWR", "Compression"], "Mixed")
+    return np.where(valid, patterns, "Mixed")
+
+
+def gmma_metrics(close: np.ndarray, emas: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """Latest GMMA pattern and ribbon spread for every column of a close matrix.
+
+    `emas` may carry the latest 12 EMAs per column (spans x tickers, NaN where
+    unknown), e.g. from the incremental indicator state that also tracks the
+    swing; only the missing columns are computed from `close`.
+    """
+    if close.shape[0] == 0:
+        return {"gmma_pattern": np.full(close.shape[1], "Mixed"), "gmma_spread": np.zeros(close.shape[1])}
+
+    emas = np.full((len(GMMA_SPANS), close.shape[1]), np.nan) if emas is None else np.array(emas, dtype=float)
+    missing = np.flatnonzero(np.isnan(emas).any(axis=0))
+    if missing.size:
+        emas[:, missing] = ema_matrix(close[:, missing])[:, -1]
+    short = emas[:len(GMMA_SHORT_SPANS)]
+    long = emas[len(GMMA_SHORT_SPANS):]
+    last_close = close[-1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Gap between the ribbon means, as % of price; positive when short is above long
+        spread = (short.mean(axis=0) - long.mean(axis=0)) / last_close * 100
+    return {
+        "gmma_pattern": classify_ribbons(emas, last_close),
+        "gmma_spread": np.where(np.isnan(spread), 0.0, spread)
+    }
+
+
+def gmma_series(close, bars: int = None) -> Dict[str, Any]:
+    """Chart ribbons for one ticker; `bars` keeps only the most recent values"""
+    close = np.asarray(close, dtype=float)
+    emas = ema_matrix(close)[:, :, 0]
+    patterns = classify_ribbons(emas[:, -1:], close[-1:]) if close.size else ["Mixed"]
+    if bars is not None:
+        emas = emas[:, -bars:]
+
+    def ribbon(spans, offset):
+        return {str(span): [None if np.isnan(v) else float(v) for v in emas[offset + i]] for i, span in enumerate(spans)}
+
+    return {
+        "short": ribbon(GMMA_SHORT_SPANS, 0),
+        "long": ribbon(GMMA_LONG_SPANS, len(GMMA_SHORT_SPANS)),
+        "pattern": str(patterns[0])
+    }
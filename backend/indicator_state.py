@@ -0,0 +1,184 @@
+import copy
+from collections import deque
+from typing import Optional, Dict, Any, Iterable
+
+import numpy as np
+
+from indicators import StreamingIndicatorSet, STATE_INDICATOR_SET
+from swing import is_swing_bar
+
+ATR_PERIOD = 14
+SMA_PERIOD = 20
+
+# Guppy short/long EMA spans plus the 20-day EMA
+EMA_SPANS = (3, 5, 8, 10, 12, 15, 20, 30, 35, 40, 45, 50, 60)
+
+
+class IndicatorState:
+    """Running ATR, SMA20, EMA, streaming indicator and swing values for one ticker, updated one bar at a time.
+
+    Re-applying a bar with the same timestamp as the last one (a partial
+    intraday bar being completed) rolls back to the state before that bar
+    first, so every update stays O(1).
+    """
+
+    def __init__(self):
+        self.last_ts: Optional[int] = None
+        self.last_close: Optional[float] = None
+        self.count = 0
+        self.tr_window = deque(maxlen=ATR_PERIOD)
+        self.close_window = deque(maxlen=SMA_PERIOD)
+        self.atr_wilder: Optional[float] = None
+        self.emas: Dict[int, Optional[float]] = {span: None for span in EMA_SPANS}
+        self.indicators = StreamingIndicatorSet(STATE_INDICATOR_SET)
+        # Current swing (see swing.SWING_RULE): first bar timestamp and bars so far
+        self.swing_start_ts: Optional[int] = None
+        self.swing_bars = 0
+        self.previous: Optional["IndicatorState"] = None
+
+    @property
+    def atr(self) -> Optional[float]:
+        """Simple 14-bar mean of true range, matching rolling(14).mean()"""
+        if len(self.tr_window) < ATR_PERIOD:
+            return None
+        return sum(self.tr_window) / ATR_PERIOD
+
+    @property
+    def sma20(self) -> Optional[float]:
+        if len(self.close_window) < SMA_PERIOD:
+            return None
+        return sum(self.close_window) / SMA_PERIOD
+
+    def _snapshot(self) -> "IndicatorState":
+        snapshot = copy.copy(self)
+        snapshot.tr_window = deque(self.tr_window, maxlen=ATR_PERIOD)
+        snapshot.close_window = deque(self.close_window, maxlen=SMA_PERIOD)
+        snapshot.emas = dict(self.emas)
+        snapshot.indicators = self.indicators.copy()
+        snapshot.previous = None
+        return snapshot
+
+    def _restore(self, other: "IndicatorState"):
+        self.__dict__.update(other._snapshot().__dict__)
+
+    def update(self, ts: int, high: float, low: float, close: float, keep_previous: bool = True):
+        """Apply one bar; a bar at the current last timestamp replaces it.
+
+        `keep_previous=False` skips the rollback snapshot for bars that are
+        known not to be the last one.
+        """
+        if self.last_ts is not None and ts < self.last_ts:
+            raise ValueError(f"Bar at {ts} is older than state at {self.last_ts}")
+        if self.last_ts is not None and ts == self.last_ts:
+            if self.previous is None:
+                raise ValueError("Cannot replace the first bar without a previous state")
+            self._restore(self.previous)
+
+        self.previous = self._snapshot() if keep_previous else None
+
+        if self.last_close is None:
+            true_range = high - low
+        else:
+            true_range = max(high - low, abs(high - self.last_close), abs(low - self.last_close))
+
+        self.tr_window.append(true_range)
+        self.close_window.append(close)
+        self.count += 1
+
+        # Wilder smoothing, seeded with the simple mean of the first 14 true ranges
+        if self.count == ATR_PERIOD:
+            self.atr_wilder = sum(self.tr_window) / ATR_PERIOD
+        elif self.count > ATR_PERIOD:
+            self.atr_wilder = (self.atr_wilder * (ATR_PERIOD - 1) + true_range) / ATR_PERIOD
+
+        for span, value in self.emas.items():
+            alpha = 2 / (span + 1)
+            self.emas[span] = close if value is None else value + alpha * (close - value)
+
+        self.indicators.update(high, low, close)
+
+        if is_swing_bar(self.emas, close, self.sma20):
+            if self.swing_start_ts is None:
+                self.swing_start_ts = ts
+            self.swing_bars += 1
+        else:
+            self.swing_start_ts = None
+            self.swing_bars = 0
+
+        self.last_ts = ts
+        self.last_close = close
+
+    def advance(self, bars: np.ndarray) -> int:
+        """Apply structured bars at or after the last timestamp; returns bars applied"""
+        if self.last_ts is not None:
+            bars = bars[bars['ts'] >= self.last_ts]
+        last = len(bars) - 1
+        for i, bar in enumerate(bars):
+            # Only the final bar can be replaced later, so only it needs a rollback snapshot
+            self.update(int(bar['ts']), float(bar['high']), float(bar['low']), float(bar['close']), keep_previous=i == last)
+        return len(bars)
+
+    def can_advance(self, bars: np.ndarray) -> bool:
+        """Whether new bars continue this state rather than rewriting older history"""
+        if bars.size == 0 or self.last_ts is None:
+            return True
+        first = int(bars['ts'][0])
+        return first > self.last_ts or (first == self.last_ts and self.previous is not None)
+
+    @classmethod
+    def from_bars(cls, bars: Iterable) -> "IndicatorState":
+        state = cls()
+        state.advance(np.asarray(bars))
+        return state
+
+    def values(self) -> Dict[str, Any]:
+        return {
+            "last_ts": self.last_ts,
+            "last_close": self.last_close,
+            "atr": self.atr,
+            "atr_wilder": self.atr_wilder,
+            "sma20": self.sma20,
+            "emas": {str(span): value for span, value in self.emas.items()},
+            "indicators": self.indicators.values(),
+            "swing_start_ts": self.swing_start_ts,
+            "swing_bars": self.swing_bars
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "last_ts": self.last_ts,
+            "last_close": self.last_close,
+            "count": self.count,
+            "tr_window": list(self.tr_window),
+            "close_window": list(self.close_window),
+            "atr_wilder": self.atr_wilder,
+            "emas": {str(span): value for span, value in self.emas.items()},
+            "indicators": self.indicators.to_dict(),
+            "swing_start_ts": self.swing_start_ts,
+            "swing_bars": self.swing_bars
+        }
+        if self.previous is not None:
+            data["previous"] = self.previous.to_dict()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "IndicatorState":
+        state = cls()
+        state.last_ts = data["last_ts"]
+        state.last_close = data["last_close"]
+        state.count = data["count"]
+        state.tr_window.extend(data["tr_window"])
+        state.close_window.extend(data["close_window"])
+        state.atr_wilder = data["atr_wilder"]
+        stored = {int(span): value for span, value in data["emas"].items()}
+        if set(stored) != set(EMA_SPANS):
+            raise ValueError("Stored EMA spans differ from EMA_SPANS")
+        state.emas = {span: stored[span] for span in EMA_SPANS}
+        state.indicators = StreamingIndicatorSet.from_dict(data["indicators"])
+        if state.indicators.specs != StreamingIndicatorSet(STATE_INDICATOR_SET).specs:
+            raise ValueError("Stored indicators differ from STATE_INDICATOR_SET")
+        state.swing_start_ts = data["swing_start_ts"]
+        state.swing_bars = data["swing_bars"]
+        if data.get("previous"):
+            state.previous = cls.from_dict(data["previous"])
+        return state
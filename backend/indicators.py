@@ -0,0 +1,570 @@
+import os
+import re
+import copy
+import math
+import threading
+from collections import OrderedDict, deque
+from typing import List, Optional, Dict, Any, Tuple
+
+import numpy as np
+
+from gmma import ema_matrix
+from metrics_engine import BarPanel, true_range
+
+MACD_FAST = 12
+MACD_SLOW = 26
+MACD_SIGNAL = 9
+BB_STDDEV = 2.0
+
+# Batch endpoint limits and cache size
+INDICATOR_MAX_TICKERS = int(os.environ.get('INDICATOR_MAX_TICKERS', '500'))
+INDICATOR_CACHE_MAX_ENTRIES = int(os.environ.get('INDICATOR_CACHE_MAX_ENTRIES', '50000'))
+
+# Recursive indicators are computed over the whole stored history so batch
+# results match the streaming state kept by the bar store exactly
+INDICATOR_HISTORY_PERIOD = os.environ.get('INDICATOR_HISTORY_PERIOD', 'max')
+
+DEFAULT_INDICATOR_SET = "rsi14,adx14,macd,bb20,sma20,sma50,atr14"
+
+# Indicators the bar store keeps up to date bar by bar
+STATE_INDICATOR_SET = "rsi14,adx14,macd,bb20"
+
+SPEC_PATTERN = re.compile(r'^(rsi|adx|atr|sma|ema|bb|macd)(\d+)?$')
+DEFAULT_PERIODS = {"rsi": 14, "adx": 14, "atr": 14, "sma": 20, "ema": 20, "bb": 20}
+
+
+def parse_indicator_set(text: str) -> List[Tuple[str, str, Optional[int]]]:
+    """Parse 'rsi14,adx,macd' into (spec, kind, period) tuples; unknown names raise ValueError"""
+    specs = []
+    for name in text.lower().replace(" ", "").split(","):
+        if not name:
+            continue
+        match = SPEC_PATTERN.match(name)
+        if not match:
+            raise ValueError(f"Unknown indicator: {name}")
+        kind, period = match.group(1), match.group(2)
+        if kind == "macd":
+            if period:
+                raise ValueError("macd takes no period; it is always 12/26/9")
+            spec = (kind, kind, None)
+        else:
+            period = int(period) if period else DEFAULT_PERIODS[kind]
+            if period < 1:
+                raise ValueError(f"Invalid period for {name}")
+            spec = (f"{kind}{period}", kind, period)
+        if spec not in specs:
+            specs.append(spec)
+    if not specs:
+        raise ValueError("No indicators requested")
+    return specs
+
+
+def output_fields(kind: str, period: Optional[int]) -> List[str]:
+    """Value names produced by one indicator spec"""
+    if kind == "adx":
+        return [f"adx{period}", f"plus_di{period}", f"minus_di{period}"]
+    if kind == "macd":
+        return ["macd", "macd_signal", "macd_hist"]
+    if kind == "bb":
+        return [f"bb{period}_{part}" for part in ("upper", "middle", "lower", "width", "percent_b")]
+    return [f"{kind}{period}"]
+
+
+# Streaming (one bar at a time) indicators
+
+class StreamingIndicator:
+    """Base for O(1)-per-bar indicators whose state round-trips through plain dicts"""
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {}
+        for name, value in self.__dict__.items():
+            if isinstance(value, StreamingIndicator):
+                data[name] = value.to_dict()
+            elif isinstance(value, deque):
+                data[name] = list(value)
+            else:
+                data[name] = value
+        return data
+
+    def load(self, data: Dict[str, Any]) -> "StreamingIndicator":
+        for name, value in data.items():
+            current = getattr(self, name)
+            if isinstance(current, StreamingIndicator):
+                current.load(value)
+            elif isinstance(current, deque):
+                current.clear()
+                current.extend(value)
+            else:
+                setattr(self, name, value)
+        return self
+
+    def copy(self) -> "StreamingIndicator":
+        clone = copy.copy(self)
+        for name, value in self.__dict__.items():
+            if isinstance(value, StreamingIndicator):
+                setattr(clone, name, value.copy())
+            elif isinstance(value, deque):
+                setattr(clone, name, deque(value, maxlen=value.maxlen))
+        return clone
+
+
+class WilderAverage(StreamingIndicator):
+    """Wilder smoothing seeded with the simple mean of the first `period` values"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.count = 0
+        self.total = 0.0
+        self.value: Optional[float] = None
+
+    def update(self, x: float) -> Optional[float]:
+        if self.value is None:
+            self.count += 1
+            self.total += x
+            if self.count == self.period:
+                self.value = self.total / self.period
+        else:
+            self.value = (self.value * (self.period - 1) + x) / self.period
+        return self.value
+
+
+class StreamingEMA(StreamingIndicator):
+    """EMA seeded with the first value, matching ewm(adjust=False)"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.value: Optional[float] = None
+
+    def update(self, x: float) -> float:
+        alpha = 2 / (self.period + 1)
+        self.value = x if self.value is None else self.value + alpha * (x - self.value)
+        return self.value
+
+    def bar(self, high: float, low: float, close: float):
+        self.update(close)
+
+    def values(self) -> Dict[str, Optional[float]]:
+        return {f"ema{self.period}": self.value}
+
+
+class StreamingSMA(StreamingIndicator):
+    def __init__(self, period: int):
+        self.period = period
+        self.window = deque(maxlen=period)
+
+    def bar(self, high: float, low: float, close: float):
+        self.window.append(close)
+
+    def values(self) -> Dict[str, Optional[float]]:
+        value = sum(self.window) / self.period if len(self.window) == self.period else None
+        return {f"sma{self.period}": value}
+
+
+class StreamingATR(StreamingIndicator):
+    """Wilder ATR; the first bar's true range is its high - low"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.prev_close: Optional[float] = None
+        self.average = WilderAverage(period)
+
+    def bar(self, high: float, low: float, close: float):
+        if self.prev_close is None:
+            tr = high - low
+        else:
+            tr = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.average.update(tr)
+        self.prev_close = close
+
+    def values(self) -> Dict[str, Optional[float]]:
+        return {f"atr{self.period}": self.average.value}
+
+
+class StreamingRSI(StreamingIndicator):
+    """Wilder RSI"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.prev_close: Optional[float] = None
+        self.gains = WilderAverage(period)
+        self.losses = WilderAverage(period)
+
+    def bar(self, high: float, low: float, close: float):
+        if self.prev_close is not None:
+            delta = close - self.prev_close
+            self.gains.update(max(delta, 0.0))
+            self.losses.update(max(-delta, 0.0))
+        self.prev_close = close
+
+    def values(self) -> Dict[str, Optional[float]]:
+        gain, loss = self.gains.value, self.losses.value
+        if gain is None:
+            value = None
+        else:
+            value = 50.0 if gain + loss == 0 else 100 * gain / (gain + loss)
+        return {f"rsi{self.period}": value}
+
+
+class StreamingADX(StreamingIndicator):
+    """Wilder ADX with +DI/-DI"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.prev: Optional[List[float]] = None
+        self.tr = WilderAverage(period)
+        self.plus_dm = WilderAverage(period)
+        self.minus_dm = WilderAverage(period)
+        self.adx = WilderAverage(period)
+        self.plus_di: Optional[float] = None
+        self.minus_di: Optional[float] = None
+
+    def bar(self, high: float, low: float, close: float):
+        if self.prev is not None:
+            prev_high, prev_low, prev_close = self.prev
+            up = high - prev_high
+            down = prev_low - low
+            self.tr.update(max(high - low, abs(high - prev_close), abs(low - prev_close)))
+            self.plus_dm.update(up if up > down and up > 0 else 0.0)
+            self.minus_dm.update(down if down > up and down > 0 else 0.0)
+            if self.tr.value is not None:
+                if self.tr.value == 0:
+                    self.plus_di = self.minus_di = 0.0
+                else:
+                    self.plus_di = 100 * self.plus_dm.value / self.tr.value
+                    self.minus_di = 100 * self.minus_dm.value / self.tr.value
+                di_sum = self.plus_di + self.minus_di
+                self.adx.update(0.0 if di_sum == 0 else 100 * abs(self.plus_di - self.minus_di) / di_sum)
+        self.prev = [high, low, close]
+
+    def values(self) -> Dict[str, Optional[float]]:
+        return {
+            f"adx{self.period}": self.adx.value,
+            f"plus_di{self.period}": self.plus_di,
+            f"minus_di{self.period}": self.minus_di
+        }
+
+
+class StreamingMACD(StreamingIndicator):
+    def __init__(self, fast: int = MACD_FAST, slow: int = MACD_SLOW, signal: int = MACD_SIGNAL):
+        self.fast = StreamingEMA(fast)
+        self.slow = StreamingEMA(slow)
+        self.signal = StreamingEMA(signal)
+
+    def bar(self, high: float, low: float, close: float):
+        self.signal.update(self.fast.update(close) - self.slow.update(close))
+
+    def values(self) -> Dict[str, Optional[float]]:
+        if self.signal.value is None:
+            return {"macd": None, "macd_signal": None, "macd_hist": None}
+        macd = self.fast.value - self.slow.value
+        return {"macd": macd, "macd_signal": self.signal.value, "macd_hist": macd - self.signal.value}
+
+
+class StreamingBollinger(StreamingIndicator):
+    """Bollinger bands with a population standard deviation"""
+
+    def __init__(self, period: int, stddev: float = BB_STDDEV):
+        self.period = period
+        self.stddev = stddev
+        self.window = deque(maxlen=period)
+
+    def bar(self, high: float, low: float, close: float):
+        self.window.append(close)
+
+    def values(self) -> Dict[str, Optional[float]]:
+        fields = output_fields("bb", self.period)
+        if len(self.window) < self.period:
+            return dict.fromkeys(fields)
+        middle = sum(self.window) / self.period
+        std = math.sqrt(sum((x - middle) ** 2 for x in self.window) / self.period)
+        upper, lower = middle + self.stddev * std, middle - self.stddev * std
+        close = self.window[-1]
+        width = (upper - lower) / middle * 100 if middle else None
+        percent_b = (close - lower) / (upper - lower) if upper != lower else 0.5
+        return dict(zip(fields, (upper, middle, lower, width, percent_b)))
+
+
+STREAMING_INDICATORS = {
+    "rsi": StreamingRSI,
+    "adx": StreamingADX,
+    "atr": StreamingATR,
+    "sma": StreamingSMA,
+    "ema": StreamingEMA,
+    "bb": StreamingBollinger,
+    "macd": StreamingMACD
+}
+
+
+def build_streaming(kind: str, period: Optional[int]) -> StreamingIndicator:
+    cls = STREAMING_INDICATORS[kind]
+    return cls() if period is None else cls(period)
+
+
+class StreamingIndicatorSet:
+    """Several streaming indicators for one ticker, fed the same bars"""
+
+    def __init__(self, indicator_set: str = STATE_INDICATOR_SET):
+        self.indicators: Dict[str, StreamingIndicator] = {
+            spec: build_streaming(kind, period) for spec, kind, period in parse_indicator_set(indicator_set)
+        }
+
+    @property
+    def specs(self) -> List[str]:
+        return list(self.indicators)
+
+    def update(self, high: float, low: float, close: float):
+        for indicator in self.indicators.values():
+            indicator.bar(high, low, close)
+
+    def values(self, specs: Optional[List[str]] = None) -> Dict[str, Optional[float]]:
+        values = {}
+        for spec in specs or self.indicators:
+            values.update(self.indicators[spec].values())
+        return values
+
+    def copy(self) -> "StreamingIndicatorSet":
+        clone = copy.copy(self)
+        clone.indicators = {spec: indicator.copy() for spec, indicator in self.indicators.items()}
+        return clone
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {spec: indicator.to_dict() for spec, indicator in self.indicators.items()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "StreamingIndicatorSet":
+        indicator_set = cls(",".join(data))
+        for spec, indicator in indicator_set.indicators.items():
+            indicator.load(data[spec])
+        return indicator_set
+
+
+# Vectorized (bars x tickers) indicators
+
+def wilder_matrix(values: np.ndarray, period: int) -> np.ndarray:
+    """Column-wise WilderAverage over a matrix; NaN entries are skipped like missing bars"""
+    out = np.full(values.shape, np.nan)
+    count = np.zeros(values.shape[1], dtype=np.int64)
+    total = np.zeros(values.shape[1])
+    current = np.full(values.shape[1], np.nan)
+
+    for i, row in enumerate(values):
+        valid = ~np.isnan(row)
+        seeded = ~np.isnan(current)
+        current = np.where(valid & seeded, (current * (period - 1) + row) / period, current)
+        seeding = valid & ~seeded
+        count += seeding
+        total = np.where(seeding, total + row, total)
+        current = np.where(seeding & (count == period), total / period, current)
+        out[i] = current
+    return out
+
+
+class IndicatorContext:
+    """Memoized intermediates shared by every indicator computed over one panel"""
+
+    def __init__(self, panel: BarPanel):
+        self.panel = panel
+        self._memo: Dict[Any, np.ndarray] = {}
+
+    def _cached(self, key, build):
+        if key not in self._memo:
+            self._memo[key] = build()
+        return self._memo[key]
+
+    @property
+    def prev_close(self) -> np.ndarray:
+        return self._cached("prev_close", lambda: self._shift(self.panel.close))
+
+    def _shift(self, matrix: np.ndarray) -> np.ndarray:
+        return np.vstack([np.full((1, matrix.shape[1]), np.nan), matrix[:-1]])
+
+    @property
+    def true_range(self) -> np.ndarray:
+        return self._cached("true_range", lambda: true_range(self.panel))
+
+    @property
+    def delta(self) -> np.ndarray:
+        return self._cached("delta", lambda: self.panel.close - self.prev_close)
+
+    def wilder(self, name: str, period: int, build) -> np.ndarray:
+        return self._cached(("wilder", name, period), lambda: wilder_matrix(build(), period))
+
+    def ema(self, span: int) -> np.ndarray:
+        return self._cached(("ema", span), lambda: ema_matrix(self.panel.close, (span,))[0])
+
+    def window(self, period: int) -> np.ndarray:
+        """Last `period` closes per ticker, NaN where the history is shorter"""
+        close = self.panel.close[-period:]
+        if close.shape[0] < period:
+            close = np.vstack([np.full((period - close.shape[0], close.shape[1]), np.nan), close])
+        return close
+
+    def compute(self, kind: str, period: Optional[int]) -> Dict[str, np.ndarray]:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return getattr(self, f"_{kind}")(period)
+
+    def _rsi(self, period: int) -> Dict[str, np.ndarray]:
+        delta = self.delta
+        gain = self.wilder("gain", period, lambda: np.where(np.isnan(delta), np.nan, np.maximum(delta, 0)))[-1]
+        loss = self.wilder("loss", period, lambda: np.where(np.isnan(delta), np.nan, np.maximum(-delta, 0)))[-1]
+        total = gain + loss
+        return {f"rsi{period}": np.where(total == 0, 50.0, 100 * gain / total)}
+
+    def _atr(self, period: int) -> Dict[str, np.ndarray]:
+        return {f"atr{period}": self.wilder("tr", period, lambda: self.true_range)[-1]}
+
+    def _adx(self, period: int) -> Dict[str, np.ndarray]:
+        panel = self.panel
+        has_prev = ~np.isnan(self.prev_close)
+        up = panel.high - self._cached("prev_high", lambda: self._shift(panel.high))
+        down = self._cached("prev_low", lambda: self._shift(panel.low)) - panel.low
+
+        # ADX starts at the second bar, so the first bar's true range is left out
+        tr = self.wilder("adx_tr", period, lambda: np.where(has_prev, self.true_range, np.nan))
+        plus_dm = self.wilder("plus_dm", period, lambda: np.where(has_prev, np.where((up > down) & (up > 0), up, 0.0), np.nan))
+        minus_dm = self.wilder("minus_dm", period, lambda: np.where(has_prev, np.where((down > up) & (down > 0), down, 0.0), np.nan))
+
+        plus_di = np.where(tr == 0, 0.0, 100 * plus_dm / tr)
+        minus_di = np.where(tr == 0, 0.0, 100 * minus_dm / tr)
+        di_sum = plus_di + minus_di
+        dx = np.where(di_sum == 0, 0.0, 100 * np.abs(plus_di - minus_di) / di_sum)
+        dx = np.where(np.isnan(tr), np.nan, dx)
+        adx = wilder_matrix(dx, period)
+        return {f"adx{period}": adx[-1], f"plus_di{period}": plus_di[-1], f"minus_di{period}": minus_di[-1]}
+
+    def _macd(self, period: None) -> Dict[str, np.ndarray]:
+        macd = self.ema(MACD_FAST) - self.ema(MACD_SLOW)
+        signal = ema_matrix(macd, (MACD_SIGNAL,))[0]
+        return {"macd": macd[-1], "macd_signal": signal[-1], "macd_hist": macd[-1] - signal[-1]}
+
+    def _sma(self, period: int) -> Dict[str, np.ndarray]:
+        return {f"sma{period}": self.window(period).mean(axis=0)}
+
+    def _ema(self, period: int) -> Dict[str, np.ndarray]:
+        return {f"ema{period}": self.ema(period)[-1]}
+
+    def _bb(self, period: int) -> Dict[str, np.ndarray]:
+        window = self.window(period)
+        middle = window.mean(axis=0)
+        std = window.std(axis=0)
+        upper, lower = middle + BB_STDDEV * std, middle - BB_STDDEV * std
+        width = np.where(middle != 0, (upper - lower) / middle * 100, np.nan)
+        percent_b = np.where(upper != lower, (window[-1] - lower) / (upper - lower), 0.5)
+        percent_b = np.where(np.isnan(middle), np.nan, percent_b)
+        return dict(zip(output_fields("bb", period), (upper, middle, lower, width, percent_b)))
+
+
+def compute_indicators(panel: BarPanel, specs: List[Tuple[str, str, Optional[int]]]) -> Dict[str, np.ndarray]:
+    """Latest value of every requested indicator for every panel column in one pass"""
+    context = IndicatorContext(panel)
+    values: Dict[str, np.ndarray] = {}
+    for _, kind, period in specs:
+        values.update(context.compute(kind, period))
+    return values
+
+
+class IndicatorCache:
+    """LRU of per-ticker indicator values, valid while the ticker's last bar is unchanged.
+
+    The validity key is the last bar's (ts, high, low, close), so an intraday
+    partial bar that is rewritten under the same timestamp invalidates the entry.
+
+    Lookups run on executor threads, so access is serialized with a lock.
+    """
+
+    def __init__(self, max_entries: int = INDICATOR_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Tuple, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, ticker: str, spec: str, tail: Tuple) -> Optional[Dict[str, Optional[float]]]:
+        with self._lock:
+            entry = self._entries.get((ticker, spec))
+            if entry is None or entry[0] != tail:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((ticker, spec))
+            self.hits += 1
+            return entry[1]
+
+    def put(self, ticker: str, spec: str, tail: Tuple, values: Dict[str, Optional[float]]):
+        with self._lock:
+            self._entries[(ticker, spec)] = (tail, values)
+            self._entries.move_to_end((ticker, spec))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+
+def _clean(value) -> Optional[float]:
+    if value is None:
+        return None
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+class IndicatorService:
+    """Batch indicator lookups over the bar store.
+
+    Values come from the streaming state the bar store maintains when it is
+    current, then from the cache, and only the rest is computed in one
+    vectorized pass over a panel of the tickers that still need it.
+    """
+
+    def __init__(self, store, cache: Optional[IndicatorCache] = None):
+        self.store = store
+        self.cache = cache or IndicatorCache()
+
+    def compute(self, tickers: List[str], specs: List[Tuple[str, str, Optional[int]]], interval: str = "1d") -> Dict[str, Any]:
+        tails = self.store.tail_keys(tickers, interval)
+        available = [ticker for ticker in tickers if tails.get(ticker) is not None]
+        results: Dict[str, Dict[str, Optional[float]]] = {ticker: {} for ticker in available}
+        sources = {"state": 0, "cache": 0, "computed": 0}
+        pending: Dict[str, List[str]] = {}
+
+        state_specs = set(parse_indicator_set(STATE_INDICATOR_SET))
+        states = self.store.load_states(available, interval) if state_specs & set(specs) else {}
+
+        for ticker in available:
+            state = states.get(ticker)
+            for spec, kind, period in specs:
+                if state is not None and state.last_ts == tails[ticker][0] and (spec, kind, period) in state_specs:
+                    results[ticker].update(state.indicators.values([spec]))
+                    sources["state"] += 1
+                    continue
+                cached = self.cache.get(ticker, spec, tails[ticker])
+                if cached is not None:
+                    results[ticker].update(cached)
+                    sources["cache"] += 1
+                    continue
+                pending.setdefault(spec, []).append(ticker)
+
+        if pending:
+            needed = sorted({ticker for group in pending.values() for ticker in group})
+            needed_specs = [spec for spec in specs if spec[0] in pending]
+            panel = self.store.load_panel(needed, INDICATOR_HISTORY_PERIOD, interval)
+            values = compute_indicators(panel, needed_specs)
+            for spec, kind, period in needed_specs:
+                fields = output_fields(kind, period)
+                for ticker in pending[spec]:
+                    j = panel.position(ticker)
+                    if j is None:
+                        continue
+                    computed = {field: _clean(values[field][j]) for field in fields}
+                    self.cache.put(ticker, spec, tails[ticker], computed)
+                    results[ticker].update(computed)
+                    sources["computed"] += 1
+
+        return {
+            "indicators": {
+                ticker: {field: _clean(value) for field, value in values.items()}
+                for ticker, values in results.items()
+            },
+            "last_bar_ts": {ticker: tails[ticker][0] for ticker in available},
+            "missing": [ticker for ticker in tickers if tails.get(ticker) is None],
+            "sources": sources
+        }
@@ -0,0 +1,373 @@
+import os
+import time
+import asyncio
+import logging
+import functools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, time as dt_time
+from typing import List, Optional, Dict, Any, Tuple, Callable, Hashable, Awaitable, FrozenSet
+
+import yfinance as yf
+import pandas as pd
+import numpy as np
+import pytz
+
+# Batched download settings for universe refreshes
+HISTORY_BATCH_SIZE = int(os.environ.get('HISTORY_BATCH_SIZE', '100'))
+HISTORY_MAX_CONCURRENCY = int(os.environ.get('HISTORY_MAX_CONCURRENCY', '4'))
+
+# Shared by every batch download in the process, so parallel shards cannot multiply the bound
+history_semaphore = asyncio.Semaphore(HISTORY_MAX_CONCURRENCY)
+
+# Dedicated pool for blocking yfinance calls and DataFrame work
+MARKET_DATA_WORKERS = int(os.environ.get('MARKET_DATA_WORKERS', '8'))
+market_data_executor = ThreadPoolExecutor(
+    max_workers=MARKET_DATA_WORKERS,
+    thread_name_prefix="market-data"
+)
+
+NY_TZ = pytz.timezone('America/New_York')
+
+# NYSE session boundaries in New York time
+PRE_MARKET_OPEN = dt_time(4, 0)
+REGULAR_OPEN = dt_time(9, 30)
+REGULAR_CLOSE = dt_time(16, 0)
+AFTER_HOURS_CLOSE = dt_time(20, 0)
+
+# Event loop lag sampling
+EVENT_LOOP_LAG_INTERVAL = float(os.environ.get('EVENT_LOOP_LAG_INTERVAL', '0.1'))
+
+
+def _observed(holiday: date) -> date:
+    """Saturday holidays are observed on Friday, Sunday ones on Monday"""
+    if holiday.weekday() == 5:
+        return holiday - timedelta(days=1)
+    if holiday.weekday() == 6:
+        return holiday + timedelta(days=1)
+    return holiday
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """n-th given weekday of a month; n = -1 is the last one"""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year: int) -> date:
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)"""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 19 * l) // 433
+    month = (h + l - 7 * m + 90) // 25
+    return date(year, month, (h + l - 7 * m + 33 * month + 19) % 32)
+
+
+@functools.lru_cache(maxsize=None)
+def nyse_holidays(year: int) -> FrozenSet[date]:
+    """Full-day NYSE closures for a year, from the exchange's standing holiday rules"""
+    holidays = {
+        _nth_weekday(year, 1, 0, 3),               # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),               # Washington's Birthday
+        _easter(year) - timedelta(days=2),         # Good Friday
+        _nth_weekday(year, 5, 0, -1),              # Memorial Day
+        _observed(date(year, 7, 4)),               # Independence Day
+        _nth_weekday(year, 9, 0, 1),               # Labor Day
+        _nth_weekday(year, 11, 3, 4),              # Thanksgiving
+        _observed(date(year, 12, 25)),             # Christmas
+    }
+    # A Saturday New Year's Day is not observed on the previous Friday
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays.add(_observed(new_year))
+    if year >= 2022:
+        holidays.add(_observed(date(year, 6, 19)))  # Juneteenth
+    return frozenset(holidays)
+
+
+def is_trading_day(day: date) -> bool:
+    return day.weekday() < 5 and day not in nyse_holidays(day.year)
+
+
+def next_market_open(now: Optional[datetime] = None) -> datetime:
+    """Next regular-session open after `now`, skipping weekends and holidays"""
+    ny_time = now.astimezone(NY_TZ) if now else datetime.now(NY_TZ)
+    day = ny_time.date()
+    if ny_time.time() >= REGULAR_OPEN:
+        day += timedelta(days=1)
+    while not is_trading_day(day):
+        day += timedelta(days=1)
+    return NY_TZ.localize(datetime.combine(day, REGULAR_OPEN))
+
+
+def get_market_session(now: Optional[datetime] = None) -> str:
+    """Classify a moment as pre, regular, post or closed for the NYSE"""
+    ny_time = now.astimezone(NY_TZ) if now else datetime.now(NY_TZ)
+    if not is_trading_day(ny_time.date()):
+        return "closed"
+
+    current = ny_time.time()
+    if REGULAR_OPEN <= current < REGULAR_CLOSE:
+        return "regular"
+    if PRE_MARKET_OPEN <= current < REGULAR_OPEN:
+        return "pre"
+    if REGULAR_CLOSE <= current < AFTER_HOURS_CLOSE:
+        return "post"
+    return "closed"
+
+
+async def run_blocking(func: Callable, *args, **kwargs):
+    """Run a blocking market-data call on the dedicated executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(market_data_executor, functools.partial(func, *args, **kwargs))
+
+
+class EventLoopLagMonitor:
+    """Measure how late the event loop wakes up from a fixed-interval sleep"""
+
+    def __init__(self, interval: float = EVENT_LOOP_LAG_INTERVAL, window: int = 3000):
+        self.interval = interval
+        self.samples = deque(maxlen=window)
+        self.max_lag_ms = 0.0
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, (loop.time() - expected) * 1000)
+            self.samples.append((time.time(), lag_ms))
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+
+    def max_lag_since(self, since: float) -> float:
+        """Largest lag sampled since the given wall-clock timestamp"""
+        lags = [lag for ts, lag in self.samples if ts >= since]
+        return round(max(lags), 2) if lags else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        lags = np.array([lag for _, lag in self.samples])
+        if lags.size == 0:
+            return {"running": self._task is not None, "samples": 0}
+        return {
+            "running": self._task is not None,
+            "interval_ms": self.interval * 1000,
+            "samples": int(lags.size),
+            "last_ms": round(float(lags[-1]), 2),
+            "mean_ms": round(float(lags.mean()), 2),
+            "p99_ms": round(float(np.percentile(lags, 99)), 2),
+            "window_max_ms": round(float(lags.max()), 2),
+            "max_ms": round(self.max_lag_ms, 2)
+        }
+
+
+loop_lag_monitor = EventLoopLagMonitor()
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one in-flight upstream fetch"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.executed = 0
+        self.collapsed = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable]):
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.executed += 1
+            task = asyncio.create_task(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.collapsed += 1
+        # Shield so one disconnecting caller does not cancel the fetch for the others
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "executed": self.executed,
+            "collapsed": self.collapsed,
+            "collapse_ratio": round(self.collapsed / self.calls, 4) if self.calls else 0.0,
+            "in_flight": len(self._inflight)
+        }
+
+
+def compute_price_metrics(hist: pd.DataFrame) -> Optional[Dict]:
+    """Calculate price changes, ATR% and volume from daily OHLCV history"""
+    if hist is None or hist.empty:
+        return None
+
+    current_price = hist['Close'].iloc[-1]
+
+    # Calculate percentage changes
+    change_1d = ((current_price - hist['Close'].iloc[-2]) / hist['Close'].iloc[-2] * 100) if len(hist) > 1 else 0
+    change_1w = ((current_price - hist['Close'].iloc[-5]) / hist['Close'].iloc[-5] * 100) if len(hist) > 5 else 0
+    change_1m = ((current_price - hist['Close'].iloc[-22]) / hist['Close'].iloc[-22] * 100) if len(hist) > 22 else 0
+    change_3m = ((current_price - hist['Close'].iloc[-66]) / hist['Close'].iloc[-66] * 100) if len(hist) > 66 else 0
+    change_6m = ((current_price - hist['Close'].iloc[0]) / hist['Close'].iloc[0] * 100) if len(hist) > 0 else 0
+
+    # Calculate ATR
+    high_low = hist['High'] - hist['Low']
+    high_close = np.abs(hist['High'] - hist['Close'].shift())
+    low_close = np.abs(hist['Low'] - hist['Close'].shift())
+    ranges = pd.concat([high_low, high_close, low_close], axis=1)
+    true_range = np.max(ranges, axis=1)
+    atr = true_range.rolling(14).mean().iloc[-1]
+    atr_percent = (atr / current_price) * 100
+
+    return {
+        "current_price": float(current_price),
+        "change_1d": float(change_1d),
+        "change_1w": float(change_1w),
+        "change_1m": float(change_1m),
+        "change_3m": float(change_3m),
+        "change_6m": float(change_6m),
+        "atr_percent": float(atr_percent),
+        "volume": int(hist['Volume'].iloc[-1]) if not pd.isna(hist['Volume'].iloc[-1]) else 0
+    }
+
+
+def split_download(data: pd.DataFrame, tickers: List[str]) -> Dict[str, pd.DataFrame]:
+    """Split a multi-ticker yf.download frame into one OHLCV frame per ticker"""
+    frames = {}
+    if data is None or data.empty:
+        return frames
+
+    if isinstance(data.columns, pd.MultiIndex):
+        available = set(data.columns.get_level_values(0))
+        for ticker in tickers:
+            if ticker not in available:
+                continue
+            frame = data[ticker].dropna(how='all')
+            if not frame.empty:
+                frames[ticker] = frame
+    elif len(tickers) == 1:
+        frame = data.dropna(how='all')
+        if not frame.empty:
+            frames[tickers[0]] = frame
+
+    return frames
+
+
+def download_history(
+    tickers: List[str],
+    period: Optional[str] = "6mo",
+    interval: str = "1d",
+    start: Optional[str] = None
+) -> Dict[str, pd.DataFrame]:
+    """Download history for many tickers in one yfinance call, from `start` if given"""
+    data = yf.download(
+        tickers,
+        period=None if start else period,
+        start=start,
+        interval=interval,
+        group_by="ticker",
+        auto_adjust=True,
+        actions=False,
+        threads=True,
+        progress=False
+    )
+    return split_download(data, tickers)
+
+
+async def download_history_batches(
+    tickers: List[str],
+    period: str = "6mo",
+    batch_size: int = HISTORY_BATCH_SIZE,
+    interval: str = "1d",
+    start: Optional[str] = None,
+    semaphore: Optional[asyncio.Semaphore] = None
+) -> Tuple[Dict[str, pd.DataFrame], Dict[str, Any]]:
+    """Download history for a ticker universe in batches with bounded concurrency.
+
+    Batches wait on the process-wide `history_semaphore` unless another
+    semaphore is given.
+    """
+    started = time.perf_counter()
+    batches = [tickers[i:i + batch_size] for i in range(0, len(tickers), batch_size)]
+    semaphore = semaphore or history_semaphore
+
+    async def run_batch(index: int, batch: List[str]):
+        async with semaphore:
+            batch_started = time.perf_counter()
+            error = None
+            try:
+                frames = await run_blocking(download_history, batch, period, interval, start)
+            except Exception as e:
+                logging.error(f"Error downloading history batch {index} ({len(batch)} tickers): {e}")
+                frames = {}
+                error = str(e)
+
+            failed = [ticker for ticker in batch if ticker not in frames]
+            return frames, {
+                "batch": index,
+                "tickers": len(batch),
+                "fetched": len(frames),
+                "failed": failed,
+                "duration_ms": round((time.perf_counter() - batch_started) * 1000, 1),
+                "error": error
+            }
+
+    results = await asyncio.gather(*(run_batch(i, batch) for i, batch in enumerate(batches)))
+
+    history = {}
+    batch_reports = []
+    for frames, batch_report in results:
+        history.update(frames)
+        batch_reports.append(batch_report)
+
+    report = {
+        "requested": len(tickers),
+        "fetched": len(history),
+        "failed": [ticker for ticker in tickers if ticker not in history],
+        "batches": batch_reports,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+    return history, report
+
+
+def load_history(ticker: str, period: str = "6mo", interval: str = "1d") -> pd.DataFrame:
+    """Blocking single-ticker history fetch"""
+    return yf.Ticker(ticker).history(period=period, interval=interval)
+
+
+def load_ticker_info(ticker: str) -> Dict:
+    """Blocking fetch of Ticker.info"""
+    return yf.Ticker(ticker).info or {}
+
+
+def frame_to_chart_series(hist: pd.DataFrame, date_format: str = "%Y-%m-%d") -> Dict[str, List]:
+    """Convert an OHLCV frame to chart-ready lists"""
+    return {
+        "dates": [d.strftime(date_format) for d in hist.index],
+        "prices": hist['Close'].tolist(),
+        "volumes": hist['Volume'].tolist(),
+        "highs": hist['High'].tolist(),
+        "lows": hist['Low'].tolist(),
+        "opens": hist['Open'].tolist()
+    }
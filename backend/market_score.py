@@ -0,0 +1,155 @@
+from typing import List, Optional, Dict, Any
+
+import numpy as np
+
+from indicators import parse_indicator_set
+
+# Tickers every market score needs besides the universe itself
+VIX_TICKER = "^VIX"
+MARKET_SCORE_TICKERS = ["SPY", "QQQ", VIX_TICKER]
+
+# One year of VIX closes for the fear/greed proxy
+VIX_RANGE_BARS = 252
+
+# Thresholds mapping each raw input to a 1-4 component score
+VIX_LEVELS = (15, 20, 30)
+ATR_PERCENT_LEVELS = (1.0, 1.5, 2.5)
+NHNL_PERCENT_LEVELS = (10, 0, -10)
+QQQ_ATH_DISTANCE_LEVELS = (-3, -8, -15)
+SATA_LEVELS = (7, 6, 5)
+FG_LEVELS = (65, 50, 35)
+
+MARKET_INDICATORS = parse_indicator_set("adx14,rsi14,atr14")
+
+
+def score_descending(value: float, levels) -> int:
+    """4 when value beats the first level, down to 1 below the last (higher is better)"""
+    for score, level in zip((4, 3, 2), levels):
+        if value >= level:
+            return score
+    return 1
+
+
+def score_ascending(value: float, levels) -> int:
+    """4 when value is under the first level, down to 1 above the last (lower is better)"""
+    for score, level in zip((4, 3, 2), levels):
+        if value < level:
+            return score
+    return 1
+
+
+def classify_market_score(total: int) -> Dict[str, str]:
+    """Green/Yellow/Red day from the 8-32 total"""
+    if total >= 28:
+        return {
+            "classification": "Green Day",
+            "recommendation": "Full exposure. Use wider stop losses. Aggressive position sizing."
+        }
+    if total >= 20:
+        return {
+            "classification": "Yellow Day",
+            "recommendation": "Selective entries. Moderate position sizing. Standard stops."
+        }
+    return {
+        "classification": "Red Day",
+        "recommendation": "Risk-off mode. Tight stops or avoid new positions."
+    }
+
+
+def adx_score(readings: List[Dict[str, Optional[float]]]) -> int:
+    """Trend strength and direction of SPY/QQQ: strong uptrend 4, weak uptrend 3, no trend 2, downtrend 1"""
+    scores = []
+    for values in readings:
+        adx, plus_di, minus_di = values.get("adx14"), values.get("plus_di14"), values.get("minus_di14")
+        if adx is None or plus_di is None:
+            continue
+        if plus_di < minus_di and adx >= 20:
+            scores.append(1)
+        elif adx < 20:
+            scores.append(2)
+        else:
+            scores.append(4 if adx >= 25 else 3)
+    return int(round(sum(scores) / len(scores))) if scores else 2
+
+
+def sma(close: np.ndarray, period: int) -> float:
+    close = close[~np.isnan(close)]
+    return float(close[-period:].mean()) if close.size >= period else float('nan')
+
+
+def gmi_conditions(spy: np.ndarray, qqq: np.ndarray) -> List[bool]:
+    """Six trend checks on SPY and QQQ used as a General Market Index proxy"""
+    checks = []
+    for close in (qqq, spy):
+        last = close[-1]
+        checks.extend([last > sma(close, 10), last > sma(close, 30), last > sma(close, 50)])
+    return checks
+
+
+def fear_greed_proxy(spy_rsi: Optional[float], vix: np.ndarray) -> float:
+    """0-100 blend of SPY momentum (RSI) and where VIX sits in its 1-year range (low VIX = greed)"""
+    vix = vix[~np.isnan(vix)][-VIX_RANGE_BARS:]
+    parts = []
+    if spy_rsi is not None:
+        parts.append(spy_rsi)
+    if vix.size:
+        low, high = vix.min(), vix.max()
+        parts.append(100.0 if high == low else 100 * (high - vix[-1]) / (high - low))
+    return sum(parts) / len(parts) if parts else 50.0
+
+
+def compute_market_score(store, indicator_service, breadth: Optional[Dict[str, Any]], sata_scores: List[int]) -> Dict[str, Any]:
+    """Derive every MarketScore component from stored bars, indicator state, breadth and refresh results"""
+    readings = indicator_service.compute(["SPY", "QQQ"], MARKET_INDICATORS)["indicators"]
+    benchmarks = store.load_panel(MARKET_SCORE_TICKERS, "max")
+    spy = benchmarks.close[:, benchmarks.position("SPY")]
+    qqq = benchmarks.close[:, benchmarks.position("QQQ")]
+    vix_position = benchmarks.position(VIX_TICKER)
+    vix = benchmarks.close[:, vix_position] if vix_position is not None else np.empty(0)
+
+    spy_values = readings.get("SPY", {})
+    vix_level = float(vix[-1]) if vix.size else None
+    atr_percent = float(spy_values["atr14"] / spy[-1] * 100) if spy_values.get("atr14") else None
+
+    # QQQ distance from its all-time high via a running maximum of closes
+    qqq_valid = qqq[~np.isnan(qqq)]
+    qqq_ath = np.maximum.accumulate(qqq_valid)[-1]
+    qqq_distance = float((qqq_valid[-1] - qqq_ath) / qqq_ath * 100)
+
+    breadth = breadth or {"new_highs": 0, "new_lows": 0, "nhnl_eligible": 0}
+    eligible = breadth["nhnl_eligible"]
+    nhnl_percent = (breadth["new_highs"] - breadth["new_lows"]) / eligible * 100 if eligible else 0.0
+
+    average_sata = float(np.mean(sata_scores)) if sata_scores else 5.0
+    gmi_passed = int(sum(gmi_conditions(spy, qqq)))
+    fg_index = float(fear_greed_proxy(spy_values.get("rsi14"), vix))
+
+    components = {
+        "sata_score": score_descending(average_sata, SATA_LEVELS),
+        "adx_score": adx_score([readings.get("SPY", {}), readings.get("QQQ", {})]),
+        "vix_score": score_ascending(vix_level, VIX_LEVELS) if vix_level is not None else 2,
+        "atr_score": score_ascending(atr_percent, ATR_PERCENT_LEVELS) if atr_percent is not None else 2,
+        "gmi_score": score_descending(gmi_passed, (5, 4, 2)),
+        "nhnl_score": score_descending(nhnl_percent, NHNL_PERCENT_LEVELS),
+        "fg_index_score": score_descending(fg_index, FG_LEVELS),
+        "qqq_ath_distance_score": score_descending(qqq_distance, QQQ_ATH_DISTANCE_LEVELS)
+    }
+    total = sum(components.values())
+
+    return {
+        **components,
+        "total_score": total,
+        **classify_market_score(total),
+        "inputs": {
+            "average_sata": round(average_sata, 2),
+            "adx": {ticker: values.get("adx14") for ticker, values in readings.items()},
+            "vix": vix_level,
+            "spy_atr_percent": atr_percent,
+            "gmi_checks_passed": gmi_passed,
+            "new_highs": breadth["new_highs"],
+            "new_lows": breadth["new_lows"],
+            "nhnl_percent": round(nhnl_percent, 2),
+            "fear_greed_proxy": round(fg_index, 1),
+            "qqq_ath_distance_percent": round(qqq_distance, 2)
+        }
+    }
@@ -0,0 +1,144 @@
+import os
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict
+
+from market_data import run_blocking, load_ticker_info
+
+# Ticker.info changes slowly, so it is cached far longer than quotes
+METADATA_TTL_HOURS = float(os.environ.get('METADATA_TTL_HOURS', '24'))
+METADATA_REFRESH_CONCURRENCY = int(os.environ.get('METADATA_REFRESH_CONCURRENCY', '4'))
+
+# Failed lookups are retried after this long instead of on every refresh
+METADATA_FAILURE_TTL_MINUTES = float(os.environ.get('METADATA_FAILURE_TTL_MINUTES', '60'))
+METADATA_MEMORY_MAX_ENTRIES = int(os.environ.get('METADATA_MEMORY_MAX_ENTRIES', '5000'))
+
+# Only the fields the app reads are persisted
+METADATA_FIELDS = [
+    "longName", "shortName", "quoteType", "sector", "industry",
+    "marketCap", "website", "longBusinessSummary"
+]
+
+
+class MetadataCache:
+    """Ticker.info cache persisted in Mongo with stale-while-revalidate refreshes.
+
+    Failed lookups are cached too (as `failed_at` on the document), so a bad
+    ticker is retried once per failure TTL rather than on every refresh. The
+    in-process tier is an LRU capped at `max_entries`.
+    """
+
+    def __init__(
+        self,
+        collection,
+        ttl_hours: float = METADATA_TTL_HOURS,
+        failure_ttl_minutes: float = METADATA_FAILURE_TTL_MINUTES,
+        max_entries: int = METADATA_MEMORY_MAX_ENTRIES
+    ):
+        self.collection = collection
+        self.ttl = timedelta(hours=ttl_hours)
+        self.failure_ttl = timedelta(minutes=failure_ttl_minutes)
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, Dict]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._semaphore = asyncio.Semaphore(METADATA_REFRESH_CONCURRENCY)
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("ticker", unique=True)
+
+    def _is_stale(self, doc: Dict) -> bool:
+        if doc.get("failed_at"):
+            return datetime.utcnow() - doc["failed_at"] > self.failure_ttl
+        return datetime.utcnow() - doc["fetched_at"] > self.ttl
+
+    def _recall(self, ticker: str) -> Optional[Dict]:
+        doc = self._memory.get(ticker)
+        if doc is not None:
+            self._memory.move_to_end(ticker)
+        return doc
+
+    def _remember(self, ticker: str, doc: Dict):
+        self._memory[ticker] = doc
+        self._memory.move_to_end(ticker)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def refresh(self, ticker: str) -> Optional[Dict]:
+        """Fetch Ticker.info upstream and persist the trimmed result, or record the failure"""
+        async with self._semaphore:
+            try:
+                info = await run_blocking(load_ticker_info, ticker)
+                error = None
+            except Exception as e:
+                info, error = {}, str(e)
+
+        info = {field: info.get(field) for field in METADATA_FIELDS if info.get(field) is not None}
+        now = datetime.utcnow()
+        if not info:
+            logging.error(f"Error fetching metadata for {ticker}: {error or 'no info returned'}")
+            # Info from an earlier success is kept; the failure only delays the next attempt
+            await self.collection.update_one(
+                {"ticker": ticker},
+                {"$set": {"failed_at": now}, "$setOnInsert": {"info": {}, "fetched_at": now}},
+                upsert=True
+            )
+            doc = await self.collection.find_one({"ticker": ticker}, {"_id": 0})
+        else:
+            doc = {"ticker": ticker, "info": info, "fetched_at": now}
+            await self.collection.replace_one({"ticker": ticker}, doc, upsert=True)
+        self._remember(ticker, doc)
+        return doc
+
+    def revalidate(self, ticker: str) -> asyncio.Task:
+        """Schedule a background refresh, reusing one already in flight"""
+        task = self._pending.get(ticker)
+        if task is None:
+            task = asyncio.create_task(self.refresh(ticker))
+            self._pending[ticker] = task
+            task.add_done_callback(lambda _: self._pending.pop(ticker, None))
+        return task
+
+    async def get(self, ticker: str, wait: bool = True) -> Dict:
+        """Return cached info; on a miss either wait for upstream or return {} and fetch in the background"""
+        ticker = ticker.upper()
+        doc = self._recall(ticker)
+        if doc is None:
+            doc = await self.collection.find_one({"ticker": ticker}, {"_id": 0})
+            if doc:
+                self._remember(ticker, doc)
+
+        if doc is None:
+            if not wait:
+                self.revalidate(ticker)
+                return {}
+            doc = await self.revalidate(ticker)
+            return doc["info"] if doc else {}
+
+        if self._is_stale(doc):
+            self.revalidate(ticker)
+        return doc["info"]
+
+    async def get_many(self, tickers: List[str], wait: bool = False) -> Dict[str, Dict]:
+        """Batch lookup with a single Mongo query for tickers not held in memory"""
+        tickers = [ticker.upper() for ticker in tickers]
+        docs = {ticker: self._recall(ticker) for ticker in tickers}
+        missing = [ticker for ticker, doc in docs.items() if doc is None]
+        if missing:
+            async for doc in self.collection.find({"ticker": {"$in": missing}}, {"_id": 0}):
+                docs[doc["ticker"]] = doc
+                self._remember(doc["ticker"], doc)
+
+        unknown = [ticker for ticker, doc in docs.items() if doc is None]
+        if unknown and wait:
+            for ticker, doc in zip(unknown, await asyncio.gather(*(self.revalidate(ticker) for ticker in unknown))):
+                docs[ticker] = doc
+
+        results = {}
+        for ticker in tickers:
+            doc = docs.get(ticker)
+            if doc is None or self._is_stale(doc):
+                self.revalidate(ticker)
+            results[ticker] = doc["info"] if doc else {}
+        return results
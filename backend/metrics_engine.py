@@ -0,0 +1,207 @@
+from typing import List, Optional, Dict, Any
+
+import numpy as np
+import pandas as pd
+
+from gmma import gmma_metrics
+
+# Lookbacks used by compute_price_metrics, as (row from the end, minimum history length)
+CHANGE_WINDOWS = {
+    "change_1d": (2, 1),
+    "change_1w": (5, 5),
+    "change_1m": (22, 22),
+    "change_3m": (66, 66),
+}
+ATR_PERIOD = 14
+
+
+class BarPanel:
+    """Right-aligned (bars x tickers) OHLCV matrices; the last row is each ticker's latest bar.
+
+    Shorter histories are NaN-padded at the top, so row offsets from the end
+    match the per-ticker `iloc[-n]` lookups of the scalar code.
+    """
+
+    def __init__(self, tickers: List[str], close, high, low, volume, lengths, last_ts=None, dates=None):
+        self.tickers = list(tickers)
+        self.close = close
+        self.high = high
+        self.low = low
+        self.volume = volume
+        self.lengths = lengths
+        self.last_ts = last_ts if last_ts is not None else np.zeros(len(self.tickers), dtype=np.int64)
+        # Session date of each row, only known for aligned panels
+        self.dates = dates
+        self._positions = {ticker: i for i, ticker in enumerate(self.tickers)}
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def position(self, ticker: str) -> Optional[int]:
+        return self._positions.get(ticker)
+
+    @classmethod
+    def from_bars(cls, bars_by_ticker: Dict[str, np.ndarray]) -> "BarPanel":
+        """Build a panel from structured bar arrays (see bar_store.BAR_DTYPE)"""
+        tickers = [ticker for ticker, bars in bars_by_ticker.items() if bars is not None and bars.size]
+        lengths = np.array([bars_by_ticker[ticker].size for ticker in tickers], dtype=np.int64)
+        rows = int(lengths.max()) if lengths.size else 0
+        shape = (rows, len(tickers))
+        close, high, low, volume = (np.full(shape, np.nan) for _ in range(4))
+        last_ts = np.zeros(len(tickers), dtype=np.int64)
+
+        for j, ticker in enumerate(tickers):
+            bars = bars_by_ticker[ticker]
+            n = bars.size
+            close[rows - n:, j] = bars['close']
+            high[rows - n:, j] = bars['high']
+            low[rows - n:, j] = bars['low']
+            volume[rows - n:, j] = bars['volume']
+            last_ts[j] = bars['ts'][-1]
+
+        return cls(tickers, close, high, low, volume, lengths, last_ts)
+
+    @classmethod
+    def from_aligned_bars(cls, bars_by_ticker: Dict[str, np.ndarray], tz: str = "America/New_York") -> "BarPanel":
+        """Build a panel whose rows are the union of every ticker's session dates.
+
+        Unlike from_bars, a row is the same day in every column, so histories
+        with gaps or different start dates line up; a ticker with no bar on a
+        date is NaN there and `lengths` counts rows since its first bar.
+        """
+        tickers = [ticker for ticker, bars in bars_by_ticker.items() if bars is not None and bars.size]
+        dates = {
+            ticker: pd.to_datetime(bars_by_ticker[ticker]['ts'], unit='s', utc=True)
+            .tz_convert(tz).tz_localize(None).to_numpy().astype('datetime64[D]')
+            for ticker in tickers
+        }
+        index = np.unique(np.concatenate(list(dates.values()))) if tickers else np.empty(0, dtype='datetime64[D]')
+        shape = (len(index), len(tickers))
+        close, high, low, volume = (np.full(shape, np.nan) for _ in range(4))
+        lengths = np.zeros(len(tickers), dtype=np.int64)
+        last_ts = np.zeros(len(tickers), dtype=np.int64)
+
+        for j, ticker in enumerate(tickers):
+            bars = bars_by_ticker[ticker]
+            rows = np.searchsorted(index, dates[ticker])
+            close[rows, j] = bars['close']
+            high[rows, j] = bars['high']
+            low[rows, j] = bars['low']
+            volume[rows, j] = bars['volume']
+            lengths[j] = len(index) - rows[0]
+            last_ts[j] = bars['ts'][-1]
+
+        return cls(tickers, close, high, low, volume, lengths, last_ts, index)
+
+    @classmethod
+    def from_frames(cls, frames: Dict[str, pd.DataFrame]) -> "BarPanel":
+        """Build a panel from yfinance-style OHLCV frames"""
+        tickers = [ticker for ticker, frame in frames.items() if frame is not None and not frame.empty]
+        lengths = np.array([len(frames[ticker]) for ticker in tickers], dtype=np.int64)
+        rows = int(lengths.max()) if lengths.size else 0
+        shape = (rows, len(tickers))
+        close, high, low, volume = (np.full(shape, np.nan) for _ in range(4))
+
+        for j, ticker in enumerate(tickers):
+            frame = frames[ticker]
+            n = len(frame)
+            close[rows - n:, j] = frame['Close'].to_numpy(dtype=float)
+            high[rows - n:, j] = frame['High'].to_numpy(dtype=float)
+            low[rows - n:, j] = frame['Low'].to_numpy(dtype=float)
+            volume[rows - n:, j] = frame['Volume'].to_numpy(dtype=float)
+
+        return cls(tickers, close, high, low, volume, lengths)
+
+
+def true_range(panel: BarPanel) -> np.ndarray:
+    """True range matrix; the first bar of each ticker falls back to high - low"""
+    prev_close = np.vstack([np.full((1, len(panel)), np.nan), panel.close[:-1]])
+    high_low = panel.high - panel.low
+    high_close = np.abs(panel.high - prev_close)
+    low_close = np.abs(panel.low - prev_close)
+    # fmax ignores NaN like DataFrame.max(axis=1) does
+    return np.fmax(np.fmax(high_low, high_close), low_close)
+
+
+def tail_atr(panel: BarPanel, columns: np.ndarray, period: int = ATR_PERIOD) -> np.ndarray:
+    """Latest `period`-bar ATR for some columns, from only the bars it needs"""
+    rows = slice(-(period + 1), None)
+    tail = BarPanel(
+        [panel.tickers[j] for j in columns],
+        panel.close[rows, columns], panel.high[rows, columns], panel.low[rows, columns], panel.volume[rows, columns],
+        panel.lengths[columns]
+    )
+    return true_range(tail)[-period:].mean(axis=0)
+
+
+def classify_sma20(change_1w: np.ndarray) -> np.ndarray:
+    """Vectorized determine_sma20_trend"""
+    return np.select([change_1w > 2, change_1w < -2], ["U", "D"], "F")
+
+
+def relative_strength(changes: np.ndarray, benchmark_changes) -> np.ndarray:
+    """(ETF_Return - Benchmark_Return) / |Benchmark_Return|, 0 when the benchmark is flat"""
+    benchmark_changes = np.asarray(benchmark_changes, dtype=float)
+    safe = np.where(benchmark_changes != 0, np.abs(benchmark_changes), 1.0)
+    return np.where(benchmark_changes != 0, (changes - benchmark_changes) / safe, 0.0)
+
+
+def compute_universe_metrics(
+    panel: BarPanel,
+    benchmark: str = "SPY",
+    atr: Optional[np.ndarray] = None,
+    emas: Optional[np.ndarray] = None
+) -> Dict[str, np.ndarray]:
+    """Every per-ticker metric of the refresh pipeline for the whole panel in one pass.
+
+    `atr` may carry precomputed 14-bar ATR values (NaN where unknown), e.g. from
+    the incremental indicator state; only the missing columns are computed,
+    from the last 15 bars. `emas` does the same for the GMMA ribbon (see
+    gmma.gmma_metrics). SATA is not included: it depends on the formula
+    config and is scored by formulas.FormulaConfig (see MetricTable.score).
+    """
+    rows = panel.close.shape[0]
+    lengths = panel.lengths
+    current = panel.close[-1] if rows else np.empty(0)
+    metrics: Dict[str, np.ndarray] = {"current_price": current}
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for name, (offset, min_length) in CHANGE_WINDOWS.items():
+            if rows >= offset:
+                reference = panel.close[rows - offset]
+                metrics[name] = np.where(lengths > min_length, (current - reference) / reference * 100, 0.0)
+            else:
+                metrics[name] = np.zeros(len(panel))
+
+        # Six-month change is measured from each ticker's first bar in the window
+        first = panel.close[rows - lengths, np.arange(len(panel))] if rows else np.empty(0)
+        metrics["change_6m"] = np.where(lengths > 0, (current - first) / first * 100, 0.0)
+
+        atr = np.full(len(panel), np.nan) if atr is None else np.array(atr, dtype=float)
+        missing = np.flatnonzero(np.isnan(atr))
+        if missing.size and rows >= ATR_PERIOD:
+            atr[missing] = tail_atr(panel, missing)
+        metrics["atr_percent"] = atr / current * 100
+
+    last_volume = panel.volume[-1] if rows else np.empty(0)
+    metrics["volume"] = np.where(np.isnan(last_volume), 0, last_volume).astype(np.int64)
+
+    position = panel.position(benchmark)
+    for window in ("1m", "3m", "6m"):
+        changes = metrics[f"change_{window}"]
+        benchmark_change = changes[position] if position is not None else 0.0
+        metrics[f"relative_strength_{window}"] = relative_strength(changes, benchmark_change)
+
+    # GMMA comes from the actual 12 Guppy EMAs rather than the change signs
+    metrics.update(gmma_metrics(panel.close, emas))
+    metrics["sma20_trend"] = classify_sma20(metrics["change_1w"])
+    return metrics
+
+
+def metric_rows(panel: BarPanel, metrics: Dict[str, np.ndarray]) -> Dict[str, Dict[str, Any]]:
+    """Unpack metric arrays into one plain dict per ticker"""
+    columns = {name: values.tolist() for name, values in metrics.items()}
+    return {
+        ticker: {name: values[j] for name, values in columns.items()}
+        for j, ticker in enumerate(panel.tickers)
+    }
@@ -0,0 +1,51 @@
+"""Move market scores, snapshots and chart analyses into Mongo time-series collections and backfill bars.
+
+Usage: python migrate_timeseries.py [--collections market_scores chart_analyses] [--drop-legacy] [--no-bars]
+
+Run with the API scheduler stopped: documents written to a collection while
+it is being renamed and copied would land in the legacy copy.
+"""
+import os
+import asyncio
+import argparse
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from bar_store import bar_store
+from universe import load_universe
+from timeseries import BarArchive, archive_tickers, migrate_collection, ensure_timeseries, TIMESERIES_COLLECTIONS, TIMESERIES_BATCH_SIZE
+
+MIGRATED_COLLECTIONS = [name for name in TIMESERIES_COLLECTIONS if name != "bars"]
+
+
+async def run(args):
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        for name in args.collections:
+            report = await migrate_collection(db, name, TIMESERIES_COLLECTIONS[name], args.batch_size, args.drop_legacy)
+            print(report)
+        if args.bars:
+            await ensure_timeseries(db, "bars", TIMESERIES_COLLECTIONS["bars"])
+            tickers = archive_tickers(await load_universe(db.universe))
+            report = await BarArchive(db.bars, args.batch_size).sync(bar_store, tickers, args.interval)
+            print({"collection": "bars", **report})
+    finally:
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--collections", nargs="*", choices=MIGRATED_COLLECTIONS, default=MIGRATED_COLLECTIONS)
+    parser.add_argument("--drop-legacy", action="store_true", help="drop the renamed plain collection after copying")
+    parser.add_argument("--no-bars", dest="bars", action="store_false", help="skip the bar store backfill")
+    parser.add_argument("--interval", default="1d")
+    parser.add_argument("--batch-size", type=int, default=TIMESERIES_BATCH_SIZE)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import os
+import json
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, Callable, Awaitable, Tuple
+
+from pymongo import UpdateOne
+
+from market_data import get_market_session
+
+# Quote freshness by NYSE session, in seconds
+QUOTE_TTL_REGULAR = int(os.environ.get('QUOTE_TTL_REGULAR', '60'))
+QUOTE_TTL_EXTENDED = int(os.environ.get('QUOTE_TTL_EXTENDED', '300'))
+QUOTE_TTL_CLOSED = int(os.environ.get('QUOTE_TTL_CLOSED', '21600'))
+
+# How long an expired quote may still be served while it revalidates
+QUOTE_STALE_MAX = int(os.environ.get('QUOTE_STALE_MAX', '172800'))
+QUOTE_CACHE_MAX_BYTES = int(os.environ.get('QUOTE_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+
+
+def quote_ttl(now: Optional[datetime] = None) -> int:
+    """Short TTL while the market trades, long overnight and on weekends"""
+    session = get_market_session(now)
+    if session == "regular":
+        return QUOTE_TTL_REGULAR
+    if session in ("pre", "post"):
+        return QUOTE_TTL_EXTENDED
+    return QUOTE_TTL_CLOSED
+
+
+class ByteBoundedLRU:
+    """LRU map evicting least recently used entries once the byte budget is exceeded"""
+
+    def __init__(self, max_bytes: int = QUOTE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: "OrderedDict[str, Tuple[Dict, int]]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: str, entry: Dict):
+        size = len(json.dumps(entry, default=str))
+        if key in self._entries:
+            self.bytes -= self._entries.pop(key)[1]
+        self._entries[key] = (entry, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes and self._entries:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.bytes -= evicted_size
+
+
+class QuoteCache:
+    """Two-tier quote cache: in-process LRU backed by a shared Mongo collection"""
+
+    def __init__(self, collection, max_bytes: int = QUOTE_CACHE_MAX_BYTES):
+        self.collection = collection
+        self.memory = ByteBoundedLRU(max_bytes)
+        self._revalidating: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("key", unique=True)
+        await self.collection.create_index("purge_at", expireAfterSeconds=0)
+
+    def _entry(self, key: str, value: Dict) -> Dict:
+        now = datetime.utcnow()
+        return {
+            "key": key,
+            "value": value,
+            "stored_at": now,
+            "expires_at": now + timedelta(seconds=quote_ttl()),
+            "purge_at": now + timedelta(seconds=QUOTE_STALE_MAX)
+        }
+
+    async def _lookup(self, key: str) -> Optional[Dict]:
+        entry = self.memory.get(key)
+        if entry is None:
+            entry = await self.collection.find_one({"key": key}, {"_id": 0})
+            if entry:
+                self.memory.put(key, entry)
+        return entry
+
+    async def put(self, key: str, value: Dict):
+        entry = self._entry(key, value)
+        self.memory.put(key, entry)
+        await self.collection.replace_one({"key": key}, entry, upsert=True)
+
+    async def put_many(self, values: Dict[str, Dict]):
+        """Warm both tiers with one bulk write"""
+        operations = []
+        for key, value in values.items():
+            entry = self._entry(key, value)
+            self.memory.put(key, entry)
+            operations.append(UpdateOne({"key": key}, {"$set": entry}, upsert=True))
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+
+    async def _revalidate(self, key: str, loader: Callable[[], Awaitable[Optional[Dict]]]):
+        try:
+            value = await loader()
+            if value is not None:
+                await self.put(key, value)
+        except Exception as e:
+            logging.error(f"Error revalidating cached quote {key}: {e}")
+
+    def revalidate(self, key: str, loader: Callable[[], Awaitable[Optional[Dict]]]):
+        if key in self._revalidating:
+            return
+        self.revalidations += 1
+        task = asyncio.create_task(self._revalidate(key, loader))
+        self._revalidating[key] = task
+        task.add_done_callback(lambda _: self._revalidating.pop(key, None))
+
+    async def get(self, key: str, loader: Callable[[], Awaitable[Optional[Dict]]]) -> Optional[Dict]:
+        """Serve fresh or stale-while-revalidate values; load inline only on a full miss"""
+        entry = await self._lookup(key)
+        if entry is not None and datetime.utcnow() < entry["purge_at"]:
+            if datetime.utcnow() < entry["expires_at"]:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+                self.revalidate(key, loader)
+            return entry["value"]
+
+        self.misses += 1
+        value = await loader()
+        if value is not None:
+            await self.put(key, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.bytes,
+            "memory_max_bytes": self.memory.max_bytes,
+            "session": get_market_session(),
+            "ttl_seconds": quote_ttl()
+        }
@@ -0,0 +1,136 @@
+import os
+import asyncio
+import warnings
+from typing import List, Optional, Dict, Any, Callable, Awaitable, Hashable
+
+import numpy as np
+
+from metrics_engine import BarPanel, CHANGE_WINDOWS
+
+# Benchmarks every ticker is measured against: broad, equal-weight and sector SPDRs
+RS_MATRIX_BENCHMARKS = [
+    ticker.strip().upper()
+    for ticker in os.environ.get(
+        'RS_MATRIX_BENCHMARKS',
+        'SPY,QQQ,IWM,DIA,RSP,QQQE,XLK,XLF,XLV,XLE,XLI,XLU,XLP,XLY,XLB,XLRE,XLC'
+    ).split(',')
+    if ticker.strip()
+]
+
+# Synthetic benchmark: the equal-weighted average return of the universe itself
+EQUAL_WEIGHT_UNIVERSE = "EW_UNIVERSE"
+
+# Return windows as the reference row counted from the end, like CHANGE_WINDOWS, so the
+# 1w/1m/3m columns match the change_* fields on ETF rows
+RS_MATRIX_WINDOWS = {
+    "1w": CHANGE_WINDOWS["change_1w"][0],
+    "1m": CHANGE_WINDOWS["change_1m"][0],
+    "3m": CHANGE_WINDOWS["change_3m"][0],
+    "6m": 127,
+    "12m": 253
+}
+RS_MATRIX_PERIOD = f"{max(RS_MATRIX_WINDOWS.values())}d"
+
+
+def window_returns(panel: BarPanel, windows: Dict[str, int] = RS_MATRIX_WINDOWS) -> np.ndarray:
+    """(tickers x windows) simple returns; NaN where a ticker's history is too short"""
+    rows = panel.close.shape[0]
+    returns = np.full((len(panel), len(windows)), np.nan)
+    if rows == 0:
+        return returns
+    current = panel.close[-1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for k, offset in enumerate(windows.values()):
+            if rows >= offset:
+                reference = panel.close[rows - offset]
+                returns[:, k] = np.where(panel.lengths >= offset, current / reference - 1, np.nan)
+    return returns
+
+
+class RSMatrix:
+    """tickers x benchmarks x windows relative performance, in percent.
+
+    RS is (1 + ticker return) / (1 + benchmark return) - 1, which stays
+    finite when a benchmark is flat, unlike a ratio of the two returns.
+    """
+
+    def __init__(self, tickers: List[str], benchmarks: List[str], windows: List[str], tensor: np.ndarray):
+        self.tickers = tickers
+        self.benchmarks = benchmarks
+        self.windows = windows
+        self.tensor = tensor
+        self._tickers = {ticker: i for i, ticker in enumerate(tickers)}
+        self._benchmarks = {benchmark: i for i, benchmark in enumerate(benchmarks)}
+        self._windows = {window: i for i, window in enumerate(windows)}
+
+    @classmethod
+    def compute(cls, panel: BarPanel, tickers: List[str], benchmarks: List[str] = RS_MATRIX_BENCHMARKS) -> "RSMatrix":
+        returns = window_returns(panel)
+        rows = [panel.position(ticker) for ticker in tickers]
+        tickers = [ticker for ticker, row in zip(tickers, rows) if row is not None]
+        ticker_returns = returns[[row for row in rows if row is not None]]
+
+        benchmarks = [benchmark for benchmark in benchmarks if panel.position(benchmark) is not None]
+        benchmark_returns = returns[[panel.position(benchmark) for benchmark in benchmarks]]
+        if tickers:
+            # Windows no ticker has enough history for stay NaN
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                equal_weight = np.nanmean(ticker_returns, axis=0)
+            benchmark_returns = np.vstack([benchmark_returns, equal_weight])
+            benchmarks = benchmarks + [EQUAL_WEIGHT_UNIVERSE]
+
+        # One broadcast: (tickers, 1, windows) against (1, benchmarks, windows)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            tensor = ((1 + ticker_returns[:, None, :]) / (1 + benchmark_returns[None, :, :]) - 1) * 100
+        return cls(tickers, benchmarks, list(RS_MATRIX_WINDOWS), tensor)
+
+    def slice(
+        self,
+        tickers: Optional[List[str]] = None,
+        benchmarks: Optional[List[str]] = None,
+        windows: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Sub-tensor as nested lists [ticker][benchmark][window]; unknown labels are reported, not raised"""
+        def pick(requested, index):
+            if not requested:
+                return list(index), []
+            found = [label for label in requested if label in index]
+            return found, [label for label in requested if label not in index]
+
+        tickers, missing_tickers = pick(tickers, self._tickers)
+        benchmarks, missing_benchmarks = pick(benchmarks, self._benchmarks)
+        windows, missing_windows = pick(windows, self._windows)
+
+        values = self.tensor[np.ix_(
+            [self._tickers[t] for t in tickers],
+            [self._benchmarks[b] for b in benchmarks],
+            [self._windows[w] for w in windows]
+        )]
+        values = np.round(values, 4)
+        return {
+            "tickers": tickers,
+            "benchmarks": benchmarks,
+            "windows": windows,
+            "values": np.where(np.isnan(values), None, values).tolist(),
+            "missing": {"tickers": missing_tickers, "benchmarks": missing_benchmarks, "windows": missing_windows}
+        }
+
+
+class RSMatrixCache:
+    """Holds the tensor for one refresh version and rebuilds it once when the version changes"""
+
+    def __init__(self):
+        self.version: Optional[Hashable] = None
+        self.matrix: Optional[RSMatrix] = None
+        self._lock = asyncio.Lock()
+
+    async def get(self, version: Hashable, build: Callable[[], Awaitable[RSMatrix]]) -> RSMatrix:
+        if self.matrix is not None and self.version == version:
+            return self.matrix
+        async with self._lock:
+            # Another request may have rebuilt it while this one waited
+            if self.matrix is None or self.version != version:
+                self.matrix = await build()
+                self.version = version
+        return self.matrix
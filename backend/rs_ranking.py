@@ -0,0 +1,203 @@
+from datetime import datetime
+from typing import List, Optional, Dict, Any
+
+import numpy as np
+
+from market_data import NY_TZ
+from metrics_engine import BarPanel
+
+# IBD-style weighting of 3/6/9/12-month returns, as (bars back, weight)
+RS_WEIGHTS = ((63, 0.4), (126, 0.2), (189, 0.2), (252, 0.2))
+RS_HISTORY_PERIOD = "253d"
+RS_MIN_BARS = RS_WEIGHTS[0][0] + 1
+
+
+def history_field(ticker: str) -> str:
+    """Mongo-safe key for a ticker in the per-session rating map ('BRK.B' -> 'BRK_B')"""
+    return ticker.replace(".", "_").replace("$", "_")
+
+
+def weighted_returns(panel: BarPanel) -> np.ndarray:
+    """Weighted 3/6/9/12-month return per ticker.
+
+    Tickers with less than a year of history use the horizons they have,
+    with the weights renormalized; fewer than 3 months yields NaN.
+    """
+    rows = panel.close.shape[0]
+    current = panel.close[-1] if rows else np.empty(0)
+    total = np.zeros(len(panel))
+    weights = np.zeros(len(panel))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for bars_back, weight in RS_WEIGHTS:
+            if rows <= bars_back:
+                continue
+            reference = panel.close[rows - 1 - bars_back]
+            change = current / reference - 1
+            available = (panel.lengths > bars_back) & ~np.isnan(change)
+            total += np.where(available, change * weight, 0.0)
+            weights += np.where(available, weight, 0.0)
+        return np.where(weights > 0, total / weights, np.nan)
+
+
+def percentile_ratings(scores: np.ndarray) -> np.ndarray:
+    """1-99 percentile rating from one sort; NaN scores get 0"""
+    ratings = np.zeros(len(scores), dtype=np.int64)
+    valid = ~np.isnan(scores)
+    count = int(valid.sum())
+    if count == 0:
+        return ratings
+    order = np.argsort(scores[valid], kind='stable')
+    ranks = np.empty(count, dtype=np.int64)
+    ranks[order] = np.arange(count)
+    ratings[valid] = 1 + (ranks * 98) // max(count - 1, 1) if count > 1 else 99
+    return ratings
+
+
+def document_version(doc: Dict[str, Any]) -> Optional[str]:
+    """Version of a stored rankings document; the session date tells apart publishes in the same millisecond"""
+    computed_at = doc.get("computed_at")
+    return f"{doc.get('date')}@{computed_at.isoformat()}" if computed_at else None
+
+
+class RSRankings:
+    """Precomputed universe-wide RS ratings, served straight from arrays"""
+
+    def __init__(self, tickers: List[str], scores, ratings, sectors: List[str], sector_ratings, as_of: Optional[str] = None):
+        self.tickers = list(tickers)
+        self.scores = np.asarray(scores, dtype=float)
+        self.ratings = np.asarray(ratings, dtype=np.int64)
+        self.sectors = list(sectors)
+        self.sector_ratings = np.asarray(sector_ratings, dtype=np.int64)
+        self.as_of = as_of
+        # Descending order by rating then score, computed once per refresh
+        self.order = np.lexsort((-np.nan_to_num(self.scores, nan=-np.inf), -self.ratings))
+        self._positions = {ticker: i for i, ticker in enumerate(self.tickers)}
+
+    @classmethod
+    def compute(cls, panel: BarPanel, sectors: Dict[str, str]) -> "RSRankings":
+        scores = weighted_returns(panel)
+        scores = np.where(panel.lengths >= RS_MIN_BARS, scores, np.nan)
+        ratings = percentile_ratings(scores)
+
+        ticker_sectors = np.array([sectors.get(ticker, "Unknown") for ticker in panel.tickers])
+        sector_ratings = np.zeros(len(panel), dtype=np.int64)
+        for sector in np.unique(ticker_sectors):
+            members = ticker_sectors == sector
+            sector_ratings[members] = percentile_ratings(scores[members])
+
+        last_ts = int(panel.last_ts.max()) if len(panel) else None
+        as_of = datetime.fromtimestamp(last_ts, NY_TZ).strftime('%Y-%m-%d') if last_ts else None
+        return cls(panel.tickers, scores, ratings, ticker_sectors.tolist(), sector_ratings, as_of)
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def rating(self, ticker: str) -> Optional[int]:
+        position = self._positions.get(ticker)
+        return int(self.ratings[position]) if position is not None and self.ratings[position] else None
+
+    def sector_rating(self, ticker: str) -> Optional[int]:
+        position = self._positions.get(ticker)
+        return int(self.sector_ratings[position]) if position is not None and self.ratings[position] else None
+
+    def _row(self, position: int, rank: int) -> Dict[str, Any]:
+        score = self.scores[position]
+        return {
+            "rank": rank,
+            "ticker": self.tickers[position],
+            "sector": self.sectors[position],
+            "rs_rating": int(self.ratings[position]),
+            "sector_rs_rating": int(self.sector_ratings[position]),
+            "weighted_return": None if np.isnan(score) else round(float(score) * 100, 2)
+        }
+
+    def top(self, limit: Optional[int] = None, sector: Optional[str] = None) -> List[Dict[str, Any]]:
+        rows = []
+        for position in self.order:
+            if not self.ratings[position]:
+                continue
+            if sector and self.sectors[position] != sector:
+                continue
+            rows.append(self._row(int(position), len(rows) + 1))
+            if limit and len(rows) >= limit:
+                break
+        return rows
+
+    def sector_summary(self) -> List[Dict[str, Any]]:
+        """Median rating and leader per sector, strongest sectors first"""
+        summary = []
+        for sector in sorted(set(self.sectors)):
+            leaders = self.top(1, sector)
+            members = np.array([s == sector for s in self.sectors]) & (self.ratings > 0)
+            if not members.any():
+                continue
+            summary.append({
+                "sector": sector,
+                "tickers": int(members.sum()),
+                "median_rs_rating": float(np.median(self.ratings[members])),
+                "leader": leaders[0]["ticker"] if leaders else None
+            })
+        return sorted(summary, key=lambda row: row["median_rs_rating"], reverse=True)
+
+    def to_document(self) -> Dict[str, Any]:
+        computed_at = datetime.utcnow()
+        return {
+            "date": self.as_of,
+            "tickers": self.tickers,
+            "scores": [None if np.isnan(score) else float(score) for score in self.scores],
+            "ratings": self.ratings.tolist(),
+            "sectors": self.sectors,
+            "sector_ratings": self.sector_ratings.tolist(),
+            # Per-ticker map so rank history can be projected without loading arrays
+            "by_ticker": {history_field(ticker): int(rating) for ticker, rating in zip(self.tickers, self.ratings) if rating},
+            # Truncated to Mongo's millisecond precision so versions compare equal after a round trip
+            "computed_at": computed_at.replace(microsecond=computed_at.microsecond // 1000 * 1000)
+        }
+
+    @classmethod
+    def from_document(cls, doc: Dict[str, Any]) -> "RSRankings":
+        scores = [np.nan if score is None else score for score in doc["scores"]]
+        return cls(doc["tickers"], scores, doc["ratings"], doc["sectors"], doc["sector_ratings"], doc["date"])
+
+
+class RSRankingService:
+    """Latest rankings in memory, one document per session in Mongo for rank history"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.latest: Optional[RSRankings] = None
+        # version() of the document `latest` was loaded from or published as
+        self._latest_version: Optional[str] = None
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("date", unique=True)
+
+    async def publish(self, rankings: RSRankings):
+        doc = rankings.to_document()
+        await self.collection.replace_one({"date": rankings.as_of}, doc, upsert=True)
+        self.latest = rankings
+        self._latest_version = document_version(doc)
+
+    async def version(self) -> Optional[str]:
+        """Session and compute time of the latest rankings, read from Mongo so every worker agrees"""
+        doc = await self.collection.find_one({}, {"_id": 0, "date": 1, "computed_at": 1}, sort=[("date", -1)])
+        return document_version(doc) if doc else None
+
+    async def get(self) -> Optional[RSRankings]:
+        """Latest rankings, reloaded when another worker has published newer ones"""
+        version = await self.version()
+        if self.latest is None or version != self._latest_version:
+            doc = await self.collection.find_one({}, {"_id": 0, "by_ticker": 0}, sort=[("date", -1)])
+            if doc:
+                self.latest = RSRankings.from_document(doc)
+                self._latest_version = document_version(doc)
+        return self.latest
+
+    async def history(self, ticker: str, days: int) -> List[Dict[str, Any]]:
+        field = history_field(ticker)
+        cursor = self.collection.find(
+            {f"by_ticker.{field}": {"$exists": True}},
+            {"_id": 0, "date": 1, f"by_ticker.{field}": 1}
+        ).sort("date", -1).limit(days)
+        rows = [{"date": doc["date"], "rs_rating": doc["by_ticker"][field]} async for doc in cursor]
+        return rows[::-1]
@@ -0,0 +1,248 @@
+import os
+import time
+import uuid
+import socket
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any, Callable, Awaitable
+
+from pymongo.errors import DuplicateKeyError
+
+from market_data import get_market_session, is_trading_day, NY_TZ
+
+# Refresh cadence per NYSE session, in seconds (0 disables that session)
+SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'true').lower() == 'true'
+REFRESH_INTERVAL_PRE = int(os.environ.get('REFRESH_INTERVAL_PRE', '900'))
+REFRESH_INTERVAL_REGULAR = int(os.environ.get('REFRESH_INTERVAL_REGULAR', '300'))
+REFRESH_INTERVAL_POST = int(os.environ.get('REFRESH_INTERVAL_POST', '900'))
+SETTLE_TIME = os.environ.get('SETTLE_TIME', '16:30')
+SCHEDULER_TICK_SECONDS = int(os.environ.get('SCHEDULER_TICK_SECONDS', '30'))
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', '1800'))
+
+
+class ScheduledJob:
+    """A job guarded by a local lock plus a Mongo lease so runs never overlap across workers"""
+
+    def __init__(self, name: str, func: Callable[[], Awaitable[Dict[str, Any]]], collection=None):
+        self.name = name
+        self.func = func
+        self.collection = collection
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = asyncio.Lock()
+        # Why the latest trigger was skipped: 'busy' (running here) or 'leased' (running elsewhere)
+        self.last_skip_reason: Optional[str] = None
+        self.status: Dict[str, Any] = {
+            "name": name,
+            "running": False,
+            "runs": 0,
+            "skipped": 0,
+            "last_trigger": None,
+            "last_started": None,
+            "last_finished": None,
+            "last_duration_ms": None,
+            "tickers_refreshed": 0,
+            "failures": [],
+            "last_error": None
+        }
+
+    async def _acquire_lease(self) -> bool:
+        if self.collection is None:
+            return True
+        now = datetime.utcnow()
+        try:
+            await self.collection.update_one(
+                {"_id": f"lease:{self.name}", "$or": [{"expires_at": {"$lt": now}}, {"owner": self.owner}]},
+                {"$set": {"owner": self.owner, "expires_at": now + timedelta(seconds=JOB_LEASE_SECONDS)}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # Another worker holds an unexpired lease
+            return False
+
+    async def _release_lease(self):
+        if self.collection is not None:
+            await self.collection.delete_one({"_id": f"lease:{self.name}", "owner": self.owner})
+
+    async def run(
+        self,
+        trigger: str = "manual",
+        wait: bool = False,
+        guard: Optional[Callable[[], Awaitable[bool]]] = None,
+        on_success: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Run the job; when another run is active either wait for it (wait=True) or skip.
+
+        `guard` is checked once the lease is held and can cancel the run;
+        `on_success` runs before the lease is released, so other workers
+        never see the lease free without its effect.
+        """
+        if self._lock.locked() and not wait:
+            self.status["skipped"] += 1
+            self.last_skip_reason = "busy"
+            logging.info(f"Job {self.name} already running, skipping {trigger} trigger")
+            return None
+
+        async with self._lock:
+            if not await self._acquire_lease():
+                self.status["skipped"] += 1
+                self.last_skip_reason = "leased"
+                logging.info(f"Job {self.name} is running on another worker, skipping {trigger} trigger")
+                return None
+            if guard is not None and not await guard():
+                await self._release_lease()
+                self.last_skip_reason = "guarded"
+                logging.info(f"Job {self.name} no longer needed, skipping {trigger} trigger")
+                return None
+
+            self.last_skip_reason = None
+            started = time.perf_counter()
+            self.status.update({
+                "running": True,
+                "last_trigger": trigger,
+                "last_started": datetime.utcnow(),
+                "last_error": None
+            })
+            result = None
+            try:
+                result = await self.func()
+                self.status["tickers_refreshed"] = result.get("tickers_refreshed", 0)
+                self.status["failures"] = result.get("failures", [])
+                if on_success is not None:
+                    await on_success(result)
+            except Exception as e:
+                logging.error(f"Job {self.name} failed: {e}")
+                self.status["last_error"] = str(e)
+            finally:
+                self.status.update({
+                    "running": False,
+                    "runs": self.status["runs"] + 1,
+                    "last_finished": datetime.utcnow(),
+                    "last_duration_ms": round((time.perf_counter() - started) * 1000, 1)
+                })
+                await self._release_lease()
+                if self.collection is not None:
+                    await self.collection.replace_one(
+                        {"_id": f"status:{self.name}"},
+                        {**self.status, "owner": self.owner},
+                        upsert=True
+                    )
+            return result
+
+
+class SessionScheduler:
+    """Run a job on a per-session cadence plus one end-of-day settle run.
+
+    `after_settle` jobs run once per trading day, right after a settle run
+    that actually happened, so they never see pre-settle data. The settled
+    date is recorded in the job's collection, so only one worker settles.
+    """
+
+    def __init__(
+        self,
+        job: ScheduledJob,
+        intervals: Optional[Dict[str, int]] = None,
+        settle_time: str = SETTLE_TIME,
+        tick_seconds: int = SCHEDULER_TICK_SECONDS,
+        after_settle: Optional[List[ScheduledJob]] = None
+    ):
+        self.job = job
+        self.after_settle = after_settle or []
+        self.intervals = intervals or {
+            "pre": REFRESH_INTERVAL_PRE,
+            "regular": REFRESH_INTERVAL_REGULAR,
+            "post": REFRESH_INTERVAL_POST
+        }
+        hour, minute = (int(part) for part in settle_time.split(":"))
+        self.settle_time = datetime.min.time().replace(hour=hour, minute=minute)
+        self.tick_seconds = tick_seconds
+        self.last_scheduled_run: Optional[float] = None
+        self.last_settle_date = None
+        self._task = None
+
+    @property
+    def _settle_key(self) -> str:
+        return f"settle:{self.job.name}"
+
+    async def _settled(self, day) -> bool:
+        """Whether any worker already settled `day`"""
+        if self.job.collection is None:
+            return self.last_settle_date == day
+        doc = await self.job.collection.find_one({"_id": self._settle_key})
+        return bool(doc) and doc.get("date") == day.isoformat()
+
+    async def _mark_settled(self, day):
+        if self.job.collection is not None:
+            await self.job.collection.update_one(
+                {"_id": self._settle_key},
+                {"$set": {"date": day.isoformat(), "owner": self.job.owner, "settled_at": datetime.utcnow()}},
+                upsert=True
+            )
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.tick()
+            except Exception as e:
+                logging.error(f"Scheduler tick failed: {e}")
+            await asyncio.sleep(self.tick_seconds)
+
+    async def tick(self, now: Optional[datetime] = None):
+        ny_time = now.astimezone(NY_TZ) if now else datetime.now(NY_TZ)
+        session = get_market_session(ny_time)
+
+        # Settle once per trading day after the close so daily bars are final
+        if (is_trading_day(ny_time.date()) and session != "regular"
+                and ny_time.time() >= self.settle_time
+                and self.last_settle_date != ny_time.date()):
+            day = ny_time.date()
+            if await self._settled(day):
+                self.last_settle_date = day
+                return
+
+            async def unsettled() -> bool:
+                return not await self._settled(day)
+
+            async def mark(_):
+                await self._mark_settled(day)
+
+            result = await self.job.run("settle", guard=unsettled, on_success=mark)
+            if result is None:
+                # Still running a post-session refresh, or settling elsewhere: try again next tick
+                return
+            self.last_settle_date = day
+            for job in self.after_settle:
+                await job.run("settle")
+            return
+
+        interval = self.intervals.get(session, 0)
+        if not interval:
+            return
+        elapsed = time.monotonic() - self.last_scheduled_run if self.last_scheduled_run else None
+        if elapsed is None or elapsed >= interval:
+            self.last_scheduled_run = time.monotonic()
+            await self.job.run(f"scheduled:{session}")
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "enabled": self._task is not None,
+            "session": get_market_session(),
+            "intervals": self.intervals,
+            "settle_time": self.settle_time.strftime("%H:%M"),
+            "after_settle": [job.name for job in self.after_settle],
+            "last_settle_date": self.last_settle_date.isoformat() if self.last_settle_date else None
+        }
@@ -6,15 +6,15 @@ from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
+from contextlib import asynccontextmanager
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import uuid
 from datetime import datetime, timedelta
 import asyncio
+import time
 import aiohttp
 import json
-import yfinance as yf
-import pandas as pd
 import numpy as np
 from collections import defaultdict
 import pytz
@@ -22,6 +22,35 @@ import requests
 import bcrypt
 import jwt
 from emergentintegrations.llm.chat import LlmChat, UserMessage
+from market_data import (
+    compute_price_metrics, run_blocking, market_data_executor, MARKET_DATA_WORKERS,
+    loop_lag_monitor, frame_to_chart_series, SingleFlight, NY_TZ, next_market_open
+)
+from bar_store import bar_store, sync_bars, get_bars, history_flight, period_days, BAR_STORE_MAX_AGE
+from metadata_cache import MetadataCache
+from quote_cache import QuoteCache, quote_ttl
+from scheduler import ScheduledJob, SessionScheduler, SCHEDULER_ENABLED
+from snapshots import SnapshotStore, build_snapshot, SNAPSHOT_LEADERS
+from timeseries import BarArchive, archive_tickers, ensure_timeseries_collections, timeseries_collections, TIMESERIES_ENABLED, TIMESERIES_COLLECTIONS
+from metrics_engine import BarPanel, metric_rows
+from compute_pool import panel_computer
+from bulk_writer import BulkUpserter
+from gmma import gmma_series, GMMA_WARMUP_PERIOD
+from indicators import IndicatorService, parse_indicator_set, DEFAULT_INDICATOR_SET, INDICATOR_MAX_TICKERS
+from market_score import compute_market_score, classify_market_score, MARKET_SCORE_TICKERS
+from breadth import breadth_engine
+from rs_ranking import RSRankings, RSRankingService, RS_HISTORY_PERIOD
+from rs_matrix import RSMatrix, RSMatrixCache, RS_MATRIX_BENCHMARKS, RS_MATRIX_PERIOD
+from swing import swing_fields, SWING_RULE
+from backtest import run_backtest, STRATEGIES, BACKTEST_PERIOD, BACKTEST_LIMITS
+from formulas import FormulaConfig, FormulaService, MetricTable
+from sweep import parameter_sweep, RANK_FIELDS
+from expressions import (
+    expression_compiler, ColumnTable, ExpressionError, parse_column_definition, to_cell, EXPRESSION_MAX_COLUMNS
+)
+from universe import (
+    ensure_universe, upsert_members, load_universe, partition_universe, UNIVERSE_MAX_PARALLEL_SHARDS
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -31,8 +60,66 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# Long-TTL cache for Ticker.info metadata
+metadata_cache = MetadataCache(db.ticker_metadata)
+
+# Identical concurrent quote requests share one upstream fetch
+quote_flight = SingleFlight("quotes")
+
+# Market-hours-aware quote cache in front of fetch_etf_data
+quote_cache = QuoteCache(db.quote_cache)
+
+# Row ids and timestamps change every refresh, so they do not count as content changes;
+# the timestamps are still advanced on rows that are otherwise unchanged
+etf_writer = BulkUpserter(
+    db.etfs, "ticker",
+    ignore_fields=("id", "last_updated", "computed_at"),
+    touch_fields=("last_updated", "computed_at")
+)
+
+# Batch indicator lookups over the bar store
+indicator_service = IndicatorService(bar_store)
+
+# Universe-wide RS percentile ratings, recomputed once per refresh
+rs_rankings = RSRankingService(db.rs_rankings)
+
+# tickers x benchmarks x windows RS tensor, rebuilt once per refresh
+rs_matrix_cache = RSMatrixCache()
+
+# Compiled formula config and the metric arrays it is re-applied to
+formula_service = FormulaService(db.formula_configs)
+
+# Delta-encoded end-of-day market snapshots
+snapshot_store = SnapshotStore(db.historical_snapshots)
+
+# Completed daily bars mirrored into the `bars` time-series collection
+bar_archive = BarArchive(db.bars)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background monitors and release the market-data executor on shutdown"""
+    loop_lag_monitor.start()
+    await metadata_cache.ensure_indexes()
+    await quote_cache.ensure_indexes()
+    await etf_writer.ensure_indexes()
+    await ensure_universe(db.universe)
+    if TIMESERIES_ENABLED:
+        await ensure_timeseries_collections(db)
+    await db.market_scores.create_index([("date", -1)])
+    await rs_rankings.ensure_indexes()
+    await snapshot_store.ensure_indexes()
+    if SCHEDULER_ENABLED:
+        refresh_scheduler.start()
+    yield
+    await refresh_scheduler.stop()
+    await loop_lag_monitor.stop()
+    panel_computer.shutdown()
+    parameter_sweep.shutdown()
+    market_data_executor.shutdown(wait=False)
+    client.close()
+
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -56,7 +143,6 @@ security = HTTPBearer()
 
 # Timezone setup for South Africa
 SA_TZ = pytz.timezone('Africa/Johannesburg')
-NY_TZ = pytz.timezone('America/New_York')
 
 # Available OpenAI Models with latest auto-selection
 OPENAI_MODELS = {
@@ -183,11 +269,16 @@ class ETFData(BaseModel):
     atr_percent: float
     sata_score: int
     gmma_pattern: str
+    gmma_spread: float = 0.0
     sma20_trend: str
     volume: int
     market_cap: float
+    rs_rating: Optional[int] = None
+    sector_rs_rating: Optional[int] = None
     swing_start_date: Optional[datetime] = None
     swing_days: Optional[int] = 0
+    formula_version: Optional[str] = None
+    computed_at: Optional[datetime] = None  # the refresh whose metrics the row holds
     last_updated: datetime = Field(default_factory=datetime.utcnow)
 
 # Keep all existing models from the original file
@@ -259,6 +350,9 @@ class MarketScore(BaseModel):
     total_score: int
     classification: str
     recommendation: str
+    source: str = "manual"  # 'manual' or 'computed'
+    session_date: Optional[str] = None  # NY session the score describes, e.g. '2024-05-17'
+    inputs: Dict[str, Any] = {}
     last_updated: datetime = Field(default_factory=datetime.utcnow)
 
 class MarketScoreInput(BaseModel):
@@ -284,44 +378,38 @@ class ChartAnalysis(BaseModel):
     confidence: float
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
-# Enhanced ETF Universe with more comprehensive data
-ETF_UNIVERSE = [
-    # Major Indices
-    {"ticker": "SPY", "name": "SPDR S&P 500 ETF", "sector": "Broad Market", "theme": "Large Cap"},
-    {"ticker": "QQQ", "name": "Invesco QQQ Trust", "sector": "Technology", "theme": "Large Cap Growth"},
-    {"ticker": "IWM", "name": "iShares Russell 2000 ETF", "sector": "Small Cap", "theme": "Small Cap"},
-    {"ticker": "DIA", "name": "SPDR Dow Jones Industrial ETF", "sector": "Broad Market", "theme": "Blue Chip"},
-    
-    # Leveraged ETFs
-    {"ticker": "TQQQ", "name": "ProShares UltraPro QQQ", "sector": "Technology", "theme": "3x Leveraged"},
-    {"ticker": "SQQQ", "name": "ProShares UltraPro Short QQQ", "sector": "Technology", "theme": "3x Inverse"},
-    {"ticker": "TNA", "name": "Direxion Daily Small Cap Bull 3X", "sector": "Small Cap", "theme": "3x Leveraged"},
-    {"ticker": "SPXL", "name": "Direxion Daily S&P 500 Bull 3X", "sector": "Large Cap", "theme": "3x Leveraged"},
-    {"ticker": "QLD", "name": "ProShares Ultra QQQ", "sector": "Technology", "theme": "2x Leveraged"},
-    
-    # Sector ETFs
-    {"ticker": "XLK", "name": "Technology Select Sector SPDR", "sector": "Technology", "theme": "Sector"},
-    {"ticker": "XLF", "name": "Financial Select Sector SPDR", "sector": "Financials", "theme": "Sector"},
-    {"ticker": "XLV", "name": "Health Care Select Sector SPDR", "sector": "Healthcare", "theme": "Sector"},
-    {"ticker": "XLE", "name": "Energy Select Sector SPDR", "sector": "Energy", "theme": "Sector"},
-    {"ticker": "XLI", "name": "Industrial Select Sector SPDR", "sector": "Industrials", "theme": "Sector"},
-    {"ticker": "XLU", "name": "Utilities Select Sector SPDR", "sector": "Utilities", "theme": "Sector"},
-    {"ticker": "XLP", "name": "Consumer Staples Select Sector", "sector": "Consumer Staples", "theme": "Sector"},
-    {"ticker": "XLY", "name": "Consumer Discretionary Select Sector", "sector": "Consumer Discretionary", "theme": "Sector"},
-    
-    # Growth & Momentum
-    {"ticker": "MGK", "name": "Vanguard Mega Cap Growth ETF", "sector": "Growth", "theme": "Large Cap Growth"},
-    {"ticker": "ARKK", "name": "ARK Innovation ETF", "sector": "Innovation", "theme": "Disruptive Growth"},
-    {"ticker": "FFTY", "name": "Innovator IBD 50 ETF", "sector": "Growth", "theme": "Momentum"},
-    {"ticker": "VUG", "name": "Vanguard Growth ETF", "sector": "Growth", "theme": "Large Cap Growth"},
-    {"ticker": "QQQE", "name": "Invesco NASDAQ 100 Equal Weight", "sector": "Technology", "theme": "Equal Weight"},
-    {"ticker": "QQQI", "name": "Invesco NASDAQ Internet ETF", "sector": "Technology", "theme": "Internet"},
-    
-    # Specialty & Thematic
-    {"ticker": "GLD", "name": "SPDR Gold Shares", "sector": "Commodities", "theme": "Precious Metals"},
-    {"ticker": "TLT", "name": "iShares 20+ Year Treasury Bond", "sector": "Bonds", "theme": "Long Term Treasury"},
-    {"ticker": "UVXY", "name": "ProShares Ultra VIX Short-Term", "sector": "Volatility", "theme": "2x Volatility"},
-]
+# Universe Models
+class UniverseMember(BaseModel):
+    ticker: str
+    name: str = ""
+    sector: str = "Unknown"
+    theme: str = "Unknown"
+    asset_type: str = "etf"  # 'etf' or 'stock'
+    tags: List[str] = []
+    active: bool = True
+
+class UniverseBulkImport(BaseModel):
+    members: List[UniverseMember]
+
+# Backtest Models
+class BacktestRequest(BaseModel):
+    strategy: str = "color_rule"  # 'color_rule' or 'swing_leaders'
+    period: str = BACKTEST_PERIOD
+    hold_days: int = Field(5, ge=BACKTEST_LIMITS["hold_days"][0], le=BACKTEST_LIMITS["hold_days"][1])
+    top_n: int = Field(5, ge=BACKTEST_LIMITS["top_n"][0], le=BACKTEST_LIMITS["top_n"][1])
+    min_sata: Optional[int] = Field(None, ge=BACKTEST_LIMITS["min_sata"][0], le=BACKTEST_LIMITS["min_sata"][1])  # default: the strategy's own floor
+    tickers: Optional[List[str]] = None  # default: whole active universe
+
+class FormulaSweepRequest(BaseModel):
+    grid: Dict[str, List[Any]]  # dotted config paths, e.g. {"sata_weights.volume": [0.1, 0.2]}
+    strategy: str = "color_rule"
+    period: str = BACKTEST_PERIOD
+    hold_days: int = Field(5, ge=BACKTEST_LIMITS["hold_days"][0], le=BACKTEST_LIMITS["hold_days"][1])
+    top_n: int = Field(5, ge=BACKTEST_LIMITS["top_n"][0], le=BACKTEST_LIMITS["top_n"][1])
+    min_sata: Optional[int] = Field(None, ge=BACKTEST_LIMITS["min_sata"][0], le=BACKTEST_LIMITS["min_sata"][1])
+    rank_by: str = "sharpe"
+    limit: int = Field(20, ge=1, le=500)
+    tickers: Optional[List[str]] = None
 
 # Authentication helper functions
 def hash_password(password: str) -> str:
@@ -368,60 +456,34 @@ def get_south_african_greeting():
 def get_market_countdown():
     """Calculate time until NYSE opens"""
     ny_time = datetime.now(NY_TZ)
-    market_open = ny_time.replace(hour=9, minute=30, second=0, microsecond=0)
-    
-    if ny_time.time() > market_open.time():
-        market_open += timedelta(days=1)
-    
-    while market_open.weekday() > 4:
-        market_open += timedelta(days=1)
-    
-    time_diff = market_open - ny_time
-    hours = int(time_diff.seconds // 3600)
-    minutes = int((time_diff.seconds % 3600) // 60)
-    seconds = int(time_diff.seconds % 60)
+    time_diff = int((next_market_open(ny_time) - ny_time).total_seconds())
+    hours = time_diff // 3600
+    minutes = (time_diff % 3600) // 60
+    seconds = time_diff % 60
     
     return f"{hours}h {minutes}m {seconds}s"
 
 async def fetch_etf_data(ticker: str) -> Dict:
     """Fetch real-time ETF data using yfinance"""
+    ticker = ticker.upper()
+    return await quote_cache.get(
+        ticker,
+        lambda: quote_flight.do((ticker, "6mo", "1d"), lambda: load_etf_quote(ticker))
+    )
+
+async def load_etf_quote(ticker: str) -> Dict:
+    """Compute quote metrics from stored bars plus cached market cap"""
     try:
-        stock = yf.Ticker(ticker)
-        hist = stock.history(period="6mo")
-        info = stock.info
-        
-        if hist.empty:
+        # Bars are re-synced as often as the quote itself expires
+        hist = await get_bars(ticker, period="6mo", max_age=quote_ttl())
+        metrics = compute_price_metrics(hist)
+        if not metrics:
             return None
-            
-        current_price = hist['Close'].iloc[-1]
-        
-        # Calculate percentage changes
-        change_1d = ((current_price - hist['Close'].iloc[-2]) / hist['Close'].iloc[-2] * 100) if len(hist) > 1 else 0
-        change_1w = ((current_price - hist['Close'].iloc[-5]) / hist['Close'].iloc[-5] * 100) if len(hist) > 5 else 0
-        change_1m = ((current_price - hist['Close'].iloc[-22]) / hist['Close'].iloc[-22] * 100) if len(hist) > 22 else 0
-        change_3m = ((current_price - hist['Close'].iloc[-66]) / hist['Close'].iloc[-66] * 100) if len(hist) > 66 else 0
-        change_6m = ((current_price - hist['Close'].iloc[0]) / hist['Close'].iloc[0] * 100) if len(hist) > 0 else 0
-        
-        # Calculate ATR
-        high_low = hist['High'] - hist['Low']
-        high_close = np.abs(hist['High'] - hist['Close'].shift())
-        low_close = np.abs(hist['Low'] - hist['Close'].shift())
-        ranges = pd.concat([high_low, high_close, low_close], axis=1)
-        true_range = np.max(ranges, axis=1)
-        atr = true_range.rolling(14).mean().iloc[-1]
-        atr_percent = (atr / current_price) * 100
         
-        return {
-            "current_price": float(current_price),
-            "change_1d": float(change_1d),
-            "change_1w": float(change_1w),
-            "change_1m": float(change_1m),
-            "change_3m": float(change_3m),
-            "change_6m": float(change_6m),
-            "atr_percent": float(atr_percent),
-            "volume": int(hist['Volume'].iloc[-1]) if not pd.isna(hist['Volume'].iloc[-1]) else 0,
-            "market_cap": info.get('marketCap', 0) if info else 0
-        }
+        # Quote refreshes never wait on .info; a cache miss fills in the background
+        info = await metadata_cache.get(ticker, wait=False)
+        metrics["market_cap"] = info.get('marketCap', 0) if info else 0
+        return metrics
     except Exception as e:
         logging.error(f"Error fetching data for {ticker}: {e}")
         return None
@@ -429,12 +491,11 @@ async def fetch_etf_data(ticker: str) -> Dict:
 async def get_company_info(ticker: str) -> CompanyInfo:
     """Get comprehensive company information"""
     try:
-        stock = yf.Ticker(ticker)
-        info = stock.info
+        info = await metadata_cache.get(ticker)
         
         # Determine sector rotation status
-        hist = stock.history(period="3mo")
-        if not hist.empty:
+        hist = await get_bars(ticker, period="3mo")
+        if hist is not None:
             recent_perf = ((hist['Close'].iloc[-1] - hist['Close'].iloc[-22]) / hist['Close'].iloc[-22] * 100) if len(hist) > 22 else 0
             if recent_perf > 5:
                 rotation_status = "Rotating In"
@@ -487,6 +548,9 @@ async def search_companies(query: str, limit: int = 10) -> List[CompanyInfo]:
     results = []
     query_upper = query.upper()
     
+    # Warm the metadata cache for every candidate with one query
+    await metadata_cache.get_many(common_stocks)
+    
     for ticker in common_stocks:
         if query_upper in ticker or len(results) < limit:
             if ticker.startswith(query_upper) or query_upper in ticker:
@@ -635,31 +699,16 @@ async def calculate_relative_strength(etf_data: Dict, spy_data: Dict) -> Dict:
         logging.error(f"Error calculating relative strength: {e}")
         return {"relative_strength_1m": 0, "relative_strength_3m": 0, "relative_strength_6m": 0}
 
-def calculate_sata_score(change_1m: float, volume: int, atr_percent: float) -> int:
-    """Calculate SATA (Strength Across The Averages) score 1-10"""
-    score = 5  # Base score
-    
-    # Performance component (40%)
-    if change_1m > 10:
-        score += 2
-    elif change_1m > 5:
-        score += 1
-    elif change_1m < -5:
-        score -= 1
-    elif change_1m < -10:
-        score -= 2
-    
-    # Volume component (30%) - simplified
-    if volume > 1000000:
-        score += 1
-    
-    # Volatility component (30%)
-    if 2 < atr_percent < 5:
-        score += 1
-    elif atr_percent > 8:
-        score -= 1
-    
-    return max(1, min(10, score))
+def calculate_sata_score(
+    change_1m: float,
+    volume: int,
+    atr_percent: float,
+    relative_strength_1m: float = 0.0,
+    formula: Optional[FormulaConfig] = None
+) -> int:
+    """Calculate SATA (Strength Across The Averages) score 1-10 with the formula config weights"""
+    formula = formula or formula_service.current or FormulaConfig()
+    return int(formula.sata(np.array([change_1m]), np.array([volume]), np.array([atr_percent]), np.array([relative_strength_1m]))[0])
 
 def determine_gmma_pattern(change_1w: float, change_1m: float) -> str:
     """Determine GMMA pattern based on short and long term trends"""
@@ -679,77 +728,326 @@ def determine_sma20_trend(change_1w: float) -> str:
     else:
         return "F"  # Flat
 
+# Fields shared between fetch_etf_data quotes and refreshed universe rows
+QUOTE_FIELDS = [
+    "current_price", "change_1d", "change_1w", "change_1m", "change_3m",
+    "change_6m", "atr_percent", "volume"
+]
+
+# Timing and failure report from the most recent universe refresh
+last_refresh_report: Dict[str, Any] = {}
+
+async def sync_universe_shard(index: int, members: List[Dict[str, Any]], synced: List[str]) -> Dict[str, Any]:
+    """Sync bars for one shard of the universe; `synced` tickers are already current"""
+    started = time.perf_counter()
+    tickers = [member["ticker"] for member in members]
+    sync_report = await sync_bars([ticker for ticker in tickers if ticker not in synced])
+    return {
+        "sync": sync_report,
+        "report": {
+            "shard": index,
+            "tickers": len(tickers),
+            "failed": sync_report["failed"],
+            "sync_ms": sync_report["duration_ms"],
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+    }
+
+async def compute_universe_rows(
+    members: List[Dict[str, Any]],
+    formula: FormulaConfig,
+    computed_at: datetime
+) -> Tuple[List[ETFData], Dict[str, Dict[str, Any]], MetricTable]:
+    """Compute ETF rows for the whole universe in one panel pass over the bar store"""
+    tickers = [member["ticker"] for member in members]
+    
+    # One panel for the whole universe, so the compute mode's chunking sees every ticker;
+    # SPY is the relative strength benchmark
+    panel_tickers = tickers if "SPY" in tickers else tickers + ["SPY"]
+    panel = await run_blocking(bar_store.load_panel, panel_tickers, "6mo")
+    # Indicator state is read for the running swing; its ATR and GMMA EMAs are reused where
+    # current, so the pattern and swing share one EMA source and only lagging tickers are
+    # computed from the bars
+    states = await run_blocking(bar_store.load_states, panel.tickers)
+    atr = bar_store.load_state_atr(panel, states=states)
+    emas = bar_store.load_state_emas(panel, states=states)
+    metrics = await panel_computer.compute(panel, "SPY", atr, emas)
+    # The unscored inputs are kept so a formula change can re-score without refetching
+    table = MetricTable.from_metrics(panel, metrics, computed_at)
+    metrics.update(table.score(formula))
+    rows = metric_rows(panel, metrics)
+    
+    # Market cap comes from the metadata cache so a refresh never waits on .info
+    metadata = await metadata_cache.get_many(tickers)
+    
+    etfs = []
+    quotes = {}
+    for member in members:
+        ticker = member["ticker"]
+        etf_data = rows.get(ticker)
+        if not etf_data:
+            continue
+        
+        # Create ETF object
+        etf = ETFData(
+            ticker=ticker,
+            name=member["name"],
+            sector=member["sector"],
+            theme=member["theme"],
+            current_price=etf_data["current_price"],
+            change_1d=etf_data["change_1d"],
+            change_1w=etf_data["change_1w"],
+            change_1m=etf_data["change_1m"],
+            change_3m=etf_data["change_3m"],
+            change_6m=etf_data["change_6m"],
+            relative_strength_1m=etf_data["relative_strength_1m"],
+            relative_strength_3m=etf_data["relative_strength_3m"],
+            relative_strength_6m=etf_data["relative_strength_6m"],
+            atr_percent=etf_data["atr_percent"],
+            sata_score=etf_data["sata_score"],
+            gmma_pattern=etf_data["gmma_pattern"],
+            gmma_spread=etf_data["gmma_spread"],
+            sma20_trend=etf_data["sma20_trend"],
+            volume=etf_data["volume"],
+            market_cap=metadata.get(ticker, {}).get('marketCap') or 0,
+            formula_version=formula.version,
+            computed_at=computed_at,
+            **swing_fields(states.get(ticker))
+        )
+        
+        etfs.append(etf)
+        quotes[ticker] = {field: etf_data[field] for field in QUOTE_FIELDS}
+        quotes[ticker]["market_cap"] = etf.market_cap
+    
+    return etfs, quotes, table
+
+def market_session_date() -> str:
+    """The New York session date scores and snapshots are filed under"""
+    return datetime.now(NY_TZ).date().isoformat()
+
+async def refresh_market_score(universe: List[str], sata_scores: List[int], session_date: Optional[str] = None) -> Optional[MarketScore]:
+    """Compute every MarketScore component from stored data and store it once per session.
+
+    With a `session_date` the score is stored unless that session already has one,
+    so a manual score is never superseded. Without one it only bootstraps an
+    empty score history.
+    """
+    try:
+        if session_date:
+            if await db.market_scores.find_one({"session_date": session_date}, {"_id": 1}):
+                return None
+        elif await db.market_scores.find_one({}, {"_id": 1}):
+            return None
+        
+        # Breadth only replays bars it has not seen, so this is cheap after the first run
+        await run_blocking(breadth_engine.sync, bar_store, universe)
+        breadth = breadth_engine.snapshot()
+        components = await run_blocking(compute_market_score, bar_store, indicator_service, breadth, sata_scores)
+        score = MarketScore(**components, source="computed", session_date=session_date)
+        await db.market_scores.insert_one(score.dict())
+        return score
+    except Exception as e:
+        logging.error(f"Error computing market score: {e}")
+        return None
+
+async def publish_rs_rankings(members: List[Dict[str, Any]]) -> Optional[RSRankings]:
+    """Rank the whole universe by weighted 3/6/9/12-month return in one vectorized pass"""
+    try:
+        tickers = [member["ticker"] for member in members]
+        panel = await run_blocking(bar_store.load_panel, tickers, RS_HISTORY_PERIOD)
+        rankings = RSRankings.compute(panel, {member["ticker"]: member["sector"] for member in members})
+        await rs_rankings.publish(rankings)
+        return rankings
+    except Exception as e:
+        logging.error(f"Error ranking relative strength: {e}")
+        return None
+
+async def rescore_etf_rows(formula: FormulaConfig) -> Dict[str, Any]:
+    """Re-apply a formula config to every stored ETF row from the cached metric table"""
+    started = time.perf_counter()
+    # The cached table is only used when this worker built it from the refresh that wrote
+    # the stored rows; otherwise the inputs are rebuilt from the rows and local bars
+    stored = await db.etfs.find(
+        {}, {"_id": 0, "ticker": 1, "computed_at": 1, **{name: 1 for name in MetricTable.COLUMNS}}
+    ).to_list(length=None)
+    
+    async def load_panel(tickers: List[str]) -> BarPanel:
+        return await run_blocking(bar_store.load_panel, tickers, "6mo")
+    
+    table = await formula_service.table_for(stored, load_panel)
+    
+    scored = table.score(formula)
+    docs = await db.etfs.find({"ticker": {"$in": table.tickers}}, {"_id": 0, "content_hash": 0}).to_list(length=None)
+    for doc in docs:
+        position = table.position(doc["ticker"])
+        atr_percent = scored["atr_percent"][position]
+        if not np.isnan(atr_percent):
+            doc["atr_percent"] = float(atr_percent)
+        doc["sata_score"] = int(scored["sata_score"][position])
+        doc["formula_version"] = formula.version
+    
+    # Only rows whose scores actually changed are written
+    write_report = await etf_writer.upsert(docs)
+    return {
+        "recalculated": len(docs),
+        "writes": write_report["written"],
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+
 async def update_etf_data():
     """Update ETF data for all tickers in universe"""
     try:
-        # Get SPY data first for relative strength calculations
-        spy_data = await fetch_etf_data("SPY")
-        if not spy_data:
+        members = await load_universe(db.universe)
+        formula = await formula_service.get()
+        refresh_started = time.time()
+        started = time.perf_counter()
+        
+        # SPY is required as the relative strength benchmark; QQQ and VIX feed the market score.
+        # They are synced once here, before the shards fan out
+        benchmarks = list(dict.fromkeys(MARKET_SCORE_TICKERS + RS_MATRIX_BENCHMARKS))
+        benchmark_report = await sync_bars(benchmarks)
+        if bar_store.last_timestamp("SPY") is None:
             logging.error("Failed to fetch SPY data")
-            return
+            return []
         
-        updated_etfs = []
+        # Shards sync bars in parallel so download time grows sub-linearly with the universe
+        shards = partition_universe(members)
+        semaphore = asyncio.Semaphore(UNIVERSE_MAX_PARALLEL_SHARDS)
         
-        for etf_info in ETF_UNIVERSE:
-            ticker = etf_info["ticker"]
-            logging.info(f"Fetching data for {ticker}")
-            
-            etf_data = await fetch_etf_data(ticker)
-            if not etf_data:
+        async def run_shard(index: int, shard: List[Dict[str, Any]]):
+            async with semaphore:
+                return await sync_universe_shard(index, shard, benchmarks)
+        
+        results = await asyncio.gather(
+            *(run_shard(i, shard) for i, shard in enumerate(shards)),
+            return_exceptions=True
+        )
+        
+        shard_reports = []
+        batches = list(benchmark_report["batches"])
+        failed = list(benchmark_report["failed"])
+        for index, (shard, result) in enumerate(zip(shards, results)):
+            if isinstance(result, Exception):
+                logging.error(f"Error syncing universe shard {index}: {result}")
+                shard_tickers = [member["ticker"] for member in shard]
+                shard_reports.append({"shard": index, "tickers": len(shard), "failed": shard_tickers, "error": str(result)})
+                failed.extend(shard_tickers)
                 continue
-            
-            # Calculate relative strength
-            rs_data = await calculate_relative_strength(etf_data, spy_data)
-            
-            # Calculate derived metrics
-            sata_score = calculate_sata_score(
-                etf_data['change_1m'], 
-                etf_data['volume'], 
-                etf_data['atr_percent']
-            )
-            
-            gmma_pattern = determine_gmma_pattern(etf_data['change_1w'], etf_data['change_1m'])
-            sma20_trend = determine_sma20_trend(etf_data['change_1w'])
-            
-            # Create ETF object
-            etf = ETFData(
-                ticker=ticker,
-                name=etf_info["name"],
-                sector=etf_info["sector"],
-                theme=etf_info["theme"],
-                current_price=etf_data["current_price"],
-                change_1d=etf_data["change_1d"],
-                change_1w=etf_data["change_1w"],
-                change_1m=etf_data["change_1m"],
-                change_3m=etf_data["change_3m"],
-                change_6m=etf_data["change_6m"],
-                relative_strength_1m=rs_data["relative_strength_1m"],
-                relative_strength_3m=rs_data["relative_strength_3m"],
-                relative_strength_6m=rs_data["relative_strength_6m"],
-                atr_percent=etf_data["atr_percent"],
-                sata_score=sata_score,
-                gmma_pattern=gmma_pattern,
-                sma20_trend=sma20_trend,
-                volume=etf_data["volume"],
-                market_cap=etf_data["market_cap"]
-            )
-            
-            # Update in database
-            await db.etfs.replace_one(
-                {"ticker": ticker},
-                etf.dict(),
-                upsert=True
+            shard_reports.append(result["report"])
+            batches.extend(result["sync"]["batches"])
+            failed.extend(result["sync"]["failed"])
+        
+        # Metrics are computed once over the merged universe, from whatever the store holds
+        compute_started = time.perf_counter()
+        # Truncated to Mongo's millisecond precision so the stored rows compare equal to the table's stamp
+        computed_at = datetime.utcnow()
+        computed_at = computed_at.replace(microsecond=computed_at.microsecond // 1000 * 1000)
+        updated_etfs, fresh_quotes, formula_service.table = await compute_universe_rows(members, formula, computed_at)
+        compute_ms = round((time.perf_counter() - compute_started) * 1000, 1)
+        
+        # Percentile RS ratings need the whole universe, so they are ranked after all shards
+        rankings = await publish_rs_rankings(members)
+        if rankings:
+            for etf in updated_etfs:
+                etf.rs_rating = rankings.rating(etf.ticker)
+                etf.sector_rs_rating = rankings.sector_rating(etf.ticker)
+        
+        # Persist all rows in a few unordered bulk writes, skipping unchanged ones
+        write_report = await etf_writer.upsert([etf.dict() for etf in updated_etfs])
+        
+        # Refreshed rows double as fresh quote cache entries
+        await quote_cache.put_many(fresh_quotes)
+        
+        # The settled score is stored after the close; this only seeds an empty history
+        market_score = await refresh_market_score(
+            [member["ticker"] for member in members],
+            [etf.sata_score for etf in updated_etfs]
+        )
+        
+        last_refresh_report.clear()
+        last_refresh_report.update({
+            "requested": len(members),
+            "updated": len(updated_etfs),
+            "failed": sorted(set(failed)),
+            "shards": shard_reports,
+            "compute_ms": compute_ms,
+            "batches": batches,
+            "writes": write_report,
+            "market_score": market_score.total_score if market_score else None,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            "event_loop_lag_max_ms": loop_lag_monitor.max_lag_since(refresh_started),
+            "compute": panel_computer.describe(),
+            "formula_version": formula.version,
+            "completed_at": datetime.utcnow().isoformat()
+        })
+        
+        for shard_report in shard_reports:
+            logging.info(
+                f"Universe shard {shard_report['shard']}: synced {shard_report['tickers']} tickers "
+                f"in {shard_report.get('duration_ms', 0)}ms"
             )
-            
-            updated_etfs.append(etf)
-            
-        logging.info(f"Updated {len(updated_etfs)} ETFs")
+        if last_refresh_report["failed"]:
+            logging.warning(f"No history for {len(last_refresh_report['failed'])} tickers: {', '.join(last_refresh_report['failed'])}")
+        logging.info(
+            f"Updated {len(updated_etfs)} ETFs in {last_refresh_report['duration_ms']}ms across {len(shards)} shards "
+            f"({write_report['written']} written, {write_report['skipped']} unchanged)"
+        )
         return updated_etfs
         
     except Exception as e:
         logging.error(f"Error updating ETF data: {e}")
         return []
 
+async def run_universe_refresh() -> Dict[str, Any]:
+    """Refresh the ETF universe and summarize the run for job status"""
+    updated_etfs = await update_etf_data()
+    return {
+        "tickers_refreshed": len(updated_etfs),
+        "failures": list(last_refresh_report.get("failed", []))
+    }
+
+async def capture_daily_snapshot() -> Dict[str, Any]:
+    """Store today's top ETFs, RS leaders, sector rotation, VIX and market score as one snapshot"""
+    etfs = await db.etfs.find({}, {"_id": 0}).to_list(length=None)
+    market_score = await db.market_scores.find_one({}, {"_id": 0}, sort=[("date", -1)])
+    rankings = await rs_rankings.get()
+    leaders = [row["ticker"] for row in rankings.top(SNAPSHOT_LEADERS)] if rankings else []
+    snapshot = build_snapshot(etfs, market_score, leaders, breadth_engine.snapshot())
+    
+    ny_time = datetime.now(NY_TZ)
+    report = await snapshot_store.write(datetime(ny_time.year, ny_time.month, ny_time.day), snapshot)
+    logging.info(f"Stored {report['kind']} snapshot for {report['date']}: {report['stored_fields']}/{report['fields']} fields")
+    return report
+
+async def settle_market_score() -> Dict[str, Any]:
+    """Store the settled session's computed market score, unless the session already has one"""
+    members = await load_universe(db.universe)
+    etfs = await db.etfs.find({}, {"_id": 0, "sata_score": 1}).to_list(length=None)
+    session_date = market_session_date()
+    score = await refresh_market_score(
+        [member["ticker"] for member in members],
+        [etf["sata_score"] for etf in etfs if "sata_score" in etf],
+        session_date
+    )
+    return {"session_date": session_date, "stored": score is not None, "total_score": score.total_score if score else None}
+
+async def archive_daily_bars() -> Dict[str, Any]:
+    """Append the settled session's bars for the universe and market-score inputs to the bars collection"""
+    members = await load_universe(db.universe)
+    report = await bar_archive.sync(bar_store, archive_tickers(members))
+    logging.info(f"Archived {report['bars_written']} bars for {report['tickers_written']} tickers")
+    return report
+
+# Universe refresh runs under one job lock whether scheduled or triggered manually
+universe_refresh_job = ScheduledJob("universe_refresh", run_universe_refresh, db.jobs)
+market_score_job = ScheduledJob("market_score", settle_market_score, db.jobs)
+snapshot_job = ScheduledJob("daily_snapshot", capture_daily_snapshot, db.jobs)
+bar_archive_job = ScheduledJob("bar_archive", archive_daily_bars, db.jobs)
+refresh_scheduler = SessionScheduler(
+    universe_refresh_job,
+    after_settle=[market_score_job, snapshot_job] + ([bar_archive_job] if TIMESERIES_ENABLED else [])
+)
+
 # ==================== API ROUTES ====================
 
 # Authentication Routes
@@ -1039,50 +1337,84 @@ async def get_indices_chart_data(timeframe: str = Query("1d", description="1d, 1
         
         period = period_map.get(timeframe, "1mo")
         
-        for index in indices:
-            try:
-                ticker = yf.Ticker(index)
-                hist = ticker.history(period=period)
-                
-                if not hist.empty:
-                    chart_data[index] = {
-                        "dates": [d.strftime("%Y-%m-%d") for d in hist.index],
-                        "prices": hist['Close'].tolist(),
-                        "volumes": hist['Volume'].tolist(),
-                        "highs": hist['High'].tolist(),
-                        "lows": hist['Low'].tolist(),
-                        "opens": hist['Open'].tolist()
-                    }
-            except Exception as e:
-                logging.error(f"Error fetching chart data for {index}: {e}")
+        results = await asyncio.gather(
+            *(get_bars(index, period) for index in indices),
+            return_exceptions=True
+        )
+        
+        for index, hist in zip(indices, results):
+            if isinstance(hist, Exception):
+                logging.error(f"Error fetching chart data for {index}: {hist}")
                 continue
+            if hist is not None:
+                chart_data[index] = frame_to_chart_series(hist)
         
         return {"data": chart_data, "timeframe": timeframe}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.get("/charts/{ticker}")
-async def get_ticker_chart_data(ticker: str, timeframe: str = Query("1mo")):
-    """Get chart data for any ticker"""
+async def get_ticker_chart_data(ticker: str, timeframe: str = Query("1mo"), gmma: bool = Query(True)):
+    """Get chart data for any ticker, with GMMA ribbons"""
     try:
-        stock = yf.Ticker(ticker.upper())
-        hist = stock.history(period=timeframe)
+        try:
+            window = period_days(timeframe)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        hist = await get_bars(ticker.upper(), timeframe)
         
-        if hist.empty:
+        if hist is None:
             raise HTTPException(status_code=404, detail=f"No data found for ticker {ticker}")
         
-        return {
+        response = {
             "ticker": ticker.upper(),
             "timeframe": timeframe,
-            "data": {
-                "dates": [d.strftime("%Y-%m-%d %H:%M") for d in hist.index],
-                "prices": hist['Close'].tolist(),
-                "volumes": hist['Volume'].tolist(),
-                "highs": hist['High'].tolist(),
-                "lows": hist['Low'].tolist(),
-                "opens": hist['Open'].tolist()
-            }
+            "data": frame_to_chart_series(hist, "%Y-%m-%d %H:%M")
         }
+        
+        if gmma:
+            # Long EMAs need more history than short chart windows show
+            warmup = hist
+            if window < period_days(GMMA_WARMUP_PERIOD):
+                warmup = await get_bars(ticker.upper(), GMMA_WARMUP_PERIOD)
+            if warmup is None or warmup.index[-1] < hist.index[-1]:
+                warmup = hist
+            warmup = warmup[warmup.index <= hist.index[-1]]
+            response["gmma"] = gmma_series(warmup['Close'].to_numpy(dtype=float), len(hist))
+        
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/indicators")
+async def get_indicators(
+    tickers: str = Query(..., description="Comma-separated tickers"),
+    indicator_set: str = Query(DEFAULT_INDICATOR_SET, alias="set", description="Comma-separated indicators, e.g. rsi14,adx14,macd,bb20")
+):
+    """Get the latest indicator values for many tickers in one call"""
+    try:
+        symbols = list(dict.fromkeys(t.strip().upper() for t in tickers.split(",") if t.strip()))
+        if not symbols:
+            raise HTTPException(status_code=400, detail="No tickers requested")
+        if len(symbols) > INDICATOR_MAX_TICKERS:
+            raise HTTPException(status_code=400, detail=f"At most {INDICATOR_MAX_TICKERS} tickers per request")
+        try:
+            specs = parse_indicator_set(indicator_set)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        # Bring missing or stale tickers up to date before reading the store
+        stale = [t for t in symbols if (bar_store.age_seconds(t) or float('inf')) > BAR_STORE_MAX_AGE]
+        if stale:
+            await sync_bars(stale)
+        
+        result = await run_blocking(indicator_service.compute, symbols, specs)
+        result["set"] = [spec for spec, _, _ in specs]
+        result["cache"] = indicator_service.cache.stats()
+        return result
     except HTTPException:
         raise
     except Exception as e:
@@ -1093,6 +1425,33 @@ async def get_ticker_chart_data(ticker: str, timeframe: str = Query("1mo")):
 async def root():
     return {"message": "ETF Intelligence System API - Enhanced Version"}
 
+@api_router.get("/metrics/event-loop")
+async def get_event_loop_metrics():
+    """Get event loop lag statistics and market-data executor size"""
+    return {
+        "event_loop_lag": loop_lag_monitor.stats(),
+        "market_data_workers": MARKET_DATA_WORKERS,
+        "last_refresh": last_refresh_report
+    }
+
+@api_router.get("/metrics/quote-cache")
+async def get_quote_cache_metrics():
+    """Get quote cache hit rates, memory usage and the current session TTL"""
+    return quote_cache.stats()
+
+@api_router.get("/metrics/expressions")
+async def get_expression_cache_metrics():
+    """Get compiled spreadsheet expression cache size and hit counts"""
+    return expression_compiler.stats()
+
+@api_router.get("/metrics/single-flight")
+async def get_single_flight_metrics():
+    """Get counts of duplicate upstream fetches collapsed by single-flight"""
+    return {
+        flight.name: flight.stats()
+        for flight in (quote_flight, history_flight)
+    }
+
 @api_router.get("/dashboard")
 async def get_dashboard_data():
     """Get enhanced dashboard data with SA greetings, market info, and live indices"""
@@ -1161,6 +1520,7 @@ async def get_dashboard_data():
 async def get_etfs(
     sector: Optional[str] = Query(None, description="Filter by sector"),
     min_rs: Optional[float] = Query(None, description="Minimum relative strength"),
+    min_rs_rating: Optional[int] = Query(None, ge=1, le=99, description="Minimum RS percentile rating"),
     limit: Optional[int] = Query(100, description="Limit results")
 ):
     """Get ETF data with optional filtering"""
@@ -1170,6 +1530,8 @@ async def get_etfs(
             query["sector"] = sector
         if min_rs:
             query["relative_strength_1m"] = {"$gte": min_rs}
+        if min_rs_rating:
+            query["rs_rating"] = {"$gte": min_rs_rating}
         
         etfs = await db.etfs.find(query).limit(limit).to_list(length=limit)
         return [ETFData(**etf) for etf in etfs]
@@ -1180,8 +1542,195 @@ async def get_etfs(
 async def update_etfs():
     """Manually trigger ETF data update"""
     try:
-        updated_etfs = await update_etf_data()
-        return {"message": f"Updated {len(updated_etfs)} ETFs", "count": len(updated_etfs)}
+        summary = await universe_refresh_job.run("manual", wait=True)
+        if summary is None:
+            if universe_refresh_job.last_skip_reason == "leased":
+                raise HTTPException(status_code=409, detail="Universe refresh is running on another worker")
+            raise HTTPException(status_code=500, detail=universe_refresh_job.status.get("last_error") or "Universe refresh failed")
+        count = summary["tickers_refreshed"]
+        return {
+            "message": f"Updated {count} ETFs",
+            "count": count,
+            "refresh": last_refresh_report
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Relative Strength Ranking Routes
+@api_router.get("/rs/rankings")
+async def get_rs_rankings(
+    limit: Optional[int] = Query(50, ge=1, description="Top N tickers"),
+    sector: Optional[str] = Query(None, description="Rank within one sector")
+):
+    """Get precomputed RS percentile rankings, overall or for one sector"""
+    try:
+        rankings = await rs_rankings.get()
+        if rankings is None:
+            raise HTTPException(status_code=404, detail="No RS rankings computed yet")
+        
+        return {
+            "as_of": rankings.as_of,
+            "universe_size": len(rankings),
+            "sector": sector,
+            "rankings": rankings.top(limit, sector),
+            "sectors": rankings.sector_summary()
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def build_rs_matrix() -> RSMatrix:
+    """Load the universe plus every benchmark as one panel and broadcast the RS tensor"""
+    members = await load_universe(db.universe)
+    tickers = [member["ticker"] for member in members]
+    panel = await run_blocking(bar_store.load_panel, list(dict.fromkeys(tickers + RS_MATRIX_BENCHMARKS)), RS_MATRIX_PERIOD)
+    return await run_blocking(RSMatrix.compute, panel, tickers, RS_MATRIX_BENCHMARKS)
+
+@api_router.get("/rs/matrix")
+async def get_rs_matrix(
+    tickers: Optional[str] = Query(None, description="Comma-separated tickers (default: whole universe)"),
+    benchmarks: Optional[str] = Query(None, description="Comma-separated benchmarks (default: all)"),
+    windows: Optional[str] = Query(None, description="Comma-separated windows: 1w,1m,3m,6m,12m")
+):
+    """Get a slice of the tickers x benchmarks x windows relative strength tensor"""
+    try:
+        def split(value: Optional[str], upper: bool = True) -> Optional[List[str]]:
+            if not value:
+                return None
+            return [v.strip().upper() if upper else v.strip().lower() for v in value.split(",") if v.strip()]
+        
+        # Every refresh republishes the rankings, so their computed_at invalidates the
+        # cached tensor on all workers, not just the one that ran the refresh
+        version = await rs_rankings.version()
+        matrix = await rs_matrix_cache.get(version, build_rs_matrix)
+        result = matrix.slice(split(tickers), split(benchmarks), split(windows, upper=False))
+        result["version"] = version
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/rs/history/{ticker}")
+async def get_rs_history(ticker: str, days: int = Query(60, ge=1, le=1000)):
+    """Get the daily RS rating history for a ticker"""
+    try:
+        history = await rs_rankings.history(ticker.upper(), days)
+        return {"ticker": ticker.upper(), "history": history}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.post("/backtest")
+async def backtest_strategy(request: BacktestRequest):
+    """Replay a signal rule over stored daily bars for the universe"""
+    try:
+        if request.strategy not in STRATEGIES:
+            raise HTTPException(status_code=400, detail=f"Unknown strategy '{request.strategy}'. Use one of: {', '.join(STRATEGIES)}")
+        try:
+            period_days(request.period)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid period '{request.period}'")
+        
+        if request.tickers:
+            tickers = [ticker.strip().upper() for ticker in request.tickers if ticker.strip()]
+        else:
+            tickers = [member["ticker"] for member in await load_universe(db.universe)]
+        panel = await run_blocking(bar_store.load_aligned_panel, list(dict.fromkeys(tickers + ["SPY"])), request.period)
+        if panel.close.shape[0] < 2:
+            raise HTTPException(status_code=404, detail="Not enough stored bars to backtest")
+        
+        return await run_blocking(
+            run_backtest, panel, request.strategy, request.hold_days, request.top_n, request.min_sata,
+            "SPY", await formula_service.get()
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Backtest failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Universe Management Routes
+@api_router.get("/universe")
+async def get_universe(
+    sector: Optional[str] = Query(None, description="Filter by sector"),
+    theme: Optional[str] = Query(None, description="Filter by theme"),
+    tag: Optional[str] = Query(None, description="Filter by tag"),
+    include_inactive: bool = Query(False)
+):
+    """Get universe members with optional sector, theme and tag filters"""
+    try:
+        query = {}
+        if sector:
+            query["sector"] = sector
+        if theme:
+            query["theme"] = theme
+        if tag:
+            query["tags"] = tag
+        if not include_inactive:
+            query["active"] = True
+        
+        members = await db.universe.find(query, {"_id": 0}).sort("ticker", 1).to_list(length=None)
+        return {"members": members, "count": len(members)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.post("/universe")
+async def add_universe_member(member: UniverseMember):
+    """Add or update a single universe member"""
+    try:
+        result = await upsert_members(db.universe, [member.dict()])
+        return {"message": f"Saved {member.ticker.upper()} to universe", **result}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.put("/universe/{ticker}")
+async def update_universe_member(ticker: str, member: UniverseMember):
+    """Update a universe member"""
+    try:
+        existing = await db.universe.find_one({"ticker": ticker.upper()})
+        if not existing:
+            raise HTTPException(status_code=404, detail="Ticker not in universe")
+        
+        await upsert_members(db.universe, [{**member.dict(), "ticker": ticker}])
+        return {"message": f"Updated {ticker.upper()}"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.delete("/universe/{ticker}")
+async def delete_universe_member(ticker: str):
+    """Remove a ticker from the universe and its ETF row"""
+    try:
+        result = await db.universe.delete_one({"ticker": ticker.upper()})
+        if result.deleted_count == 0:
+            raise HTTPException(status_code=404, detail="Ticker not in universe")
+        
+        await db.etfs.delete_one({"ticker": ticker.upper()})
+        return {"message": f"Removed {ticker.upper()} from universe"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.post("/universe/bulk-import")
+async def bulk_import_universe(payload: UniverseBulkImport):
+    """Add or update many universe members in one bulk write"""
+    try:
+        result = await upsert_members(db.universe, [member.dict() for member in payload.members])
+        return {"message": f"Imported {len(payload.members)} members", **result}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/jobs")
+async def get_jobs():
+    """Get background job status: last run, duration, tickers refreshed and failures"""
+    try:
+        return {
+            "jobs": [universe_refresh_job.status, market_score_job.status, snapshot_job.status, bar_archive_job.status],
+            "scheduler": refresh_scheduler.describe()
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1332,18 +1881,29 @@ async def remove_stock_from_watchlist(list_name: str, ticker: str, current_user:
 
 # Historical Data Routes
 @api_router.get("/history", response_model=List[HistoricalSnapshot])
-async def get_historical_snapshots(days: int = Query(30, description="Number of days")):
+async def get_historical_snapshots(days: int = Query(30, ge=1, le=3660, description="Number of days")):
     """Get historical snapshots"""
     try:
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
-        snapshots = await db.historical_snapshots.find(
-            {"date": {"$gte": cutoff_date}}
-        ).sort("date", -1).to_list(length=days)
-        
+        snapshots = await snapshot_store.history(days)
         return [HistoricalSnapshot(**snapshot) for snapshot in snapshots]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.post("/history/snapshot")
+async def create_historical_snapshot():
+    """Capture today's snapshot now instead of waiting for the end-of-day run"""
+    try:
+        report = await snapshot_job.run("manual", wait=True)
+        if report is None:
+            if snapshot_job.last_skip_reason == "leased":
+                raise HTTPException(status_code=409, detail="Snapshot job is running on another worker")
+            raise HTTPException(status_code=500, detail=snapshot_job.status.get("last_error") or "Snapshot failed")
+        return report
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 # Journal Routes
 @api_router.post("/journal", response_model=JournalEntry)
 async def create_journal_entry(entry: JournalEntry):
@@ -1417,8 +1977,8 @@ async def get_market_score():
     try:
         scores = await db.market_scores.find().sort("date", -1).limit(1).to_list(1)
         if not scores:
-            # Create default score
-            default_score = MarketScore(
+            # Nothing stored until the first refresh; the default is served but not saved
+            return MarketScore(
                 sata_score=2,
                 adx_score=2,
                 vix_score=2,
@@ -1431,8 +1991,6 @@ async def get_market_score():
                 classification="Yellow Day",
                 recommendation="Selective entries. Use moderate position sizing."
             )
-            await db.market_scores.insert_one(default_score.dict())
-            return default_score
         
         return MarketScore(**scores[0])
     except Exception as e:
@@ -1447,15 +2005,7 @@ async def update_market_score(score_input: MarketScoreInput):
                 score_input.atr_score + score_input.gmi_score + score_input.nhnl_score + 
                 score_input.fg_index_score + score_input.qqq_ath_distance_score)
         
-        if total >= 28:
-            classification = "Green Day"
-            recommendation = "Full exposure. Use wider stop losses. Aggressive position sizing."
-        elif total >= 20:
-            classification = "Yellow Day"  
-            recommendation = "Selective entries. Moderate position sizing. Standard stops."
-        else:
-            classification = "Red Day"
-            recommendation = "Risk-off mode. Tight stops or avoid new positions."
+        label = classify_market_score(total)
         
         # Create full MarketScore object
         score = MarketScore(
@@ -1468,15 +2018,45 @@ async def update_market_score(score_input: MarketScoreInput):
             fg_index_score=score_input.fg_index_score,
             qqq_ath_distance_score=score_input.qqq_ath_distance_score,
             total_score=total,
-            classification=classification,
-            recommendation=recommendation
+            classification=label["classification"],
+            recommendation=label["recommendation"],
+            session_date=market_session_date()
         )
         
+        # Filed under today's session, so the settle run will not store a computed score over it
         await db.market_scores.insert_one(score.dict())
         return score
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/market-score/history")
+async def get_market_score_history(
+    days: int = Query(30, ge=1, le=365),
+    source: Optional[str] = Query(None, description="Filter by 'computed' or 'manual'")
+):
+    """Get the market score time series"""
+    try:
+        query = {"date": {"$gte": datetime.utcnow() - timedelta(days=days)}}
+        if source:
+            query["source"] = source
+        scores = await db.market_scores.find(query, {"_id": 0}).sort("date", 1).to_list(length=None)
+        return {"scores": scores, "count": len(scores)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/breadth")
+async def get_breadth(days: int = Query(60, ge=1, le=1000)):
+    """Get daily new highs/lows, advance/decline line and percent above SMA for the universe"""
+    try:
+        series = breadth_engine.series(days)
+        if not series:
+            members = await load_universe(db.universe)
+            await run_blocking(breadth_engine.sync, bar_store, [member["ticker"] for member in members])
+            series = breadth_engine.series(days)
+        return {"series": series, "latest": series[-1] if series else None, "tickers": len(breadth_engine.tickers)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 # AI Chart Analysis Routes
 @api_router.get("/charts/{ticker}/analysis", response_model=ChartAnalysis)
 async def get_chart_analysis(ticker: str, timeframe: str = "1d"):
@@ -1563,30 +2143,8 @@ async def get_formula_config():
         
         # Default configuration if none exists
         if not config:
-            default_config = {
-                "relative_strength": {
-                    "strong_threshold": 0.10,
-                    "moderate_threshold": 0.02,
-                    "formula": "(ETF_Return - SPY_Return) / |SPY_Return|"
-                },
-                "sata_weights": {
-                    "performance": 0.40,
-                    "relative_strength": 0.30,
-                    "volume": 0.20,
-                    "volatility": 0.10,
-                    "formula": "Weighted_Score = (Performance × 0.40) + (RS × 0.30) + (Volume × 0.20) + (Volatility × 0.10)"
-                },
-                "atr_calculation": {
-                    "period_days": 14,
-                    "high_volatility_threshold": 3.0
-                },
-                "gmma_patterns": {
-                    "bullish_requirement": "1W_change > 0 AND 1M_change > 0",
-                    "bearish_requirement": "1W_change < 0 AND 1M_change < 0"
-                }
-            }
-            await db.formula_configs.insert_one(default_config)
-            return default_config
+            formula = await formula_service.save({})
+            return {**formula.config, "version": formula.version}
         
         # Remove MongoDB ObjectId from response and extract config
         config_data = dict(config[0])
@@ -1608,29 +2166,75 @@ async def get_formula_config():
 
 @api_router.post("/formulas/config")
 async def update_formula_config(config_update: Dict[str, Any]):
-    """Update formula configuration and trigger recalculation"""
+    """Update formula configuration and re-score ETF rows from cached metrics"""
     try:
-        # Update the configuration
-        await db.formula_configs.replace_one(
-            {},
-            config_update,
-            upsert=True
-        )
+        try:
+            formula = await formula_service.save(config_update)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        # Trigger ETF data recalculation with new formulas
-        updated_etfs = await update_etf_data()
+        # Thresholds are re-applied to the last refresh's arrays; nothing is refetched
+        summary = await rescore_etf_rows(formula)
         
         return {
             "message": "Formula configuration updated successfully",
-            "config": config_update,
-            "recalculated_etfs": len(updated_etfs)
+            "config": formula.config,
+            "config_version": formula.version,
+            "recalculated_etfs": summary["recalculated"],
+            "writes": summary["writes"],
+            "duration_ms": summary["duration_ms"]
         }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.post("/formulas/sweep")
+async def sweep_formula_parameters(request: FormulaSweepRequest):
+    """Backtest every combination of a formula parameter grid and rank the results"""
+    try:
+        if request.strategy not in STRATEGIES:
+            raise HTTPException(status_code=400, detail=f"Unknown strategy '{request.strategy}'. Use one of: {', '.join(STRATEGIES)}")
+        if request.rank_by not in RANK_FIELDS:
+            raise HTTPException(status_code=400, detail=f"Unknown rank_by '{request.rank_by}'. Use one of: {', '.join(RANK_FIELDS)}")
+        try:
+            period_days(request.period)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid period '{request.period}'")
+        
+        if request.tickers:
+            tickers = [ticker.strip().upper() for ticker in request.tickers if ticker.strip()]
+        else:
+            tickers = [member["ticker"] for member in await load_universe(db.universe)]
+        panel = await run_blocking(bar_store.load_aligned_panel, list(dict.fromkeys(tickers + ["SPY"])), request.period)
+        if panel.close.shape[0] < 2:
+            raise HTTPException(status_code=404, detail="Not enough stored bars to backtest")
+        
+        backtest = {
+            "strategy": request.strategy,
+            "hold_days": request.hold_days,
+            "top_n": request.top_n,
+            "min_sata": request.min_sata
+        }
+        try:
+            sweep = await parameter_sweep.run(panel, (await formula_service.get()).config, request.grid, backtest, request.rank_by)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        sweep["results"] = sweep["results"][:request.limit]
+        return sweep
+    except HTTPException:
+        raise
     except Exception as e:
+        logging.error(f"Formula sweep failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # Spreadsheet-Style Interface Routes
 @api_router.get("/spreadsheet/etfs")
-async def get_spreadsheet_etf_data(sector: Optional[str] = Query(None)):
+async def get_spreadsheet_etf_data(
+    sector: Optional[str] = Query(None),
+    filter_expression: Optional[str] = Query(None, alias="filter", description="Row filter, e.g. rs_1m > 0.1 and sata >= 7"),
+    column: Optional[List[str]] = Query(None, description="Custom column as 'name = expression'; repeatable")
+):
     """Get ETF data in spreadsheet format with formulas"""
     try:
         query = {}
@@ -1639,16 +2243,37 @@ async def get_spreadsheet_etf_data(sector: Optional[str] = Query(None)):
         
         etfs = await db.etfs.find(query).to_list(length=None)
         
+        # Custom columns and the filter are compiled once per expression and evaluated over whole columns
+        custom_columns = {}
+        keep = None
+        try:
+            if len(column or []) > EXPRESSION_MAX_COLUMNS:
+                raise ExpressionError(f"At most {EXPRESSION_MAX_COLUMNS} custom columns are allowed")
+            table = ColumnTable(etfs)
+            for name, expression in (parse_column_definition(definition) for definition in column or []):
+                if table.has(name):
+                    raise ExpressionError(f"Custom column '{name}' would shadow an existing field")
+                values = expression_compiler.compile(expression).evaluate(table)
+                table.add(name, values)
+                custom_columns[name] = (expression, values)
+            if filter_expression:
+                keep = expression_compiler.compile(filter_expression).mask(table)
+        except ExpressionError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
         # Format for spreadsheet view
         spreadsheet_data = []
-        for etf in etfs:
+        for i, etf in enumerate(etfs):
+            if keep is not None and not keep[i]:
+                continue
             row = {
                 "Ticker": etf.get("ticker", ""),
                 "Name": etf.get("name", ""),
                 "Sector": etf.get("sector", ""),
                 "Theme": etf.get("theme", ""),
                 "Price": etf.get("current_price", 0),
-                "Swing_Days": f"=TODAY() - {etf.get('swing_start_date', datetime.utcnow().strftime('%Y-%m-%d'))}",
+                "Swing_Start": etf["swing_start_date"].strftime('%Y-%m-%d') if etf.get("swing_start_date") else "",
+                "Swing_Days": etf.get("swing_days", 0),
                 "SATA": etf.get("sata_score", 0),
                 "20SMA": etf.get("sma20_trend", "F"),
                 "GMMA": etf.get("gmma_pattern", "Mixed"),
@@ -1661,19 +2286,25 @@ async def get_spreadsheet_etf_data(sector: Optional[str] = Query(None)):
                 "RS_6M": "=IF({} > SPY_6M, \"Y\", \"N\")".format(etf.get('relative_strength_6m', 0)),
                 "Color_Rule": f"=IF(AND(RS_1M=\"Y\", SATA>=7, GMMA=\"RWB\"), \"Green\", IF(RS_1M=\"N\", \"Red\", \"Yellow\"))"
             }
+            for name, (_, values) in custom_columns.items():
+                row[name] = to_cell(values[i])
             spreadsheet_data.append(row)
         
         return {
             "data": spreadsheet_data,
             "formulas": {
-                "swing_days": "=TODAY() - [Swing_Date_Cell]",
+                "swing_days": f"Trading days since the swing started ({SWING_RULE})",
                 "atr_percent": "=(14_Day_ATR / Current_Price) * 100",
                 "relative_strength": "=(ETF_Return - SPY_Return) / ABS(SPY_Return)",
                 "sata_score": "=Performance(40%) + RelStrength(30%) + Volume(20%) + Volatility(10%)",
                 "color_logic": "Green: RS=Y AND SATA>=7 AND GMMA=RWB, Red: RS=N, Yellow: Mixed signals"
             },
+            "custom_columns": {name: expression for name, (expression, _) in custom_columns.items()},
+            "filter": filter_expression,
             "total_records": len(spreadsheet_data)
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1683,16 +2314,19 @@ async def prune_historical_data(days: int = 60, current_user: User = Depends(get
     """Prune historical data older than specified days"""
     try:
         cutoff_date = datetime.utcnow() - timedelta(days=days)
-        
-        # Prune historical snapshots
-        snapshots_result = await db.historical_snapshots.delete_many(
-            {"date": {"$lt": cutoff_date}}
-        )
-        
-        # Prune old chart analyses
-        charts_result = await db.chart_analyses.delete_many(
-            {"created_at": {"$lt": cutoff_date}}
-        )
+        timeseries = await timeseries_collections(db)
+        deleted = {}
+        
+        # Time-series collections expire on their own TTL; only legacy ones are pruned here
+        for name in ("historical_snapshots", "chart_analyses"):
+            if timeseries.get(name):
+                retention = TIMESERIES_COLLECTIONS[name]["retention_days"]
+                deleted[name] = f"expired by TTL after {retention} days" if retention else "kept, no retention configured"
+                continue
+            result = await db[name].delete_many(
+                {TIMESERIES_COLLECTIONS[name]["timeField"]: {"$lt": cutoff_date}}
+            )
+            deleted[name] = result.deleted_count
         
         # Prune old chat messages (keep last 1000 per session)
         sessions = await db.chat_sessions.find().to_list(length=None)
@@ -1712,11 +2346,7 @@ async def prune_historical_data(days: int = 60, current_user: User = Depends(get
         
         return {
             "message": f"Pruned historical data older than {days} days",
-            "deleted": {
-                "historical_snapshots": snapshots_result.deleted_count,
-                "chart_analyses": charts_result.deleted_count,
-                "chat_messages": chat_deletions
-            }
+            "deleted": {**deleted, "chat_messages": chat_deletions}
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
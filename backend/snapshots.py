@@ -0,0 +1,196 @@
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any, Tuple
+
+# How many ETFs and RS leaders a daily snapshot keeps
+SNAPSHOT_TOP_ETFS = int(os.environ.get('SNAPSHOT_TOP_ETFS', '10'))
+SNAPSHOT_LEADERS = int(os.environ.get('SNAPSHOT_LEADERS', '10'))
+
+# Fields kept per top ETF; floats are rounded so unchanged values do not show up in deltas
+SNAPSHOT_ETF_FIELDS = (
+    "name", "sector", "current_price", "change_1d", "change_1w", "change_1m", "relative_strength_1m",
+    "sata_score", "gmma_pattern", "rs_rating", "atr_percent"
+)
+SNAPSHOT_DECIMALS = 2
+
+Path = Tuple[str, ...]
+
+
+def rounded(value: Any) -> Any:
+    return round(value, SNAPSHOT_DECIMALS) if isinstance(value, float) else value
+
+
+def build_snapshot(
+    etfs: List[Dict[str, Any]],
+    market_score: Optional[Dict[str, Any]],
+    leaders: List[str],
+    breadth: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """One day's market picture from the refreshed ETF rows, the latest market score and RS leaders"""
+    ranked = sorted(
+        etfs,
+        key=lambda etf: etf.get("sata_score", 0) + etf.get("relative_strength_1m", 0) * 10,
+        reverse=True
+    )
+    top_etfs = {
+        etf["ticker"]: {"rank": rank, **{field: rounded(etf.get(field)) for field in SNAPSHOT_ETF_FIELDS}}
+        for rank, etf in enumerate(ranked[:SNAPSHOT_TOP_ETFS], start=1)
+    }
+
+    sectors: Dict[str, List[float]] = {}
+    for etf in etfs:
+        sectors.setdefault(etf.get("sector") or "Unknown", []).append(etf.get("change_1m", 0.0))
+    sector_rotation = {sector: round(sum(changes) / len(changes), SNAPSHOT_DECIMALS) for sector, changes in sectors.items()}
+
+    market_score = market_score or {}
+    inputs = market_score.get("inputs") or {}
+    sata_scores = [etf.get("sata_score", 0) for etf in etfs]
+    key_metrics = {
+        "universe_size": len(etfs),
+        "average_sata": round(sum(sata_scores) / len(sata_scores), SNAPSHOT_DECIMALS) if sata_scores else None,
+        "green_count": sum(
+            1 for etf in etfs
+            if etf.get("relative_strength_1m", 0) > 0 and etf.get("sata_score", 0) >= 7 and etf.get("gmma_pattern") == "RWB"
+        ),
+        "classification": market_score.get("classification"),
+        "market_score_components": {
+            name: market_score.get(name)
+            for name in ("sata_score", "adx_score", "vix_score", "atr_score", "gmi_score", "nhnl_score", "fg_index_score", "qqq_ath_distance_score")
+        },
+        "breadth": {name: rounded(value) for name, value in (breadth or {}).items() if name != "date"}
+    }
+
+    return {
+        "market_score": market_score.get("total_score", 0),
+        "top_etfs": top_etfs,
+        "market_leaders": leaders[:SNAPSHOT_LEADERS],
+        "sector_rotation": sector_rotation,
+        "vix_level": rounded(float(inputs["vix"])) if inputs.get("vix") is not None else 0.0,
+        "key_metrics": key_metrics
+    }
+
+
+def flatten(value: Dict[str, Any], prefix: Path = ()) -> Dict[Path, Any]:
+    """Nested dicts to {path tuple: leaf}; lists are leaves compared as a whole"""
+    flat: Dict[Path, Any] = {}
+    for key, item in value.items():
+        path = prefix + (key,)
+        if isinstance(item, dict) and item:
+            flat.update(flatten(item, path))
+        else:
+            flat[path] = item
+    return flat
+
+
+def unflatten(flat: Dict[Path, Any]) -> Dict[str, Any]:
+    nested: Dict[str, Any] = {}
+    for path, value in flat.items():
+        node = nested
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        node[path[-1]] = value
+    return nested
+
+
+def diff(previous: Dict[Path, Any], current: Dict[Path, Any]) -> Tuple[Dict[Path, Any], List[Path]]:
+    """Paths whose value changed or appeared, and paths that disappeared"""
+    changed = {path: value for path, value in current.items() if path not in previous or previous[path] != value}
+    removed = [path for path in previous if path not in current]
+    return changed, removed
+
+
+def month_start(date: datetime) -> datetime:
+    return date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+class SnapshotStore:
+    """One document per trading day, delta-encoded against the previous day.
+
+    The first snapshot of each calendar month is a keyframe holding every
+    value, so any date range can be rebuilt from a single indexed read that
+    starts at the month containing the range's first day.
+    Paths are stored as lists because tickers such as 'BRK.B' cannot be Mongo keys.
+    The collection may be time-series (no unique indexes or replaces), so
+    snapshots are only inserted and a rewritten day keeps its newest document.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("date", 1), ("created_at", 1)])
+
+    @staticmethod
+    def _apply(state: Dict[Path, Any], doc: Dict[str, Any]) -> Dict[Path, Any]:
+        state = {} if doc["kind"] == "keyframe" else dict(state)
+        for path in doc.get("unset", []):
+            state.pop(tuple(path), None)
+        for path, value in doc.get("set", []):
+            state[tuple(path)] = value
+        return state
+
+    async def _replay(self, start: datetime, end: Optional[datetime] = None) -> List[Tuple[Dict[str, Any], Dict[Path, Any]]]:
+        """(document, full state) pairs from the keyframe at or before `start`, oldest first"""
+        query: Dict[str, Any] = {"$gte": month_start(start)}
+        if end is not None:
+            query["$lt"] = end
+        docs = await self.collection.find({"date": query}, {"_id": 0}).sort([("date", 1), ("created_at", 1)]).to_list(length=None)
+        latest = {doc["date"]: doc for doc in docs}
+        replayed = []
+        state: Optional[Dict[Path, Any]] = None
+        for doc in latest.values():
+            if state is None and doc["kind"] != "keyframe":
+                # The month's keyframe has expired; its deltas cannot be rebuilt
+                continue
+            state = self._apply(state or {}, doc)
+            replayed.append((doc, state))
+        return replayed
+
+    async def write(self, date: datetime, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        """Store `snapshot` for `date` (superseding a same-day snapshot) and report its encoded size.
+
+        Snapshots must be written in date order: a delta is only valid against
+        the snapshot stored immediately before it.
+        """
+        date = date.replace(hour=0, minute=0, second=0, microsecond=0)
+        current = flatten(snapshot)
+
+        # The base is always read back, so a snapshot written by another worker is never skipped
+        replayed = await self._replay(date, end=date)
+        previous_date, previous = (replayed[-1][0]["date"], replayed[-1][1]) if replayed else (None, None)
+
+        doc = {"id": str(uuid.uuid4()), "date": date, "created_at": datetime.utcnow()}
+        if previous is None or month_start(previous_date) != month_start(date):
+            doc.update({"kind": "keyframe", "set": [[list(path), value] for path, value in current.items()], "unset": []})
+        else:
+            changed, removed = diff(previous, current)
+            doc.update({
+                "kind": "delta",
+                "base_date": previous_date,
+                "set": [[list(path), value] for path, value in changed.items()],
+                "unset": [list(path) for path in removed]
+            })
+
+        await self.collection.insert_one(doc)
+        return {
+            "date": date.strftime('%Y-%m-%d'),
+            "kind": doc["kind"],
+            "fields": len(current),
+            "stored_fields": len(doc["set"]) + len(doc["unset"])
+        }
+
+    async def history(self, days: int, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Full snapshots for the last `days` days, newest first"""
+        cutoff = (now or datetime.utcnow()) - timedelta(days=days)
+        snapshots = []
+        for doc, state in await self._replay(cutoff):
+            if doc["date"] < cutoff:
+                continue
+            snapshot = unflatten(state)
+            snapshot["top_etfs"] = sorted(
+                ({"ticker": ticker, **values} for ticker, values in snapshot.get("top_etfs", {}).items()),
+                key=lambda etf: etf.get("rank", 0)
+            )
+            snapshots.append({**snapshot, "id": doc["id"], "date": doc["date"], "created_at": doc["created_at"]})
+        return snapshots[::-1]
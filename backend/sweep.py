@@ -0,0 +1,185 @@
+import os
+import time
+import asyncio
+import logging
+import functools
+import itertools
+from multiprocessing import shared_memory
+from typing import List, Optional, Dict, Any
+
+import numpy as np
+
+from backtest import market_inputs, score_inputs, simulate
+from compute_pool import LazyProcessPool, share_panel, COMPUTE_PROCESSES
+from formulas import FormulaConfig, numeric_fields, set_field
+from market_data import market_data_executor
+from metrics_engine import BarPanel
+
+SWEEP_PROCESSES = int(os.environ.get('SWEEP_PROCESSES', str(COMPUTE_PROCESSES)))
+SWEEP_MAX_COMBINATIONS = int(os.environ.get('SWEEP_MAX_COMBINATIONS', '500'))
+
+# Grid keys under this prefix tune the trading rule rather than the formula config
+BACKTEST_PREFIX = "backtest."
+BACKTEST_FIELDS = ("strategy", "hold_days", "top_n", "min_sata")
+
+# Result columns that can order the table; max_drawdown ranks least negative first
+RANK_FIELDS = ("sharpe", "cagr", "total_return", "hit_rate", "max_drawdown", "average_trade_return")
+SUMMARY_FIELDS = (
+    "total_return", "cagr", "volatility", "sharpe", "max_drawdown",
+    "hit_rate", "average_trade_return", "trades", "exposure", "average_positions"
+)
+
+
+def expand_grid(grid: Dict[str, List[Any]], max_combinations: int = SWEEP_MAX_COMBINATIONS) -> List[Dict[str, Any]]:
+    """Every combination of the grid's values as {dotted path: value} parameter sets"""
+    allowed = set(numeric_fields()) | {BACKTEST_PREFIX + field for field in BACKTEST_FIELDS}
+    unknown = sorted(set(grid) - allowed)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {', '.join(unknown)}. Use any of: {', '.join(sorted(allowed))}")
+    if any(not values for values in grid.values()):
+        raise ValueError("Every sweep parameter needs at least one value")
+
+    count = int(np.prod([len(values) for values in grid.values()])) if grid else 1
+    if count > max_combinations:
+        raise ValueError(f"Grid has {count} combinations, the limit is {max_combinations}")
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+
+def evaluate(inputs: Dict[str, np.ndarray], base_config: Dict[str, Any], backtest: Dict[str, Any], parameters: Dict[str, Any]) -> Dict[str, Any]:
+    """Score one parameter set; an invalid combination is reported instead of raised"""
+    config = base_config
+    options = dict(backtest)
+    try:
+        for path, value in parameters.items():
+            if path.startswith(BACKTEST_PREFIX):
+                options[path[len(BACKTEST_PREFIX):]] = value
+            else:
+                config = set_field(config, path, value)
+        result = simulate(score_inputs(inputs, FormulaConfig(config)), **options)
+    except ValueError as e:
+        return {"parameters": parameters, "error": str(e)}
+    return {"parameters": parameters, **{field: result[field] for field in SUMMARY_FIELDS}}
+
+
+def sweep_inline(
+    panel: BarPanel,
+    benchmark: str,
+    base_config: Dict[str, Any],
+    backtest: Dict[str, Any],
+    parameter_sets: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Evaluate the whole grid in this process, building the shared inputs once"""
+    inputs = market_inputs(panel, benchmark)
+    return [evaluate(inputs, base_config, backtest, parameters) for parameters in parameter_sets]
+
+
+def sweep_chunk(
+    spec: Dict[str, Any],
+    tickers: List[str],
+    lengths: np.ndarray,
+    benchmark: str,
+    base_config: Dict[str, Any],
+    backtest: Dict[str, Any],
+    parameter_sets: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Worker entry point: attach to the shared bars once and evaluate a slice of the grid.
+
+    The formula-independent inputs (returns, GMMA ribbons, RS) are built once
+    per worker call; each parameter set only re-scores ATR% and SATA.
+    """
+    block = shared_memory.SharedMemory(name=spec["name"])
+    try:
+        matrices = np.ndarray(spec["shape"], dtype=np.float64, buffer=block.buf)
+        matrices.flags.writeable = False
+        panel = BarPanel(tickers, matrices[0], matrices[1], matrices[2], matrices[3], lengths)
+        inputs = market_inputs(panel, benchmark)
+        results = [evaluate(inputs, base_config, backtest, parameters) for parameters in parameter_sets]
+        del panel, matrices, inputs
+    finally:
+        block.close()
+    return results
+
+
+def rank_results(results: List[Dict[str, Any]], rank_by: str) -> List[Dict[str, Any]]:
+    """Best first by `rank_by`; errors and missing values sink to the bottom"""
+    ordered = sorted(results, key=lambda row: (row.get(rank_by) is None, -(row.get(rank_by) or 0)))
+    for rank, row in enumerate(ordered, start=1):
+        row["rank"] = rank
+    return ordered
+
+
+class ParameterSweep:
+    """Evaluate formula parameter grids against stored bars on a process pool"""
+
+    def __init__(self, processes: int = SWEEP_PROCESSES):
+        self.processes = processes
+        self.pool = LazyProcessPool(processes)
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+    async def run(
+        self,
+        panel: BarPanel,
+        base_config: Dict[str, Any],
+        grid: Dict[str, List[Any]],
+        backtest: Optional[Dict[str, Any]] = None,
+        rank_by: str = "sharpe",
+        benchmark: str = "SPY"
+    ) -> Dict[str, Any]:
+        """Ranked results table for every combination in `grid`"""
+        if rank_by not in RANK_FIELDS:
+            raise ValueError(f"Unknown rank field {rank_by!r}, expected one of {', '.join(RANK_FIELDS)}")
+        started = time.perf_counter()
+        parameter_sets = expand_grid(grid)
+        backtest = backtest or {}
+        loop = asyncio.get_running_loop()
+
+        # Contiguous slices so each worker builds the shared inputs once
+        workers = max(1, min(self.processes, len(parameter_sets)))
+        slices = [list(chunk) for chunk in np.array_split(np.arange(len(parameter_sets)), workers) if len(chunk)]
+
+        results: List[Dict[str, Any]] = []
+        if workers == 1:
+            results = await loop.run_in_executor(
+                market_data_executor,
+                functools.partial(sweep_inline, panel, benchmark, base_config, backtest, parameter_sets)
+            )
+        else:
+            block, spec = share_panel(panel)
+            try:
+                jobs = [
+                    loop.run_in_executor(
+                        self.pool.executor,
+                        functools.partial(
+                            sweep_chunk, spec, panel.tickers, panel.lengths, benchmark, base_config, backtest,
+                            [parameter_sets[i] for i in indexes]
+                        )
+                    )
+                    for indexes in slices
+                ]
+                for chunk in await asyncio.gather(*jobs):
+                    results.extend(chunk)
+            except Exception as e:
+                logging.error(f"Parameter sweep process pool failed, falling back to a single pass: {e}")
+                results = await loop.run_in_executor(
+                    market_data_executor,
+                    functools.partial(sweep_inline, panel, benchmark, base_config, backtest, parameter_sets)
+                )
+            finally:
+                block.close()
+                block.unlink()
+
+        return {
+            "combinations": len(parameter_sets),
+            "rank_by": rank_by,
+            "workers": workers,
+            "tickers": len(panel),
+            "days": int(panel.close.shape[0]),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            "results": rank_results(results, rank_by)
+        }
+
+
+parameter_sweep = ParameterSweep()
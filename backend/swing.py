@@ -0,0 +1,28 @@
+from datetime import datetime
+from typing import Optional, Dict, Any
+
+from gmma import GMMA_SPANS
+
+# A swing runs while the GMMA fan is stacked RWB and price holds above its 20-day SMA
+SWING_RULE = "RWB GMMA and close > SMA20"
+
+
+def is_swing_bar(emas: Dict[int, Optional[float]], close: float, sma20: Optional[float]) -> bool:
+    """Whether one bar satisfies SWING_RULE, from the running EMA and SMA20 values"""
+    if sma20 is None or close <= sma20:
+        return False
+    ribbon = [emas.get(span) for span in GMMA_SPANS]
+    if any(value is None for value in ribbon):
+        return False
+    # RWB: every EMA above the next slower one, as in gmma.classify_ribbons
+    return all(faster > slower for faster, slower in zip(ribbon, ribbon[1:]))
+
+
+def swing_fields(state) -> Dict[str, Any]:
+    """ETFData swing fields from a ticker's indicator state"""
+    if state is None or state.swing_start_ts is None:
+        return {"swing_start_date": None, "swing_days": 0}
+    return {
+        "swing_start_date": datetime.utcfromtimestamp(state.swing_start_ts),
+        "swing_days": state.swing_bars
+    }
@@ -0,0 +1,250 @@
+import os
+import time
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any, Tuple
+
+import numpy as np
+
+from bar_store import BAR_ADJUSTMENT_TOLERANCE
+from market_data import run_blocking, get_market_session, NY_TZ
+from market_score import MARKET_SCORE_TICKERS
+from rs_matrix import RS_MATRIX_BENCHMARKS
+
+TIMESERIES_ENABLED = os.environ.get('TIMESERIES_ENABLED', 'true').lower() == 'true'
+
+# Retention per collection in days, enforced by the time-series TTL monitor (0 keeps everything)
+MARKET_SCORE_RETENTION_DAYS = int(os.environ.get('MARKET_SCORE_RETENTION_DAYS', '730'))
+SNAPSHOT_RETENTION_DAYS = int(os.environ.get('SNAPSHOT_RETENTION_DAYS', '1830'))
+CHART_ANALYSIS_RETENTION_DAYS = int(os.environ.get('CHART_ANALYSIS_RETENTION_DAYS', '60'))
+BAR_RETENTION_DAYS = int(os.environ.get('BAR_RETENTION_DAYS', '0'))
+
+TIMESERIES_BATCH_SIZE = int(os.environ.get('TIMESERIES_BATCH_SIZE', '1000'))
+
+EPOCH = datetime(1970, 1, 1)
+
+# Collection layout: time field, metadata field, bucket granularity and retention
+TIMESERIES_COLLECTIONS: Dict[str, Dict[str, Any]] = {
+    "market_scores": {
+        "timeField": "date", "metaField": "source", "granularity": "minutes",
+        "retention_days": MARKET_SCORE_RETENTION_DAYS
+    },
+    "historical_snapshots": {
+        "timeField": "date", "metaField": "kind", "granularity": "hours",
+        "retention_days": SNAPSHOT_RETENTION_DAYS
+    },
+    "chart_analyses": {
+        "timeField": "created_at", "metaField": "ticker", "granularity": "hours",
+        "retention_days": CHART_ANALYSIS_RETENTION_DAYS
+    },
+    "bars": {
+        "timeField": "ts", "metaField": "meta", "granularity": "hours",
+        "retention_days": BAR_RETENTION_DAYS
+    }
+}
+
+
+async def collection_info(db, name: str) -> Optional[Dict[str, Any]]:
+    cursor = await db.list_collections(filter={"name": name})
+    infos = await cursor.to_list(length=None)
+    return infos[0] if infos else None
+
+
+def is_timeseries(info: Optional[Dict[str, Any]]) -> bool:
+    return bool(info) and info.get("type") == "timeseries"
+
+
+async def ensure_timeseries(db, name: str, spec: Dict[str, Any]) -> str:
+    """Create a missing time-series collection or sync its TTL.
+
+    Returns 'created', 'timeseries', or 'needs_migration' for a plain
+    collection that still holds data in the old layout.
+    """
+    info = await collection_info(db, name)
+    expire = spec["retention_days"] * 86400 if spec["retention_days"] else None
+    if info is None:
+        options = {"expireAfterSeconds": expire} if expire else {}
+        await db.create_collection(
+            name,
+            timeseries={"timeField": spec["timeField"], "metaField": spec["metaField"], "granularity": spec["granularity"]},
+            **options
+        )
+        return "created"
+    if not is_timeseries(info):
+        return "needs_migration"
+    if info.get("options", {}).get("expireAfterSeconds") != expire:
+        await db.command("collMod", name, expireAfterSeconds=expire if expire else "off")
+    return "timeseries"
+
+
+async def ensure_timeseries_collections(db) -> Dict[str, str]:
+    """Startup check for every time-series collection; plain ones are left for the migration tool"""
+    statuses = {}
+    for name, spec in TIMESERIES_COLLECTIONS.items():
+        try:
+            statuses[name] = await ensure_timeseries(db, name, spec)
+        except Exception as e:
+            # Standalone servers older than 5.0 have no time-series support
+            logging.error(f"Cannot prepare time-series collection {name}: {e}")
+            statuses[name] = "unavailable"
+        if statuses[name] == "needs_migration":
+            logging.warning(f"Collection {name} is not a time-series collection yet; run migrate_timeseries.py")
+    return statuses
+
+
+async def timeseries_collections(db) -> Dict[str, bool]:
+    """Which of the managed collections are already time-series (and so expire by TTL)"""
+    return {name: is_timeseries(await collection_info(db, name)) for name in TIMESERIES_COLLECTIONS}
+
+
+async def migrate_collection(db, name: str, spec: Dict[str, Any], batch_size: int = TIMESERIES_BATCH_SIZE, drop_legacy: bool = False) -> Dict[str, Any]:
+    """Move a plain collection into a new time-series collection of the same name.
+
+    The old collection is renamed to `<name>_legacy_<timestamp>` and copied
+    in batches; documents without a date in the time field, or already past
+    retention, are skipped. The legacy copy is kept unless `drop_legacy`.
+    """
+    started = time.perf_counter()
+    info = await collection_info(db, name)
+    if is_timeseries(info):
+        return {"collection": name, "status": "already_timeseries"}
+    if info is None:
+        await ensure_timeseries(db, name, spec)
+        return {"collection": name, "status": "created"}
+
+    legacy = f"{name}_legacy_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+    await db[name].rename(legacy)
+    await ensure_timeseries(db, name, spec)
+
+    time_filter: Dict[str, Any] = {"$type": "date"}
+    if spec["retention_days"]:
+        time_filter["$gte"] = datetime.utcnow() - timedelta(days=spec["retention_days"])
+    cursor = db[legacy].find({spec["timeField"]: time_filter}, {"_id": 0}).sort(spec["timeField"], 1)
+
+    copied = 0
+    batch: List[Dict[str, Any]] = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            await db[name].insert_many(batch, ordered=False)
+            copied += len(batch)
+            batch = []
+    if batch:
+        await db[name].insert_many(batch, ordered=False)
+        copied += len(batch)
+
+    total = await db[legacy].count_documents({})
+    if drop_legacy:
+        await db[legacy].drop()
+    return {
+        "collection": name,
+        "status": "migrated",
+        "legacy": None if drop_legacy else legacy,
+        "copied": copied,
+        "skipped": total - copied,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+def completed_bars(bars: np.ndarray, after: Optional[int], now: Optional[datetime] = None) -> np.ndarray:
+    """Bars newer than `after`, minus today's bar while the session is still open.
+
+    Time-series documents cannot be rewritten on older servers, so a partial
+    daily bar is only archived once the regular session is over.
+    """
+    if after is not None:
+        bars = bars[bars['ts'] > after]
+    ny_time = now.astimezone(NY_TZ) if now else datetime.now(NY_TZ)
+    if bars.size and get_market_session(ny_time) in ("pre", "regular"):
+        session_start = NY_TZ.localize(datetime(ny_time.year, ny_time.month, ny_time.day)).timestamp()
+        bars = bars[bars['ts'] < session_start]
+    return bars
+
+
+def bar_documents(ticker: str, interval: str, bars: np.ndarray) -> List[Dict[str, Any]]:
+    return [
+        {
+            "ts": datetime.utcfromtimestamp(int(bar['ts'])),
+            "meta": {"ticker": ticker, "interval": interval},
+            "open": float(bar['open']),
+            "high": float(bar['high']),
+            "low": float(bar['low']),
+            "close": float(bar['close']),
+            "volume": float(bar['volume'])
+        }
+        for bar in bars
+    ]
+
+
+def archive_tickers(members: List[Dict[str, Any]]) -> List[str]:
+    """Universe members plus the market-score and RS benchmark inputs"""
+    return list(dict.fromkeys([member["ticker"] for member in members] + MARKET_SCORE_TICKERS + RS_MATRIX_BENCHMARKS))
+
+
+def archive_readjusted(bars: np.ndarray, tail: Dict[str, float], tolerance: float = BAR_ADJUSTMENT_TOLERANCE) -> bool:
+    """Whether the store's bar at the archived tail no longer has the archived close (a split or dividend)"""
+    matches = bars['close'][bars['ts'] == tail["ts"]]
+    return bool(matches.size) and abs(matches[0] - tail["close"]) > tolerance * abs(tail["close"])
+
+
+class BarArchive:
+    """Completed bars mirrored from the local bar store into the `bars` time-series collection.
+
+    The archived tail per ticker (last ts and close) is re-read with one
+    aggregation at the start of every sync, so bars written or removed by
+    another worker are never missed. A ticker whose stored history was
+    re-adjusted since it was archived is deleted and archived again.
+    """
+
+    def __init__(self, collection, batch_size: int = TIMESERIES_BATCH_SIZE):
+        self.collection = collection
+        self.batch_size = batch_size
+
+    async def tails(self, interval: str = "1d") -> Dict[str, Dict[str, float]]:
+        pipeline = [
+            {"$match": {"meta.interval": interval}},
+            {"$sort": {"meta.ticker": 1, "ts": 1}},
+            {"$group": {"_id": "$meta.ticker", "ts": {"$last": "$ts"}, "close": {"$last": "$close"}}}
+        ]
+        cursor = self.collection.aggregate(pipeline)
+        return {
+            doc["_id"]: {"ts": int((doc["ts"] - EPOCH).total_seconds()), "close": float(doc["close"])}
+            async for doc in cursor
+        }
+
+    async def sync(self, store, tickers: List[str], interval: str = "1d") -> Dict[str, Any]:
+        started = time.perf_counter()
+        tails = await self.tails(interval)
+
+        def collect() -> Tuple[Dict[str, List[Dict[str, Any]]], List[str]]:
+            pending = {}
+            rewrites = []
+            for ticker in tickers:
+                bars = store.read(ticker, interval)
+                if bars is None or bars.size == 0:
+                    continue
+                tail = tails.get(ticker)
+                if tail is not None and archive_readjusted(bars, tail):
+                    rewrites.append(ticker)
+                    tail = None
+                bars = completed_bars(bars, tail["ts"] if tail else None)
+                if bars.size:
+                    pending[ticker] = bar_documents(ticker, interval, bars)
+            return pending, rewrites
+
+        pending, rewrites = await run_blocking(collect)
+        if rewrites:
+            # Time-series documents cannot be updated in place, so adjusted histories are replaced
+            await self.collection.delete_many({"meta.ticker": {"$in": rewrites}, "meta.interval": interval})
+            logging.info(f"Re-archiving adjusted bars for {', '.join(rewrites)}")
+        docs = [doc for ticker_docs in pending.values() for doc in ticker_docs]
+        for start in range(0, len(docs), self.batch_size):
+            await self.collection.insert_many(docs[start:start + self.batch_size], ordered=False)
+
+        return {
+            "tickers": len(tickers),
+            "tickers_written": len(pending),
+            "tickers_rewritten": len(rewrites),
+            "bars_written": len(docs),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
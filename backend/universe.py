@@ -0,0 +1,96 @@
+import os
+from datetime import datetime
+from typing import List, Dict, Any
+
+from pymongo import UpdateOne
+
+# Refresh sharding settings
+UNIVERSE_SHARD_SIZE = int(os.environ.get('UNIVERSE_SHARD_SIZE', '250'))
+UNIVERSE_MAX_PARALLEL_SHARDS = int(os.environ.get('UNIVERSE_MAX_PARALLEL_SHARDS', '4'))
+
+# Seed list for an empty universe collection
+DEFAULT_ETF_UNIVERSE = [
+    # Major Indices
+    {"ticker": "SPY", "name": "SPDR S&P 500 ETF", "sector": "Broad Market", "theme": "Large Cap"},
+    {"ticker": "QQQ", "name": "Invesco QQQ Trust", "sector": "Technology", "theme": "Large Cap Growth"},
+    {"ticker": "IWM", "name": "iShares Russell 2000 ETF", "sector": "Small Cap", "theme": "Small Cap"},
+    {"ticker": "DIA", "name": "SPDR Dow Jones Industrial ETF", "sector": "Broad Market", "theme": "Blue Chip"},
+    
+    # Leveraged ETFs
+    {"ticker": "TQQQ", "name": "ProShares UltraPro QQQ", "sector": "Technology", "theme": "3x Leveraged"},
+    {"ticker": "SQQQ", "name": "ProShares UltraPro Short QQQ", "sector": "Technology", "theme": "3x Inverse"},
+    {"ticker": "TNA", "name": "Direxion Daily Small Cap Bull 3X", "sector": "Small Cap", "theme": "3x Leveraged"},
+    {"ticker": "SPXL", "name": "Direxion Daily S&P 500 Bull 3X", "sector": "Large Cap", "theme": "3x Leveraged"},
+    {"ticker": "QLD", "name": "ProShares Ultra QQQ", "sector": "Technology", "theme": "2x Leveraged"},
+    
+    # Sector ETFs
+    {"ticker": "XLK", "name": "Technology Select Sector SPDR", "sector": "Technology", "theme": "Sector"},
+    {"ticker": "XLF", "name": "Financial Select Sector SPDR", "sector": "Financials", "theme": "Sector"},
+    {"ticker": "XLV", "name": "Health Care Select Sector SPDR", "sector": "Healthcare", "theme": "Sector"},
+    {"ticker": "XLE", "name": "Energy Select Sector SPDR", "sector": "Energy", "theme": "Sector"},
+    {"ticker": "XLI", "name": "Industrial Select Sector SPDR", "sector": "Industrials", "theme": "Sector"},
+    {"ticker": "XLU", "name": "Utilities Select Sector SPDR", "sector": "Utilities", "theme": "Sector"},
+    {"ticker": "XLP", "name": "Consumer Staples Select Sector", "sector": "Consumer Staples", "theme": "Sector"},
+    {"ticker": "XLY", "name": "Consumer Discretionary Select Sector", "sector": "Consumer Discretionary", "theme": "Sector"},
+    
+    # Growth & Momentum
+    {"ticker": "MGK", "name": "Vanguard Mega Cap Growth ETF", "sector": "Growth", "theme": "Large Cap Growth"},
+    {"ticker": "ARKK", "name": "ARK Innovation ETF", "sector": "Innovation", "theme": "Disruptive Growth"},
+    {"ticker": "FFTY", "name": "Innovator IBD 50 ETF", "sector": "Growth", "theme": "Momentum"},
+    {"ticker": "VUG", "name": "Vanguard Growth ETF", "sector": "Growth", "theme": "Large Cap Growth"},
+    {"ticker": "QQQE", "name": "Invesco NASDAQ 100 Equal Weight", "sector": "Technology", "theme": "Equal Weight"},
+    {"ticker": "QQQI", "name": "Invesco NASDAQ Internet ETF", "sector": "Technology", "theme": "Internet"},
+    
+    # Specialty & Thematic
+    {"ticker": "GLD", "name": "SPDR Gold Shares", "sector": "Commodities", "theme": "Precious Metals"},
+    {"ticker": "TLT", "name": "iShares 20+ Year Treasury Bond", "sector": "Bonds", "theme": "Long Term Treasury"},
+    {"ticker": "UVXY", "name": "ProShares Ultra VIX Short-Term", "sector": "Volatility", "theme": "2x Volatility"},
+]
+
+
+async def ensure_universe(collection):
+    """Create indexes and seed the default ETFs into an empty universe"""
+    await collection.create_index("ticker", unique=True)
+    await collection.create_index("tags")
+    await collection.create_index([("sector", 1), ("theme", 1)])
+    if await collection.count_documents({}, limit=1) == 0:
+        await upsert_members(collection, DEFAULT_ETF_UNIVERSE)
+
+
+def normalize_member(member: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "ticker": member["ticker"].upper().strip(),
+        "name": member.get("name") or member["ticker"].upper(),
+        "sector": member.get("sector") or "Unknown",
+        "theme": member.get("theme") or "Unknown",
+        "asset_type": member.get("asset_type") or "etf",
+        "tags": sorted(set(member.get("tags") or [])),
+        "active": member.get("active", True)
+    }
+
+
+async def upsert_members(collection, members: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Insert or update many members with one unordered bulk write"""
+    now = datetime.utcnow()
+    operations = []
+    for member in members:
+        doc = normalize_member(member)
+        operations.append(UpdateOne(
+            {"ticker": doc["ticker"]},
+            {"$set": {**doc, "updated_at": now}, "$setOnInsert": {"added_at": now}},
+            upsert=True
+        ))
+    if not operations:
+        return {"inserted": 0, "modified": 0}
+    result = await collection.bulk_write(operations, ordered=False)
+    return {"inserted": result.upserted_count, "modified": result.modified_count}
+
+
+async def load_universe(collection, query: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+    """Active universe members, ordered by ticker"""
+    query = {"active": True, **(query or {})}
+    return await collection.find(query, {"_id": 0}).sort("ticker", 1).to_list(length=None)
+
+
+def partition_universe(members: List[Dict[str, Any]], shard_size: int = UNIVERSE_SHARD_SIZE) -> List[List[Dict[str, Any]]]:
+    return [members[i:i + shard_size] for i in range(0, len(members), shard_size)]
@@ -67,14 +67,6 @@ const SwingAnalysisGrid = ({
     return 'bg-transparent';
   };
 
-  // Calculate swing days
-  const calculateSwingDays = (swingDate) => {
-    if (!swingDate) return 0;
-    const today = new Date();
-    const swing = new Date(swingDate);
-    return Math.floor((today - swing) / (1000 * 60 * 60 * 24));
-  };
-
   // Sorting function
   const handleSort = (key) => {
     let direction = 'asc';
@@ -145,11 +137,11 @@ const SwingAnalysisGrid = ({
           <div className="bg-white/5 rounded-lg p-4 mt-3">
             <h3 className="text-lg font-semibold text-white mb-3">📐 Calculation Formulas</h3>
             <div className="grid grid-cols-1 md:grid-cols-2 gap-4 text-sm font-mono text-gray-300">
-              <div><div className="text-cyan-300 font-semibold">Swing Days:</div><div>=TODAY() - [Swing_Start_Date]</div></div>
+              <div><div className="text-cyan-300 font-semibold">Swing Days:</div><div>Sessions since the swing started (RWB GMMA and Close &gt; SMA20)</div></div>
               <div><div className="text-blue-300 font-semibold">SATA Score (1-10):</div><div>Performance(40%) + RelStr(30%) + Vol(20%) + ATR(10%)</div></div>
               <div><div className="text-yellow-300 font-semibold">ATR Percent:</div><div>=(14_Day_ATR / Current_Price) * 100</div></div>
               <div><div className="text-purple-300 font-semibold">Relative Strength:</div><div>=(ETF_Return - SPY_Return) / |SPY_Return|</div></div>
-              <div><div className="text-red-300 font-semibold">GMMA Pattern:</div><div>RWB: Weekly&gt;0 & Monthly&gt;0, BWR: Both&lt;0</div></div>
+              <div><div className="text-red-300 font-semibold">GMMA Pattern:</div><div>RWB: all 12 EMAs (3→60) in strict order, each above the next slower; BWR: each below</div></div>
               <div><div className="text-cyan-300 font-semibold">Color Logic:</div><div>Green: RS&gt;10% & SATA≥7 & GMMA=RWB</div></div>
             </div>
           </div>
@@ -198,7 +190,7 @@ const SwingAnalysisGrid = ({
             </thead>
             <tbody>
               {processedEtfs.map((etf) => {
-                const swingDays = calculateSwingDays(etf.swing_start_date);
+                const swingDays = etf.swing_days ?? 0;
                 return (
                   <tr key={etf.ticker} className={`border-b border-white/10 hover:bg-white/5 transition-colors ${getRowColor(etf)}`}>
                     <td className="px-4 py-4">
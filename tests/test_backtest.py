@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+from backtest import rule_inputs, simulate, run_backtest, color_rule_signals, swing_leader_signals
+from metrics_engine import BarPanel
+
+
+def session_bars(days, closes):
+    bars = np.zeros(len(days), dtype=[("ts", "i8"), ("open", "f8"), ("high", "f8"), ("low", "f8"), ("close", "f8"), ("volume", "f8")])
+    bars["ts"] = [int(pd.Timestamp(f"{day} 16:00", tz="America/New_York").timestamp()) for day in days]
+    bars["close"] = closes
+    bars["open"] = closes
+    bars["high"] = np.asarray(closes) + 1
+    bars["low"] = np.asarray(closes) - 1
+    bars["volume"] = 1e6
+    return bars
+
+
+def test_aligned_panel_rows_are_shared_sessions():
+    days = list(pd.bdate_range("2026-01-05", periods=10).strftime("%Y-%m-%d"))
+    # LATE lists on day 2 and has no bar on day 7; SPY trades every day
+    late_days = days[2:7] + days[8:]
+    panel = BarPanel.from_aligned_bars({
+        "SPY": session_bars(days, np.arange(100.0, 110.0)),
+        "LATE": session_bars(late_days, np.arange(1.0, 8.0))
+    })
+
+    assert panel.close.shape == (10, 2)
+    late = panel.position("LATE")
+    np.testing.assert_array_equal(np.isnan(panel.close[:, late]), [True, True, False, False, False, False, False, True, False, False])
+    np.testing.assert_array_equal(panel.close[[2, 6, 8, 9], late], [1.0, 5.0, 6.0, 7.0])
+    assert panel.lengths[late] == 8
+    assert panel.last_ts[late] == session_bars(late_days[-1:], [7.0])["ts"][0]
+
+    # A right-aligned panel would pair LATE's last bar with SPY's, but its first with SPY's day 3
+    right_aligned = BarPanel.from_bars({"SPY": session_bars(days, np.arange(100.0, 110.0)), "LATE": session_bars(late_days, np.arange(1.0, 8.0))})
+    assert right_aligned.close[3, late] == 1.0
+
+
+def test_backtest_on_aligned_panel_skips_missing_sessions():
+    rng = np.random.default_rng(3)
+    days = list(pd.bdate_range("2025-01-02", periods=300).strftime("%Y-%m-%d"))
+    gappy = [day for i, day in enumerate(days) if i % 17 != 5]
+    bars = {
+        "SPY": session_bars(days, 100 * np.exp(np.cumsum(rng.normal(0.0005, 0.01, len(days))))),
+        "GAPPY": session_bars(gappy, 50 * np.exp(np.cumsum(rng.normal(0.001, 0.02, len(gappy)))))
+    }
+    panel = BarPanel.from_aligned_bars(bars)
+    inputs = rule_inputs(panel)
+    gappy = panel.position("GAPPY")
+    missing = np.array([i % 17 == 5 for i in range(len(days))])
+
+    # No return, and so no signal, on a session the ticker did not trade
+    assert np.isnan(inputs["change_1w"][missing, gappy]).all()
+    assert not color_rule_signals(inputs, min_sata=0)[missing, gappy].any()
+    assert not swing_leader_signals(inputs, top_n=2)[missing, gappy].any()
+
+    result = simulate(inputs, "swing_leaders", hold_days=1, top_n=1, min_sata=0)
+    assert result["days"] == len(days)
+    assert result["parameters"]["top_n"] == 1
+    assert simulate(inputs, "color_rule", hold_days=5, top_n=3)["parameters"]["top_n"] is None
+
+
+def test_backtest_reports_the_dates_it_replayed():
+    days = list(pd.bdate_range("2026-01-05", periods=40).strftime("%Y-%m-%d"))
+    panel = BarPanel.from_aligned_bars({
+        "SPY": session_bars(days, np.linspace(100.0, 120.0, 40)),
+        "XLE": session_bars(days, np.linspace(50.0, 40.0, 40))
+    })
+    result = run_backtest(panel, "color_rule", hold_days=5, min_sata=0)
+    assert (result["start_date"], result["end_date"]) == (days[0], days[-1])
+    assert result["days"] == 40
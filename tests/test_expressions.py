@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from expressions import ColumnTable, ExpressionCompiler, ExpressionError, parse_column_definition
+
+
+@pytest.fixture
+def table():
+    return ColumnTable([
+        {"ticker": "AAA", "sector": "Technology", "change_1m": 12.0, "sata_score": 8},
+        {"ticker": "BBB", "sector": "Energy", "change_1m": -3.0, "sata_score": 4},
+        {"ticker": "CCC", "sector": "Utilities", "change_1m": None, "sata_score": 6}
+    ])
+
+
+@pytest.mark.parametrize("source", [
+    "__import__('os').system('true')",
+    "change_1m.__class__",
+    "(lambda: 1)()",
+    "change_1m[0]",
+    "[x for x in change_1m]",
+    "open('/etc/passwd')",
+    "np.where(change_1m > 0, 1, 0)",
+    "sector in ticker",
+    "sector in (ticker,)",
+    "change_1m := 1",
+    "f'{ticker}'",
+])
+def test_sandbox_rejects_code_outside_the_whitelist(source):
+    with pytest.raises(ExpressionError):
+        ExpressionCompiler().compile(source)
+
+
+@pytest.mark.parametrize("source", ["where(change_1m > 0)", "where(change_1m > 0, 1, 2, 3)", "abs()", "coalesce(change_1m)"])
+def test_function_arity_is_checked_at_compile_time(source):
+    with pytest.raises(ExpressionError, match="argument"):
+        ExpressionCompiler().compile(source)
+
+
+def test_results_must_have_one_value_per_row(table):
+    table.add("misshapen", np.arange(5.0))
+    with pytest.raises(ExpressionError, match="one value per row"):
+        ExpressionCompiler().compile("misshapen * 2").evaluate(table)
+
+
+def test_unknown_fields_and_runtime_failures_raise_expression_error(table):
+    compiler = ExpressionCompiler()
+    with pytest.raises(ExpressionError, match="Unknown field"):
+        compiler.compile("no_such_field > 1").evaluate(table)
+    with pytest.raises(ExpressionError):
+        compiler.compile("round(change_1m, sata_score)").evaluate(table)
+
+
+def test_whitelisted_expressions_evaluate_over_columns(table):
+    compiler = ExpressionCompiler()
+    np.testing.assert_array_equal(
+        compiler.compile("change_1m > 0 and sata >= 7").mask(table), [True, False, False]
+    )
+    np.testing.assert_array_equal(
+        compiler.compile("where(sector in ('Energy', 'Utilities'), 1, 0)").evaluate(table), [0, 1, 1]
+    )
+    np.testing.assert_array_equal(compiler.compile("coalesce(change_1m, 0)").evaluate(table), [12.0, -3.0, 0.0])
+
+
+def test_column_definitions_cannot_shadow_functions_or_fields():
+    assert parse_column_definition("momentum = change_1m * 2") == ("momentum", "change_1m * 2")
+    for definition in ("where = 1", "sata = 1", "no equals sign"):
+        with pytest.raises(ExpressionError):
+            parse_column_definition(definition)
@@ -0,0 +1,62 @@
+import asyncio
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from formulas import FormulaConfig, FormulaService, MetricTable
+from metrics_engine import BarPanel
+
+
+def random_frame(rng, bars):
+    close = 50 * np.exp(np.cumsum(rng.normal(0.0005, 0.02, bars)))
+    spread = np.abs(rng.normal(0, 0.01, bars)) * close
+    index = pd.date_range("2026-01-02", periods=bars, freq="B", tz="America/New_York")
+    return pd.DataFrame({
+        "Open": close, "High": close + spread, "Low": close - spread, "Close": close,
+        "Volume": np.full(bars, 2e6)
+    }, index=index)
+
+
+def row(ticker, computed_at, change_1m, rs_1m):
+    return {
+        "ticker": ticker, "computed_at": computed_at, "current_price": 50.0, "change_1m": change_1m,
+        "volume": 2e6, "relative_strength_1m": rs_1m, "atr_percent": 3.0
+    }
+
+
+def test_stale_table_is_rebuilt_from_stored_rows_before_scoring():
+    rng = np.random.default_rng(5)
+    frames = {ticker: random_frame(rng, 60) for ticker in ("AAA", "BBB", "NEW")}
+    old_refresh, new_refresh = datetime(2026, 3, 2, 21, 0), datetime(2026, 3, 3, 21, 0, 0, 123000)
+
+    # This worker's table is from an older refresh and predates NEW joining the universe
+    old_panel = BarPanel.from_frames({ticker: frames[ticker] for ticker in ("AAA", "BBB")})
+    old_metrics = {name: np.zeros(2) for name in MetricTable.COLUMNS}
+    service = FormulaService(collection=None)
+    service.table = MetricTable.from_metrics(old_panel, old_metrics, old_refresh)
+
+    loaded = []
+
+    async def load_panel(tickers):
+        loaded.append(tickers)
+        return BarPanel.from_frames({ticker: frames[ticker] for ticker in tickers})
+
+    # Another worker's refresh wrote new values for every row
+    stored = [row("AAA", new_refresh, 12.0, 0.2), row("BBB", new_refresh, -12.0, -0.2), row("NEW", new_refresh, 0.0, 0.0)]
+    table = asyncio.run(service.table_for(stored, load_panel))
+
+    assert loaded == [["AAA", "BBB", "NEW"]]
+    assert service.table is table
+    assert table.computed_at == new_refresh
+    assert table.tickers == ["AAA", "BBB", "NEW"]
+    sata = table.score(FormulaConfig())["sata_score"]
+    expected = FormulaConfig().sata(
+        np.array([12.0, -12.0, 0.0]), np.full(3, 2e6), table.atr_percent(14), np.array([0.2, -0.2, 0.0])
+    )
+    np.testing.assert_array_equal(sata, expected)
+    assert sata[0] > sata[1]
+
+    # Rows from the table's own refresh reuse it without reading bars
+    assert asyncio.run(service.table_for(stored, load_panel)) is table
+    assert len(loaded) == 1
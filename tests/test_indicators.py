@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from bar_store import BAR_DTYPE
+from gmma import ema_matrix
+from indicator_state import IndicatorState, EMA_SPANS
+from indicators import compute_indicators, parse_indicator_set, STATE_INDICATOR_SET
+from metrics_engine import BarPanel
+
+
+def random_bars(rng, bars):
+    close = 50 * np.exp(np.cumsum(rng.normal(0.0005, 0.02, bars)))
+    spread = np.abs(rng.normal(0, 0.01, bars)) * close
+    out = np.zeros(bars, dtype=BAR_DTYPE)
+    out["ts"] = 1_700_000_000 + np.arange(bars) * 86400
+    out["open"] = out["close"] = close
+    out["high"] = close + spread
+    out["low"] = close - spread
+    out["volume"] = 1e6
+    return out
+
+
+@pytest.fixture(scope="module")
+def bars_by_ticker():
+    rng = np.random.default_rng(21)
+    # Different lengths exercise the right-aligned NaN padding of the batch panel
+    return {f"T{j}": random_bars(rng, int(n)) for j, n in enumerate([300, 300, 120, 61])}
+
+
+def streamed_state(bars, rng):
+    """Feed bars one at a time; some arrive first as a partial bar that is later replaced"""
+    state = IndicatorState()
+    for i, bar in enumerate(bars):
+        ts, high, low, close = int(bar["ts"]), float(bar["high"]), float(bar["low"]), float(bar["close"])
+        if i > 0 and (i % 7 == 0 or i == len(bars) - 1):
+            partial = close * (1 + rng.normal(0, 0.03))
+            state.update(ts, max(high, partial), min(low, partial), partial)
+        state.update(ts, high, low, close)
+    return state
+
+
+def test_streaming_state_matches_batch_indicators(bars_by_ticker):
+    rng = np.random.default_rng(4)
+    panel = BarPanel.from_bars(bars_by_ticker)
+    batch = compute_indicators(panel, parse_indicator_set(STATE_INDICATOR_SET + ",atr14"))
+    batch_emas = ema_matrix(panel.close, EMA_SPANS)[:, -1]
+
+    for j, (ticker, bars) in enumerate(bars_by_ticker.items()):
+        state = streamed_state(bars, rng)
+        streamed = state.indicators.values()
+        assert {"rsi14", "adx14", "plus_di14", "macd", "macd_signal", "bb20_upper", "bb20_percent_b"} <= set(streamed) <= set(batch)
+        for name, value in streamed.items():
+            np.testing.assert_allclose(value, batch[name][j], rtol=1e-9, atol=1e-9, err_msg=f"{ticker} {name}")
+        np.testing.assert_allclose(state.atr_wilder, batch["atr14"][j], rtol=1e-9, err_msg=f"{ticker} atr")
+        np.testing.assert_allclose(
+            [state.emas[span] for span in EMA_SPANS], batch_emas[:, j], rtol=1e-9, err_msg=f"{ticker} emas"
+        )
+
+
+def test_replacing_a_partial_bar_equals_never_seeing_it(bars_by_ticker):
+    bars = bars_by_ticker["T0"]
+    clean = IndicatorState.from_bars(bars)
+    replaced = streamed_state(bars, np.random.default_rng(9))
+
+    assert replaced.last_ts == clean.last_ts
+    for name, value in clean.indicators.values().items():
+        assert replaced.indicators.values()[name] == pytest.approx(value, rel=1e-12), name
+    assert replaced.atr == pytest.approx(clean.atr, rel=1e-12)
+    assert (replaced.swing_start_ts, replaced.swing_bars) == (clean.swing_start_ts, clean.swing_bars)
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bar_store import BarStore, BAR_DTYPE
+from indicator_state import IndicatorState
+from market_data import compute_price_metrics
+from metrics_engine import BarPanel, compute_universe_metrics
+from swing import is_swing_bar
+
+
+def random_frame(rng, bars):
+    close = 50 * np.exp(np.cumsum(rng.normal(0.0005, 0.02, bars)))
+    spread = np.abs(rng.normal(0, 0.01, bars)) * close
+    index = pd.date_range("2026-01-02", periods=bars, freq="B", tz="America/New_York")
+    return pd.DataFrame({
+        "Open": close,
+        "High": close + spread,
+        "Low": close - spread,
+        "Close": close,
+        "Volume": rng.integers(100000, 5000000, bars).astype(float)
+    }, index=index)
+
+
+@pytest.fixture(scope="module")
+def frames():
+    rng = np.random.default_rng(8)
+    # Mixed history lengths exercise the right-aligned NaN padding
+    lengths = [126] * 1500 + list(rng.integers(15, 126, 500))
+    return {("SPY" if i == 0 else f"T{i:04d}"): random_frame(rng, int(n)) for i, n in enumerate(lengths)}
+
+
+def test_vectorized_metrics_match_scalar_pipeline(frames):
+    panel = BarPanel.from_frames(frames)
+    metrics = compute_universe_metrics(panel, "SPY")
+    spy = compute_price_metrics(frames["SPY"])
+
+    for j, (ticker, frame) in enumerate(frames.items()):
+        expected = compute_price_metrics(frame)
+        for name in ("current_price", "change_1d", "change_1w", "change_1m", "change_3m", "change_6m", "atr_percent"):
+            np.testing.assert_allclose(metrics[name][j], expected[name], rtol=1e-9, equal_nan=True, err_msg=f"{ticker} {name}")
+        assert metrics["volume"][j] == expected["volume"]
+        for window in ("1m", "3m", "6m"):
+            benchmark = spy[f"change_{window}"]
+            rs = (expected[f"change_{window}"] - benchmark) / abs(benchmark) if benchmark != 0 else 0
+            np.testing.assert_allclose(metrics[f"relative_strength_{window}"][j], rs, rtol=1e-9, err_msg=f"{ticker} rs_{window}")
+
+
+def test_precomputed_atr_is_used_and_gaps_are_filled(frames):
+    panel = BarPanel.from_frames(dict(list(frames.items())[:10]))
+    full = compute_universe_metrics(panel, "SPY")
+    atr = np.full(len(panel), np.nan)
+    atr[3] = 1.0
+    mixed = compute_universe_metrics(panel, "SPY", atr)
+
+    assert mixed["atr_percent"][3] == pytest.approx(1.0 / full["current_price"][3] * 100)
+    others = np.arange(len(panel)) != 3
+    np.testing.assert_allclose(mixed["atr_percent"][others], full["atr_percent"][others])
+
+
+def test_gmma_pattern_and_swing_share_the_state_emas(tmp_path):
+    rng = np.random.default_rng(13)
+    bars_by_ticker, states = {}, {}
+    for j in range(40):
+        # Long trending histories, so the 6-month panel EMAs differ from the state's
+        close = 50 * np.exp(np.cumsum(rng.normal(rng.choice([-0.002, 0.002]), 0.015, 1000)))
+        bars = np.zeros(1000, dtype=BAR_DTYPE)
+        bars["ts"] = 1_600_000_000 + np.arange(1000) * 86400
+        bars["close"] = bars["open"] = close
+        bars["high"], bars["low"] = close * 1.01, close * 0.99
+        bars["volume"] = 1e6
+        state = IndicatorState()
+        for bar in bars:
+            state.update(int(bar["ts"]), bar["high"], bar["low"], bar["close"], keep_previous=False)
+        ticker = f"T{j:02d}"
+        bars_by_ticker[ticker], states[ticker] = bars[-126:], state
+    # One ticker's state lags the bars, so its ribbon comes from the panel
+    states["T00"].last_ts -= 86400
+
+    panel = BarPanel.from_bars(bars_by_ticker)
+    emas = BarStore(tmp_path).load_state_emas(panel, states=states)
+    metrics = compute_universe_metrics(panel, "T01", emas=emas)
+
+    assert np.isnan(emas[:, 0]).all()
+    assert metrics["gmma_pattern"][0] == compute_universe_metrics(panel, "T01")["gmma_pattern"][0]
+    for j, ticker in enumerate(panel.tickers[1:], start=1):
+        state = states[ticker]
+        swing = is_swing_bar(state.emas, state.last_close, state.sma20)
+        assert swing == (metrics["gmma_pattern"][j] == "RWB" and state.last_close > state.sma20), ticker
+        assert swing == (state.swing_bars > 0), ticker
@@ -0,0 +1,78 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from metrics_engine import BarPanel
+from rs_matrix import RSMatrix, RSMatrixCache, RS_MATRIX_WINDOWS, EQUAL_WEIGHT_UNIVERSE
+from rs_ranking import RSRankings, RSRankingService
+from tests.test_rs_ranking import FakeCollection
+
+
+@pytest.fixture(scope="module")
+def closes():
+    rng = np.random.default_rng(17)
+    # Short histories leave some windows without a return
+    lengths = {"SPY": 260, "QQQ": 260, "XLK": 200, "AAA": 260, "BBB": 90, "CCC": 30}
+    return {ticker: 50 * np.exp(np.cumsum(rng.normal(0.0005, 0.02, n))) for ticker, n in lengths.items()}
+
+
+def scalar_return(close, offset):
+    return close[-1] / close[-offset] - 1 if len(close) >= offset else np.nan
+
+
+def test_tensor_matches_per_pair_computation(closes):
+    frames = {
+        ticker: pd.DataFrame({"Close": close, "High": close, "Low": close, "Volume": 1e6})
+        for ticker, close in closes.items()
+    }
+    tickers = ["AAA", "BBB", "CCC", "XLK", "MISSING"]
+    matrix = RSMatrix.compute(BarPanel.from_frames(frames), tickers, ["SPY", "QQQ", "XLK", "IWM"])
+
+    assert matrix.tickers == ["AAA", "BBB", "CCC", "XLK"]
+    assert matrix.benchmarks == ["SPY", "QQQ", "XLK", EQUAL_WEIGHT_UNIVERSE]
+    assert matrix.tensor.shape == (4, 4, len(RS_MATRIX_WINDOWS))
+
+    for k, offset in enumerate(RS_MATRIX_WINDOWS.values()):
+        ticker_returns = {ticker: scalar_return(closes[ticker], offset) for ticker in matrix.tickers}
+        valid = [value for value in ticker_returns.values() if not np.isnan(value)]
+        benchmark_returns = {benchmark: scalar_return(closes[benchmark], offset) for benchmark in ("SPY", "QQQ", "XLK")}
+        benchmark_returns[EQUAL_WEIGHT_UNIVERSE] = sum(valid) / len(valid) if valid else np.nan
+
+        for i, ticker in enumerate(matrix.tickers):
+            for b, benchmark in enumerate(matrix.benchmarks):
+                expected = ((1 + ticker_returns[ticker]) / (1 + benchmark_returns[benchmark]) - 1) * 100
+                np.testing.assert_allclose(
+                    matrix.tensor[i, b, k], expected, rtol=1e-12, equal_nan=True,
+                    err_msg=f"{ticker} vs {benchmark} over {offset} bars"
+                )
+
+
+def test_cache_rebuilds_when_the_stored_rankings_version_changes():
+    collection = FakeCollection()
+    publisher, reader = RSRankingService(collection), RSRankingService(collection)
+    cache = RSMatrixCache()
+    builds = []
+
+    async def build():
+        builds.append(len(builds))
+        return RSMatrix([], [], list(RS_MATRIX_WINDOWS), np.empty((0, 0, len(RS_MATRIX_WINDOWS))))
+
+    async def serve():
+        # As the /rs/matrix route does, on a worker that did not run the refresh
+        return await cache.get(await reader.version(), build)
+
+    def publish(as_of):
+        asyncio.run(publisher.publish(RSRankings(["AAA"], [0.1], [99], ["Technology"], [99], as_of)))
+
+    publish("2026-03-02")
+    first = asyncio.run(serve())
+    assert asyncio.run(serve()) is first
+    assert len(builds) == 1
+
+    publish("2026-03-03")
+    second = asyncio.run(serve())
+    assert second is not first
+    assert asyncio.run(serve()) is second
+    assert len(builds) == 2
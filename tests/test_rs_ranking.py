@@ -0,0 +1,52 @@
+import asyncio
+import copy
+
+from rs_ranking import RSRankings, RSRankingService
+
+
+class FakeCollection:
+    """Just enough of a Motor collection for RSRankingService: replace by date, newest find_one"""
+
+    def __init__(self):
+        self.docs = {}
+        self.loads = 0
+
+    async def replace_one(self, query, doc, upsert=False):
+        self.docs[query["date"]] = copy.deepcopy(doc)
+
+    async def find_one(self, query, projection=None, sort=None):
+        if not self.docs:
+            return None
+        doc = copy.deepcopy(self.docs[max(self.docs)])
+        included = [field for field, value in projection.items() if value == 1]
+        if included:
+            return {field: doc[field] for field in included if field in doc}
+        # A full document read, as opposed to a version check
+        self.loads += 1
+        return {field: value for field, value in doc.items() if projection.get(field, 1) != 0}
+
+
+def rankings(tickers, scores, as_of):
+    return RSRankings(tickers, scores, [99 - i for i in range(len(tickers))], ["Technology"] * len(tickers), [50] * len(tickers), as_of)
+
+
+def test_latest_rankings_reload_when_another_worker_publishes():
+    collection = FakeCollection()
+    publisher, reader = RSRankingService(collection), RSRankingService(collection)
+
+    asyncio.run(publisher.publish(rankings(["AAA", "BBB"], [0.3, 0.1], "2026-03-02")))
+    first = asyncio.run(reader.get())
+    assert first.tickers == ["AAA", "BBB"]
+    # An unchanged version is served from memory
+    assert asyncio.run(reader.get()) is first
+    assert collection.loads == 1
+    # The publishing worker's own copy is already current
+    assert asyncio.run(publisher.get()) is publisher.latest
+    assert collection.loads == 1
+
+    asyncio.run(publisher.publish(rankings(["CCC", "AAA", "BBB"], [0.5, 0.3, 0.1], "2026-03-03")))
+    second = asyncio.run(reader.get())
+    assert second is not first
+    assert second.tickers == ["CCC", "AAA", "BBB"]
+    assert second.as_of == "2026-03-03"
+    assert collection.loads == 2
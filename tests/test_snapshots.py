@@ -0,0 +1,122 @@
+import asyncio
+import copy
+from datetime import datetime
+
+import pytest
+
+from snapshots import SnapshotStore, build_snapshot
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, keys):
+        for key, direction in reversed(keys):
+            self.docs.sort(key=lambda doc: doc[key], reverse=direction < 0)
+        return self
+
+    async def to_list(self, length=None):
+        return [copy.deepcopy(doc) for doc in self.docs]
+
+
+class FakeCollection:
+    """Just enough of a Motor collection for SnapshotStore: insert, ranged find, sort"""
+
+    def __init__(self):
+        self.docs = []
+
+    async def create_index(self, keys):
+        pass
+
+    async def insert_one(self, doc):
+        self.docs.append(copy.deepcopy(doc))
+
+    def find(self, query, projection=None):
+        bounds = query.get("date", {})
+        return FakeCursor([
+            doc for doc in self.docs
+            if ("$gte" not in bounds or doc["date"] >= bounds["$gte"]) and ("$lt" not in bounds or doc["date"] < bounds["$lt"])
+        ])
+
+
+def etf(ticker, sector, price, change_1m, sata):
+    return {
+        "ticker": ticker, "name": ticker, "sector": sector, "current_price": price, "change_1d": 0.5,
+        "change_1w": 1.0, "change_1m": change_1m, "relative_strength_1m": change_1m / 10,
+        "sata_score": sata, "gmma_pattern": "RWB", "rs_rating": 80, "atr_percent": 2.5
+    }
+
+
+def day_snapshots():
+    score = {"total_score": 28, "classification": "Green Day", "inputs": {"vix": 14.2}}
+    breadth = {"date": "2026-03-02", "new_highs": 12, "new_lows": 3}
+    first = [etf("XLK", "Technology", 200.0, 6.0, 8), etf("BRK.B", "Financials", 410.0, 2.0, 6), etf("XLE", "Energy", 90.0, -4.0, 3)]
+    # Day two: a price moves, BRK.B leaves the universe, a new ticker arrives
+    second = [etf("XLK", "Technology", 203.25, 6.0, 8), etf("XLE", "Energy", 90.0, -4.0, 3), etf("SMH", "Technology", 250.0, 9.0, 9)]
+    return [
+        build_snapshot(first, score, ["XLK", "BRK.B"], breadth),
+        build_snapshot(second, {**score, "total_score": 30}, ["SMH", "XLK"], breadth),
+        build_snapshot(second, {**score, "total_score": 30}, ["SMH", "XLK"], breadth)
+    ]
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture
+def store():
+    return SnapshotStore(FakeCollection())
+
+
+def comparable(snapshot):
+    return {key: value for key, value in snapshot.items() if key not in ("id", "date", "created_at")}
+
+
+def expected(snapshot):
+    result = copy.deepcopy(snapshot)
+    result["top_etfs"] = sorted(
+        ({"ticker": ticker, **values} for ticker, values in result["top_etfs"].items()),
+        key=lambda row: row["rank"]
+    )
+    return result
+
+
+def test_deltas_round_trip_to_the_written_snapshots(store):
+    dates = [datetime(2026, 3, 2), datetime(2026, 3, 3), datetime(2026, 3, 4)]
+    snapshots = day_snapshots()
+    reports = [run(store.write(date, snapshot)) for date, snapshot in zip(dates, snapshots)]
+
+    assert [report["kind"] for report in reports] == ["keyframe", "delta", "delta"]
+    assert reports[1]["stored_fields"] < reports[1]["fields"]
+    # An unchanged day stores nothing but its header
+    assert reports[2]["stored_fields"] == 0
+
+    history = run(store.history(30, now=datetime(2026, 3, 5)))
+    assert [row["date"] for row in history] == dates[::-1]
+    for row, snapshot in zip(history[::-1], snapshots):
+        assert comparable(row) == expected(snapshot)
+    assert "BRK.B" not in {row["ticker"] for row in history[0]["top_etfs"]}
+
+
+def test_first_snapshot_of_a_month_is_a_keyframe(store):
+    first, second, _ = day_snapshots()
+    run(store.write(datetime(2026, 3, 31), first))
+    report = run(store.write(datetime(2026, 4, 1), second))
+
+    assert report["kind"] == "keyframe"
+    history = run(store.history(5, now=datetime(2026, 4, 2)))
+    assert comparable(history[0]) == expected(second)
+    assert comparable(history[1]) == expected(first)
+
+
+def test_rewritten_day_keeps_its_newest_document(store):
+    first, second, _ = day_snapshots()
+    run(store.write(datetime(2026, 3, 2), first))
+    run(store.write(datetime(2026, 3, 3), first))
+    run(store.write(datetime(2026, 3, 3), second))
+
+    history = run(store.history(5, now=datetime(2026, 3, 4)))
+    assert len(history) == 2
+    assert comparable(history[0]) == expected(second)